@@ -0,0 +1,273 @@
+"""Persistent, content-addressed cache for remote document assets.
+
+Downloaded files are stored once under their SHA-256 digest in
+``<cache>/objects/`` and an ``index.json`` maps each source URL to the digest
+plus the validators (ETag / Last-Modified) needed to revalidate it with a
+conditional request. Builds therefore work offline and only touch the network
+when an entry has gone stale, and even then only within a fixed time budget.
+
+Background revalidations are waited for (up to the time budget) when the
+process exits, so a short-lived CLI run still records what it learned.
+Index updates take an exclusive lock on ``index.lock`` where the platform
+has ``fcntl``, so concurrent builds don't drop each other's entries.
+"""
+import atexit
+import contextlib
+import hashlib
+import json
+import os
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # Windows: index updates are only serialized within a process
+    fcntl = None
+
+LOGO_URL = "https://i.imgur.com/VyBIzSl.png"
+LOCAL_LOGO = "logo.png"
+
+DEFAULT_CACHE_DIR = os.path.join(os.path.expanduser("~"), ".cache", "thunder-dragon-club")
+DEFAULT_MAX_AGE = 7 * 24 * 3600  # seconds before an entry is revalidated
+DEFAULT_BUDGET = 2.0  # seconds a blocking fetch may spend on the network
+CHUNK_SIZE = 64 * 1024
+
+
+def cache_root():
+    """The cache directory: $TDC_CACHE_DIR or ~/.cache/thunder-dragon-club"""
+    return os.environ.get("TDC_CACHE_DIR") or DEFAULT_CACHE_DIR
+
+
+def _replace(temp_path, path):
+    """Rename temp_path over path, with path's mode (or the umask's, for a new file)
+
+    mkstemp creates files 0600 whatever the umask, and the rename keeps that,
+    so without this a published PDF would only be readable by its owner.
+    """
+    try:
+        mode = os.stat(path).st_mode & 0o7777
+    except FileNotFoundError:
+        # The umask can only be read by setting it
+        umask = os.umask(0o022)
+        os.umask(umask)
+        mode = 0o666 & ~umask
+    os.chmod(temp_path, mode)
+    os.replace(temp_path, path)
+
+
+def _atomic_write(path, data):
+    """Write bytes to path via a temp file in the same directory and rename"""
+    import tempfile  # only needed on writes; keeps cache-hit imports light
+
+    directory = os.path.dirname(path)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=".tmp-")
+    try:
+        with os.fdopen(fd, "wb") as temp:
+            temp.write(data)
+        _replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+
+class AssetCache:
+    """Content-addressed asset store with conditional revalidation.
+
+    ``root`` defaults to ``$TDC_CACHE_DIR`` or ``~/.cache/thunder-dragon-club``.
+    Setting ``offline`` (or ``TDC_OFFLINE=1``) serves whatever is cached and
+    never opens a connection.
+    """
+
+    def __init__(self, root=None, max_age=DEFAULT_MAX_AGE, budget=DEFAULT_BUDGET, offline=None):
+        self.root = root or cache_root()
+        self.max_age = max_age
+        self.budget = budget
+        if offline is None:
+            offline = os.environ.get("TDC_OFFLINE", "") not in ("", "0")
+        self.offline = offline
+        self.objects_dir = os.path.join(self.root, "objects")
+        self.index_path = os.path.join(self.root, "index.json")
+        self.lock_path = os.path.join(self.root, "index.lock")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._refreshing = {}
+        self._waits_at_exit = False
+
+    # Index handling
+
+    def _read_index(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    @contextlib.contextmanager
+    def _index_lock(self):
+        """Exclusive access to the index: across threads, and across processes where fcntl exists"""
+        with self._lock:
+            if fcntl is None:
+                yield
+                return
+            with open(self.lock_path, "a") as lock:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _update_index(self, url, entry):
+        # Re-read under the lock so concurrent builds don't drop each other's entries
+        with self._index_lock():
+            index = self._read_index()
+            index[url] = entry
+            _atomic_write(self.index_path, json.dumps(index, indent=2, sort_keys=True).encode("utf-8"))
+
+    def lookup(self, url):
+        """Return the index entry for url if its blob is still present"""
+        entry = self._read_index().get(url)
+        if entry and os.path.exists(self.blob_path(entry["sha256"])):
+            return entry
+        return None
+
+    # Blob storage
+
+    def blob_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def put(self, data):
+        """Store bytes under their digest and return the digest"""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.blob_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _atomic_write(path, data)
+        return digest
+
+    def store(self, url, data, content_type=None):
+        """Record data as the current content of url, e.g. to seed an offline cache"""
+        digest = self.put(data)
+        self._update_index(url, {
+            "sha256": digest,
+            "etag": None,
+            "last_modified": None,
+            "content_type": content_type,
+            "checked_at": time.time(),
+        })
+        return self.blob_path(digest)
+
+    def read(self, url):
+        """Return the cached bytes for url, or None"""
+        entry = self.lookup(url)
+        if entry is None:
+            return None
+        with open(self.blob_path(entry["sha256"]), "rb") as f:
+            return f.read()
+
+    # Network
+
+    def _download(self, url, entry, budget):
+        """Fetch url, sending validators from entry. Returns the new entry"""
+        # Imported here: http.client and friends cost ~25 ms and cache hits never need them
+        import urllib.error
+        import urllib.request
+
+        deadline = time.monotonic() + budget
+        request = urllib.request.Request(url, headers={"User-Agent": "tdc-guide-builder"})
+        if entry:
+            if entry.get("etag"):
+                request.add_header("If-None-Match", entry["etag"])
+            if entry.get("last_modified"):
+                request.add_header("If-Modified-Since", entry["last_modified"])
+        try:
+            response = urllib.request.urlopen(request, timeout=budget)
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and entry:
+                return dict(entry, checked_at=time.time())
+            raise
+        with response:
+            chunks = []
+            while True:
+                if time.monotonic() > deadline:
+                    raise TimeoutError("time budget of %.1fs exceeded fetching %s" % (budget, url))
+                chunk = response.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+            headers = response.headers
+        digest = self.put(b"".join(chunks))
+        return {
+            "sha256": digest,
+            "etag": headers.get("ETag"),
+            "last_modified": headers.get("Last-Modified"),
+            "content_type": headers.get("Content-Type"),
+            "checked_at": time.time(),
+        }
+
+    def refresh(self, url, budget=None):
+        """Revalidate url now. Returns the blob path, falling back to the stale copy on error"""
+        entry = self.lookup(url)
+        if self.offline:
+            return self.blob_path(entry["sha256"]) if entry else None
+        try:
+            new_entry = self._download(url, entry, self.budget if budget is None else budget)
+        except Exception as e:
+            print(f"Could not refresh {url}: {e}")
+            return self.blob_path(entry["sha256"]) if entry else None
+        self._update_index(url, new_entry)
+        return self.blob_path(new_entry["sha256"])
+
+    def refresh_in_background(self, url):
+        """Start (at most one) background revalidation of url; the process waits for it at exit"""
+        with self._lock:
+            thread = self._refreshing.get(url)
+            if thread is not None and thread.is_alive():
+                return thread
+            thread = threading.Thread(target=self.refresh, args=(url,), daemon=True)
+            self._refreshing[url] = thread
+            if not self._waits_at_exit:
+                # Daemon threads die with the interpreter; give them the time budget to finish
+                atexit.register(self.wait, self.budget)
+                self._waits_at_exit = True
+        thread.start()
+        return thread
+
+    def wait(self, timeout=None):
+        """Wait for any background refreshes to finish, for at most timeout seconds in all"""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        for thread in list(self._refreshing.values()):
+            thread.join(None if deadline is None else max(0.0, deadline - time.monotonic()))
+
+    def fetch(self, url, max_age=None, budget=None, background=False):
+        """Return a local path for url, or None if it has never been fetched and can't be.
+
+        A fresh entry is returned without touching the network. A stale entry
+        is revalidated with a conditional request, either inline (bounded by
+        ``budget`` seconds) or, with ``background=True``, on a thread while
+        the stale copy is returned immediately (and waited for at exit).
+        """
+        entry = self.lookup(url)
+        if entry is not None:
+            age = time.time() - entry.get("checked_at", 0)
+            if self.offline or age < (self.max_age if max_age is None else max_age):
+                return self.blob_path(entry["sha256"])
+            if background:
+                self.refresh_in_background(url)
+                return self.blob_path(entry["sha256"])
+        return self.refresh(url, budget)
+
+
+def get_logo_path(cache=None):
+    """Return a local path for the logo without blocking on retries, or None
+
+    A stale cached logo is used immediately and revalidated in the background,
+    so only the very first build (with an empty cache) waits on the network,
+    and then only for the cache's time budget.
+    """
+    # First check if we have a local copy
+    if os.path.exists(LOCAL_LOGO):
+        return LOCAL_LOGO
+    if cache is None:
+        cache = AssetCache()
+    return cache.fetch(LOGO_URL, background=True)
@@ -0,0 +1,346 @@
+"""Readers for the Firestore backups written by the admin app.
+
+``BackupManager.js`` and the ``backup`` Cloud Function both write one CSV per
+collection (``members``, ``transactions``, ``referrals``, ``redemptions``)
+into a ``backups/<date>/`` folder, and ``backupService.downloadCSV`` saves the
+same data as ``<collection>_<date>.csv``. A single JSON file mapping
+collection names to lists of documents is accepted as well.
+
+JSON collection files, and whole JSON exports through ``stream_backup``, are
+parsed incrementally: one document is decoded at a time from a bounded
+buffer, so a multi-GB export never has to fit in memory.
+"""
+import csv
+import datetime
+import glob
+import json
+import os
+import re
+
+COLLECTIONS = ("members", "transactions", "referrals", "redemptions")
+
+_TIMESTAMP_RE = re.compile(r"seconds=(\d+)")
+_WHITESPACE_RE = re.compile(r"[ \t\r\n]*")
+JSON_CHUNK = 1 << 20
+# Largest single document the streaming reader will buffer
+MAX_DOCUMENT = 64 << 20
+
+
+def _from_epoch(seconds):
+    return datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).date()
+
+
+def parse_date(value):
+    """Turn any of the date shapes found in backups into a datetime.date (or None)"""
+    if value is None or value == "":
+        return None
+    if isinstance(value, dict):
+        seconds = value.get("_seconds", value.get("seconds"))
+        if seconds is None:
+            return None
+        return _from_epoch(int(seconds))
+    if isinstance(value, (int, float)):
+        # Firestore exports epoch milliseconds, anything smaller is seconds
+        seconds = value / 1000 if value > 1e11 else value
+        return _from_epoch(seconds)
+    value = str(value).strip()
+    match = _TIMESTAMP_RE.search(value)
+    if match:
+        return _from_epoch(int(match.group(1)))
+    try:
+        return datetime.date.fromisoformat(value[:10])
+    except ValueError:
+        pass
+    for fmt in ("%m/%d/%Y", "%d/%m/%Y"):
+        try:
+            return datetime.datetime.strptime(value.split(",")[0], fmt).date()
+        except ValueError:
+            continue
+    return None
+
+
+def to_number(value):
+    """Parse amounts and point counts, tolerating blanks and thousands separators"""
+    if value is None or value == "":
+        return 0
+    if isinstance(value, (int, float)):
+        return value
+    try:
+        number = float(str(value).replace(",", ""))
+    except ValueError:
+        return 0
+    return int(number) if number.is_integer() else number
+
+
+def member_name(member):
+    return f"{member.get('firstName', '')} {member.get('lastName', '')}".strip()
+
+
+def find_collection_files(path):
+    """Map collection name -> file for a backup folder"""
+    files = {}
+    for name in COLLECTIONS:
+        for ext in ("csv", "json"):
+            exact = os.path.join(path, f"{name}.{ext}")
+            if os.path.exists(exact):
+                files[name] = exact
+                break
+            # downloadCSV names files <collection>_<YYYY-MM-DD>.csv; take the newest
+            dated = sorted(glob.glob(os.path.join(path, f"{name}_*.{ext}")))
+            if dated:
+                files[name] = dated[-1]
+                break
+    return files
+
+
+class _JsonReader:
+    """Reads a JSON text one structural character or one complete value at a time"""
+
+    def __init__(self, f, chunk=JSON_CHUNK):
+        self.f = f
+        self.chunk = chunk
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self):
+        data = self.f.read(self.chunk)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer = self.buffer[self.pos:] + data
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """The next non-whitespace character, or "" at the end of the file"""
+        while True:
+            self.pos = _WHITESPACE_RE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ""
+
+    def expect(self, chars):
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError(f"malformed JSON: expected one of {chars!r}, found {char or 'end of file'!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # Most likely cut off by the end of the buffer
+                if len(self.buffer) - self.pos > MAX_DOCUMENT or not self._fill():
+                    raise
+                continue
+            # A number running to the end of the buffer may go on in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _iter_documents(reader):
+    """Documents of a JSON array, or of an object mapping ids to documents"""
+    opening = reader.expect("[{")
+    closing = "]" if opening == "[" else "}"
+    if reader.peek() == closing:
+        reader.pos += 1
+        return
+    while True:
+        if opening == "{":
+            key = reader.value()
+            reader.expect(":")
+            value = reader.value()
+            if isinstance(value, dict):
+                yield {"id": key, **value}
+        else:
+            yield reader.value()
+        if reader.expect("," + closing) == closing:
+            return
+
+
+def _iter_file(filename):
+    if filename.endswith(".json"):
+        with open(filename, "r", encoding="utf-8") as f:
+            yield from _iter_documents(_JsonReader(f))
+    else:
+        with open(filename, "r", encoding="utf-8-sig", newline="") as f:
+            yield from csv.DictReader(f)
+
+
+def open_backup(path):
+    """Return {collection: iterator of documents} for a backup folder or JSON file.
+
+    Folder collections are read lazily file by file; a single JSON file is
+    parsed once and shared by all four iterators.
+    """
+    if os.path.isdir(path):
+        files = find_collection_files(path)
+        return {name: _iter_file(files[name]) if name in files else iter(()) for name in COLLECTIONS}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {name: iter(data.get(name, [])) for name in COLLECTIONS}
+
+
+def stream_backup(path):
+    """Yield (collection, document) for a whole backup in one streaming pass.
+
+    A folder is read file by file, members first. A JSON export is read in
+    file order, never more than one document at a time; its collections may
+    be lists of documents or objects mapping ids to documents.
+    """
+    if os.path.isdir(path):
+        files = find_collection_files(path)
+        for name in COLLECTIONS:
+            if name in files:
+                for record in _iter_file(files[name]):
+                    yield name, record
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        reader = _JsonReader(f)
+        reader.expect("{")
+        if reader.peek() == "}":
+            return
+        while True:
+            name = reader.value()
+            reader.expect(":")
+            if reader.peek() in ("[", "{"):
+                for record in _iter_documents(reader):
+                    if name in COLLECTIONS:
+                        yield name, record
+            else:
+                reader.value()
+            if reader.expect(",}") == "}":
+                return
+
+
+def backup_size(path):
+    """Bytes a stream_backup of path reads"""
+    if os.path.isdir(path):
+        return sum(os.path.getsize(name) for name in find_collection_files(path).values())
+    return os.path.getsize(path)
+
+
+def iter_records(path, collection):
+    """Yield the documents of one collection from a backup folder or JSON file"""
+    return open_backup(path)[collection]
+
+
+class MemberActivity:
+    """A member's profile plus their transactions, redemptions and referrals.
+
+    History rows are compact tuples so that batches pickle cheaply:
+    transactions are ``(date, amount, points, notes)``, redemptions
+    ``(date, points, item)`` and referrals ``(date, referred_name, points)``.
+    """
+
+    __slots__ = ("member_id", "name", "email", "phone", "member_type", "points",
+                 "member_since", "transactions", "redemptions", "referrals")
+
+    def __init__(self, member):
+        self.member_id = str(member.get("id", ""))
+        self.name = member_name(member)
+        self.email = member.get("email", "") or ""
+        self.phone = member.get("phone", "") or ""
+        self.member_type = "Trade" if member.get("memberType") == "trade" else "Non-Trade"
+        self.points = to_number(member.get("points"))
+        self.member_since = parse_date(member.get("createdAt"))
+        self.transactions = []
+        self.redemptions = []
+        self.referrals = []
+
+    def __getstate__(self):
+        return tuple(getattr(self, slot) for slot in self.__slots__)
+
+    def __setstate__(self, state):
+        for slot, value in zip(self.__slots__, state):
+            setattr(self, slot, value)
+
+    def add_transaction(self, record):
+        self.transactions.append((
+            parse_date(record.get("date")),
+            to_number(record.get("amount")),
+            to_number(record.get("pointsEarned")),
+            record.get("notes", "") or "",
+        ))
+
+    def add_redemption(self, record):
+        self.redemptions.append((
+            parse_date(record.get("date")),
+            to_number(record.get("points")),
+            record.get("item", "") or "",
+        ))
+
+    def add_referral(self, record):
+        self.referrals.append((
+            parse_date(record.get("date")),
+            record.get("referralName") or record.get("referredBy") or "",
+            to_number(record.get("pointsEarned")),
+        ))
+
+    def sort_histories(self):
+        # Histories are shown oldest first, undated rows last
+        for rows in (self.transactions, self.redemptions, self.referrals):
+            rows.sort(key=lambda row: (row[0] is None, row[0] or datetime.date.min))
+
+    @classmethod
+    def from_records(cls, member, transactions=(), redemptions=(), referrals=()):
+        """Build one member's activity from raw Firestore documents"""
+        activity = cls(member)
+        for record in transactions:
+            activity.add_transaction(record)
+        for record in redemptions:
+            activity.add_redemption(record)
+        for record in referrals:
+            activity.add_referral(record)
+        activity.sort_histories()
+        return activity
+
+    @property
+    def total_spent(self):
+        return sum(row[1] for row in self.transactions)
+
+    @property
+    def total_earned(self):
+        return sum(row[2] for row in self.transactions) + sum(row[2] for row in self.referrals)
+
+    @property
+    def total_redeemed(self):
+        return sum(row[1] for row in self.redemptions)
+
+
+def group_by_member(path):
+    """Read a backup and return {member_id: MemberActivity}, one pass per collection.
+
+    Records whose member no longer exists are dropped, matching what
+    CSVExport.js does when it joins against the members collection.
+    """
+    backup = open_backup(path)
+    members = {}
+    for member in backup["members"]:
+        activity = MemberActivity(member)
+        members[activity.member_id] = activity
+
+    for record in backup["transactions"]:
+        activity = members.get(str(record.get("memberId", "")))
+        if activity is not None:
+            activity.add_transaction(record)
+    for record in backup["redemptions"]:
+        activity = members.get(str(record.get("memberId", "")))
+        if activity is not None:
+            activity.add_redemption(record)
+    for record in backup["referrals"]:
+        activity = members.get(str(record.get("memberId", "")))
+        if activity is not None:
+            activity.add_referral(record)
+
+    for activity in members.values():
+        activity.sort_histories()
+    return members
@@ -0,0 +1,480 @@
+"""Benchmark suite for document generation.
+
+Scenarios:
+
+``guide-cold``
+    A fresh interpreter builds the guide once; latency is the whole process.
+``guide-warm``
+    One long-lived process builds the guide repeatedly.
+``guide-sections-<n>``
+    Cold builds through the section cache (nothing cached), rendering the
+    sections in ``n`` processes and stitching them; 1 and the CPU count.
+``statements``
+    Per-member statements from a synthetic backup, rendered one by one.
+``statements-pool``
+    The same batch through ``render_statements`` and its process pool.
+``tables-<rows>``
+    One HistoryTable document of 1k to 500k rows, streamed.
+``images`` / ``images-prepared``
+    Pages of full-colour photos, several per page, as plain ``Image``
+    flowables and through ``tdc_images.PreparedImage`` (scaled for the box,
+    recompressed, decoded once per process).
+``startup-*``
+    Fresh ``tdc_cli.py`` processes under ``-X importtime``: ``--help``, a
+    pre-flight check and a cache-hit guide build (none of which may import
+    reportlab), against a bare ``import generate_tdc_guide``.
+
+Every scenario runs in its own interpreter so peak RSS is its own, and
+reports documents/s, p50/p99 latency, peak RSS and mean output bytes. All
+of it runs offline: the children get a private asset cache, seeded with a
+generated logo, and ``TDC_OFFLINE=1``.
+
+    python tdc_bench.py                       # everything
+    python tdc_bench.py --quick               # smaller sizes, ~1 minute
+    python tdc_bench.py --only guide-warm images
+    python tdc_bench.py --save-baseline       # record tdc_bench_baseline.json
+    python tdc_bench.py --compare             # exit 1 on regressions against it
+
+The committed baseline was recorded on one x86_64 Linux core (CPython
+3.11, reportlab 5.0); timings only compare on like hardware, so record
+your own before comparing elsewhere.
+"""
+import argparse
+import csv
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from tdc_stats import percentile
+
+DOCS_DIR = os.path.dirname(os.path.abspath(__file__))
+BASELINE_PATH = os.path.join(DOCS_DIR, "tdc_bench_baseline.json")
+# Metrics compared against the baseline: +1 if higher is worse, -1 if lower is worse
+METRICS = {"docs_per_sec": -1, "p50_ms": 1, "p99_ms": 1, "peak_rss_mb": 1, "bytes": 1, "import_ms": 1}
+DEFAULT_TOLERANCE = 0.10
+
+FULL = {"startup_runs": 10, "cold_runs": 5, "warm_docs": 50, "members": 200, "table_rows": [1000, 10000, 100000, 500000],
+        "image_docs": 5, "image_pages": 20}
+QUICK = {"startup_runs": 5, "cold_runs": 3, "warm_docs": 20, "members": 50, "table_rows": [1000, 10000, 100000],
+         "image_docs": 3, "image_pages": 10}
+
+
+# Fixtures
+
+def fixture_logo():
+    """PNG bytes standing in for the club logo (same size as the real one)"""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (1000, 600), (139, 0, 0))
+    draw = ImageDraw.Draw(image)
+    draw.ellipse((300, 100, 700, 500), fill=(212, 175, 55))
+    draw.rectangle((0, 540, 1000, 600), fill=(85, 0, 0))
+    buffer = io.BytesIO()
+    image.save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def fixture_photos(directory, count=8, size=(1200, 800)):
+    """Write count distinct, photo-like RGB images and return their paths"""
+    from PIL import Image
+
+    paths = []
+    for n in range(count):
+        # Smooth gradients plus noise: compresses like a photo rather than clip art
+        rng = random.Random(n)
+        base = Image.radial_gradient("L").resize(size)
+        noise = Image.effect_noise(size, 40 + n * 5)
+        image = Image.merge("RGB", (base, noise, Image.linear_gradient("L").resize(size)))
+        image = image.rotate(rng.randint(0, 359))
+        path = os.path.join(directory, f"photo_{n}.jpg")
+        image.save(path, "JPEG", quality=85)
+        paths.append(path)
+    return paths
+
+
+def write_synthetic_backup(directory, members, seed=1):
+    """A CSV backup in BackupManager's layout with ~20 transactions per member"""
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+
+    def write(name, header, rows):
+        with open(os.path.join(directory, f"{name}.csv"), "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+
+    def day():
+        return f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d} 12:00:00"
+
+    write("members", ["id", "firstName", "lastName", "email", "phone", "memberType", "points", "createdAt"], (
+        [f"m{i}", "Tashi", f"Dorji {i}", f"member{i}@example.bt", "17000000",
+         "trade" if i % 3 == 0 else "non-trade", rng.randint(0, 5000), "2024-01-02 10:00:00"]
+        for i in range(members)))
+    write("transactions", ["id", "memberId", "memberName", "amount", "pointsEarned", "date", "notes", "createdAt"], (
+        [f"t{i}", f"m{rng.randrange(members)}", "", rng.randint(100, 9000), rng.randint(1, 90), day(),
+         "Wine purchase", "2024-01-01"]
+        for i in range(members * 20)))
+    write("redemptions", ["id", "memberId", "memberName", "points", "item", "date", "createdAt"], (
+        [f"r{i}", f"m{rng.randrange(members)}", "", rng.randint(10, 500), "Glass of wine", day(), "2024-01-01"]
+        for i in range(members * 3)))
+    write("referrals", ["id", "memberId", "memberName", "referralName", "pointsEarned", "notes", "date", "createdAt"], (
+        [f"f{i}", f"m{rng.randrange(members)}", "", "Pema Wangmo", 20, "", day(), "2024-01-01"]
+        for i in range(members)))
+
+
+def prepare_environment(workdir):
+    """Environment for offline children: private cache seeded with the fixture logo"""
+    from tdc_assets import LOGO_URL, AssetCache
+
+    cache_dir = os.path.join(workdir, "cache")
+    AssetCache(cache_dir).store(LOGO_URL, fixture_logo(), "image/png")
+    env = dict(os.environ, TDC_CACHE_DIR=cache_dir, TDC_OFFLINE="1")
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [DOCS_DIR, env.get("PYTHONPATH")]))
+    return env
+
+
+# Scenario bodies, run inside the child interpreter. Each returns per-document
+# latencies (seconds; may be empty) and output sizes.
+
+def _guide_documents(count):
+    from reportlab.lib.pagesizes import letter
+    from generate_tdc_guide import ThunderDragonGuide, get_logo
+    from tdc_spec import compile_plan, load_spec
+
+    plan = compile_plan(load_spec())
+    latencies, sizes = [], []
+    for _ in range(count):
+        started = time.perf_counter()
+        buffer = io.BytesIO()
+        doc = ThunderDragonGuide(buffer, pagesize=letter, rightMargin=72, leftMargin=72,
+                                 topMargin=72, bottomMargin=72)
+        doc.build(list(plan.flowables(logo=get_logo())))
+        latencies.append(time.perf_counter() - started)
+        sizes.append(len(buffer.getvalue()))
+    return latencies, sizes
+
+
+def _scenario_guide_cold(params, workdir):
+    return _guide_documents(1)
+
+
+def _scenario_guide_warm(params, workdir):
+    _guide_documents(1)  # warm-up: imports, style compilation, logo decode
+    return _guide_documents(params["docs"])
+
+
+def _scenario_guide_sections(params, workdir):
+    from tdc_build_cache import BuildCache, build_guide
+
+    latencies, sizes = [], []
+    output = os.path.join(workdir, "guide.pdf")
+    for run in range(params["docs"]):
+        started = time.perf_counter()
+        build_guide([output], cache=BuildCache(os.path.join(workdir, f"cache{run}")), workers=params["workers"])
+        latencies.append(time.perf_counter() - started)
+        sizes.append(os.path.getsize(output))
+    return latencies, sizes
+
+
+def _scenario_statements(params, workdir):
+    from generate_tdc_guide import build_styles, get_logo_path
+    from tdc_backup import group_by_member
+    from tdc_statements import member_points, render_statement, statement_filename
+
+    backup = os.path.join(workdir, "backup")
+    write_synthetic_backup(backup, params["members"])
+    out_dir = os.path.join(workdir, "statements")
+    os.makedirs(out_dir, exist_ok=True)
+    styles, logo_path = build_styles(), get_logo_path()
+    latencies, sizes = [], []
+    members = group_by_member(backup)
+    points = member_points(members)
+    for activity in members.values():
+        started = time.perf_counter()
+        sizes.append(render_statement(activity, statement_filename(out_dir, activity.member_id), styles, logo_path,
+                                      points=points[activity.member_id]))
+        latencies.append(time.perf_counter() - started)
+    return latencies, sizes
+
+
+def _scenario_statements_pool(params, workdir):
+    from tdc_statements import render_statements
+
+    backup = os.path.join(workdir, "backup")
+    write_synthetic_backup(backup, params["members"])
+    report = render_statements(backup, os.path.join(workdir, "statements"), workers=params.get("workers"))
+    documents = report["documents"]
+    return [], [report["bytes"] / documents] * documents if documents else []
+
+
+def _scenario_tables(params, workdir):
+    from reportlab.lib.units import inch
+    from tdc_streaming import StreamingGuide
+    from tdc_tables import Column, HistoryTable, _bench_rows
+
+    columns = [Column("Date", 1.2 * inch), Column("Amount", 1.4 * inch, "RIGHT"),
+               Column("Points", 0.9 * inch, "RIGHT"), Column("Notes", 3.0 * inch)]
+    count = params["rows"]
+    # Generate rows lazily in chunks so the source data doesn't dominate RSS
+    rows = (row for start in range(0, count, 10000) for row in _bench_rows(min(10000, count - start)))
+    path = os.path.join(workdir, "table.pdf")
+    started = time.perf_counter()
+    StreamingGuide(path).build([HistoryTable(columns, rows)])
+    return [time.perf_counter() - started], [os.path.getsize(path)]
+
+
+def _scenario_images(params, workdir):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import Image, PageBreak
+    from generate_tdc_guide import ThunderDragonGuide, get_logo
+    from tdc_images import PreparedImage
+
+    photos = fixture_photos(workdir)
+    flowable = PreparedImage if params.get("prepared") else Image
+    latencies, sizes = [], []
+    for _ in range(params["docs"]):
+        started = time.perf_counter()
+        story = []
+        for page in range(params["pages"]):
+            logo = get_logo()
+            if logo:
+                story.append(logo)
+            for n in range(3):
+                story.append(flowable(photos[(page * 3 + n) % len(photos)], 3.6 * inch, 2.4 * inch))
+            story.append(PageBreak())
+        buffer = io.BytesIO()
+        ThunderDragonGuide(buffer, pagesize=letter).build(story)
+        latencies.append(time.perf_counter() - started)
+        sizes.append(len(buffer.getvalue()))
+    return latencies, sizes
+
+
+SCENARIOS = {
+    "guide-cold": _scenario_guide_cold,
+    "guide-warm": _scenario_guide_warm,
+    "guide-sections": _scenario_guide_sections,
+    "statements": _scenario_statements,
+    "statements-pool": _scenario_statements_pool,
+    "tables": _scenario_tables,
+    "images": _scenario_images,
+}
+
+
+def _child(scenario, params):
+    import resource
+
+    workdir = tempfile.mkdtemp(prefix="tdc-bench-")
+    try:
+        started = time.perf_counter()
+        latencies, sizes = SCENARIOS[scenario](params, workdir)
+        seconds = time.perf_counter() - started
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if scenario == "statements-pool":
+        peak = max(peak, resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+    print(json.dumps({"latencies": latencies, "sizes": sizes, "seconds": seconds,
+                      "peak_rss_mb": peak * scale / 1e6}))
+
+
+def _run_child(scenario, params, env):
+    started = time.perf_counter()
+    out = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), "--child", scenario, json.dumps(params)],
+        check=True, capture_output=True, text=True, env=env,
+    ).stdout
+    wall = time.perf_counter() - started
+    return json.loads(out.strip().splitlines()[-1]), wall
+
+
+# Startup: argv after the interpreter; {out} is replaced by a scratch PDF path
+STARTUP_COMMANDS = [
+    ("startup-help", ["tdc_cli.py", "--help"]),
+    ("startup-check", ["tdc_cli.py", "guide", "--check", "-o", "{out}"]),
+    ("startup-guide-hit", ["tdc_cli.py", "guide", "-q", "-o", "{out}"]),
+    ("startup-import", ["-c", "import generate_tdc_guide"]),
+]
+
+
+def parse_importtime(stderr):
+    """Total import time in ms and the set of top-level modules from -X importtime output"""
+    total_us = 0
+    modules = set()
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        if len(name) - len(name.lstrip()) == 1:
+            total_us += int(cumulative)
+        modules.add(name.strip())
+    return total_us / 1000, modules
+
+
+def _run_startup(argv, env, workdir):
+    command = [sys.executable, "-X", "importtime"]
+    command += [os.path.join(DOCS_DIR, arg) if arg.endswith(".py") else arg for arg in argv]
+    command = [arg.replace("{out}", os.path.join(workdir, "startup.pdf")) for arg in command]
+    started = time.perf_counter()
+    process = subprocess.run(command, capture_output=True, text=True, env=env, cwd=workdir)
+    wall = time.perf_counter() - started
+    if process.returncode:
+        raise RuntimeError(f"{' '.join(argv)} failed: {process.stderr[-2000:]}")
+    import_ms, modules = parse_importtime(process.stderr)
+    return wall, import_ms, "reportlab" in modules
+
+
+def _summarise(name, latencies, sizes, seconds, peak_rss_mb, extra=None):
+    docs = len(sizes)
+    result = {
+        "name": name,
+        "docs": docs,
+        "seconds": round(seconds, 4),
+        "docs_per_sec": round(docs / seconds, 3) if seconds else None,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2) if latencies else None,
+        "peak_rss_mb": round(peak_rss_mb, 1),
+        "bytes": round(sum(sizes) / docs) if docs else 0,
+    }
+    result.update(extra or {})
+    p50 = f"{result['p50_ms']:>9.1f}" if latencies else f"{'-':>9}"
+    p99 = f"{result['p99_ms']:>9.1f}" if latencies else f"{'-':>9}"
+    print(f"{name:<16} {docs:>5} docs {result['docs_per_sec'] or 0:>9.2f} docs/s "
+          f"p50 {p50} ms p99 {p99} ms "
+          f"RSS {result['peak_rss_mb']:>7.1f} MB {result['bytes']:>11,} B/doc"
+          + "".join(f" {key} {value}" for key, value in (extra or {}).items()), flush=True)
+    return result
+
+
+def run_suite(sizes=FULL, only=None):
+    """Run the selected scenarios and return their results"""
+    results = []
+    workdir = tempfile.mkdtemp(prefix="tdc-bench-")
+    try:
+        env = prepare_environment(workdir)
+
+        def wanted(name):
+            return not only or name in only or name.split("-")[0] in only
+
+        for name, argv in STARTUP_COMMANDS:
+            if not wanted(name):
+                continue
+            _run_startup(argv, env, workdir)  # prime the build cache and OS file cache
+            walls, imports, loads_reportlab = [], [], False
+            for _ in range(sizes["startup_runs"]):
+                wall, import_ms, reportlab = _run_startup(argv, env, workdir)
+                walls.append(wall)
+                imports.append(import_ms)
+                loads_reportlab = loads_reportlab or reportlab
+            if loads_reportlab and name != "startup-import":
+                print(f"WARNING: {name} imported reportlab")
+            results.append(_summarise(name, walls, [0] * len(walls), sum(walls), 0.0, {
+                "import_ms": round(percentile(imports, 0.50), 1),
+                "imports_reportlab": loads_reportlab,
+            }))
+        if wanted("guide-cold"):
+            walls, sizes_, peak = [], [], 0.0
+            for _ in range(sizes["cold_runs"]):
+                child, wall = _run_child("guide-cold", {}, env)
+                walls.append(wall)
+                sizes_.extend(child["sizes"])
+                peak = max(peak, child["peak_rss_mb"])
+            results.append(_summarise("guide-cold", walls, sizes_, sum(walls), peak))
+        runs = [("guide-warm", "guide-warm", {"docs": sizes["warm_docs"]})]
+        runs += [(f"guide-sections-{workers}", "guide-sections", {"docs": sizes["cold_runs"], "workers": workers})
+                 for workers in sorted({1, os.cpu_count() or 1})]
+        runs += [("statements", "statements", {"members": sizes["members"]}),
+                 ("statements-pool", "statements-pool", {"members": sizes["members"]})]
+        runs += [(f"tables-{rows // 1000}k", "tables", {"rows": rows}) for rows in sizes["table_rows"]]
+        runs += [(name, "images", {"docs": sizes["image_docs"], "pages": sizes["image_pages"], "prepared": prepared})
+                 for name, prepared in (("images", False), ("images-prepared", True))]
+        for name, scenario, params in runs:
+            if wanted(name):
+                child, _ = _run_child(scenario, params, env)
+                results.append(_summarise(name, child["latencies"], child["sizes"], child["seconds"],
+                                          child["peak_rss_mb"]))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+# Baselines
+
+def save_baseline(results, path=BASELINE_PATH):
+    data = {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "results": {result["name"]: result for result in results},
+    }
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    print(f"Baseline saved to {path}")
+
+
+def compare(results, path=BASELINE_PATH, tolerance=DEFAULT_TOLERANCE):
+    """Print changes against the baseline and return the regressions beyond tolerance"""
+    with open(path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["results"]
+    regressions = []
+    for result in results:
+        before = baseline.get(result["name"])
+        if before is None:
+            print(f"{result['name']:<16} (no baseline)")
+            continue
+        changes = []
+        for metric, direction in METRICS.items():
+            old, new = before.get(metric), result.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            changes.append(f"{metric} {change:+.1%}")
+            if change * direction > tolerance:
+                regressions.append((result["name"], metric, old, new))
+        print(f"{result['name']:<16} " + ", ".join(changes))
+    for name, metric, old, new in regressions:
+        print(f"REGRESSION {name} {metric}: {old} -> {new}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="tdc bench", description="Benchmark document generation")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes (no 500k-row table)")
+    parser.add_argument("--only", nargs="+", metavar="SCENARIO",
+                        help="scenarios to run, e.g. guide-warm tables-10k (or tables for all sizes)")
+    parser.add_argument("--json", help="write results to this file")
+    parser.add_argument("--save-baseline", nargs="?", const=BASELINE_PATH, metavar="PATH")
+    parser.add_argument("--compare", nargs="?", const=BASELINE_PATH, metavar="PATH",
+                        help="compare against a saved baseline; exit 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="relative change counted as a regression (default 0.10)")
+    parser.add_argument("--child", nargs=2, metavar=("SCENARIO", "PARAMS"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        _child(args.child[0], json.loads(args.child[1]))
+        return 0
+    if args.compare and not os.path.exists(args.compare):
+        # Fail before the suite runs, not after
+        parser.error(f"no baseline at {args.compare}; record one with --save-baseline")
+    results = run_suite(QUICK if args.quick else FULL, args.only)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.save_baseline:
+        save_baseline(results, args.save_baseline)
+    if args.compare and compare(results, args.compare, args.tolerance):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,397 @@
+"""Incremental, hash-keyed builds of the user guide.
+
+Every input that can change the rendered PDF is hashed: the guide spec (per
+section), the palette and styles (which name the fonts), the logo bytes, the
+reportlab version and the source of the modules that do the rendering. From
+those come three levels of key:
+
+* a *section key* per spec section; sections with a logo block also include
+  the logo digest,
+* a *document key* over all section keys and the document title,
+* the *manifest* entry for each output file: document key, size and mtime.
+
+A build first compares every output against the manifest and, if all match,
+returns without importing reportlab at all (a few milliseconds). Otherwise it
+copies a previously stitched document with the same key, or renders only the
+sections whose keys are not in the cache and stitches the cached page ranges
+together with ``tdc_pdf``. Output is deterministic, so identical inputs give
+byte-identical files and CDN caches keyed on content stay warm.
+
+Sections are laid out independently, so with ``workers > 1`` the missing
+ones are rendered in a process pool, one section per task, and wall time
+for a cold build tends towards that of the longest section. Each section
+also records its layout (page count and the position of every Heading1 and
+Heading2); stitching uses it to number pages across the whole guide, build
+the PDF outline and publish each heading as a named destination, which is
+what links between sections resolve to.
+
+The table of contents (the spec's ``contents``) is rendered on its own once
+every section's layout is known, so its page numbers are exact. Only its own
+length has to be guessed, from the last build; a wrong guess costs one more
+render of the contents pages, not of the guide.
+
+Cache layout under ``$TDC_CACHE_DIR/builds/``::
+
+    manifest.json          output path -> {key, size, mtime_ns}
+    sections/<key>.pdf     one rendered section
+    sections/<key>.json    its layout: page count and headings
+    layouts/contents.json  page count of the last table of contents
+    documents/<key>.pdf    one stitched guide
+
+    python tdc_cli.py guide              # build both published copies
+    python tdc_cli.py guide --force      # ignore the manifest and re-stitch
+    python tdc_cli.py guide --workers 8  # render missing sections in parallel
+    python tdc_cli.py guide --watch      # rebuild on every edit (see tdc_watch)
+"""
+import hashlib
+import importlib.util
+import io
+import json
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from tdc_assets import _atomic_write, cache_root, get_logo_path
+
+DOCS_DIR = os.path.dirname(os.path.abspath(__file__))
+SPEC_PATH = os.path.join(DOCS_DIR, "tdc_guide_spec.json")
+# The guide is published twice: next to its sources and at the site root
+OUTPUT_DIRS = (DOCS_DIR, os.path.dirname(DOCS_DIR))
+# Modules whose code affects the rendered bytes
+SOURCE_FILES = ("generate_tdc_guide.py", "tdc_spec.py", "tdc_decorations.py", "tdc_contents.py", "tdc_images.py",
+                "tdc_paragraphs.py", "tdc_pdf.py", "tdc_build_cache.py")
+
+
+def _digest(*parts):
+    h = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, str):
+            part = part.encode("utf-8")
+        h.update(part)
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _canonical(value):
+    return json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+
+
+def _file_digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def reportlab_version():
+    """The installed reportlab version, read without importing reportlab (~100 ms)"""
+    spec = importlib.util.find_spec("reportlab")
+    if spec is None or not spec.origin:
+        return "missing"
+    with open(spec.origin, "r", encoding="utf-8") as f:
+        match = re.search(r'^Version\s*=\s*["\']([^"\']+)', f.read(), re.M)
+    return match.group(1) if match else "unknown"
+
+
+def environment_key():
+    """Hash of the reportlab version and the rendering code"""
+    return _digest(reportlab_version(), *(_file_digest(os.path.join(DOCS_DIR, name)) for name in SOURCE_FILES))
+
+
+def _has_logo(section):
+    return any("logo" in block for block in section["blocks"])
+
+
+class BuildKeys:
+    """All cache keys for one spec, logo and environment"""
+
+    def __init__(self, spec, logo_path, env_key):
+        self.logo_digest = _file_digest(logo_path) if logo_path else "no-logo"
+        styles = _canonical({key: spec.get(key, {}) for key in ("palette", "styles", "table_styles")})
+        self.sections = []
+        for section in spec["sections"]:
+            parts = [env_key, styles, _canonical(section)]
+            if _has_logo(section):
+                parts.append(self.logo_digest)
+            self.sections.append((section["id"], _digest(*parts)))
+        self._contents = (env_key, styles, _canonical(spec.get("contents")))
+        self.document = _digest(env_key, spec.get("title", ""), _canonical(spec.get("page_numbers")),
+                                _canonical(spec.get("contents")), *(key for _, key in self.sections))
+
+    def contents(self, entries, pages):
+        """Key of a rendered table of contents listing entries on the given pages"""
+        return _digest(*self._contents, _canonical(entries), _canonical(pages))
+
+
+class BuildCache:
+    """Section, document and manifest storage under ``<root>/builds``"""
+
+    def __init__(self, root=None):
+        self.root = os.path.join(root or cache_root(), "builds")
+        self.manifest_path = os.path.join(self.root, "manifest.json")
+
+    def _path(self, kind, key, suffix):
+        return os.path.join(self.root, kind, key + suffix)
+
+    def get(self, kind, key, suffix=".pdf"):
+        try:
+            with open(self._path(kind, key, suffix), "rb") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def put(self, kind, key, data, suffix=".pdf"):
+        path = self._path(kind, key, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        _atomic_write(path, data)
+
+    def read_manifest(self):
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def write_manifest(self, manifest):
+        os.makedirs(self.root, exist_ok=True)
+        _atomic_write(self.manifest_path, json.dumps(manifest, indent=2, sort_keys=True).encode("utf-8"))
+
+    def is_fresh(self, manifest, output, key):
+        """True if output exists unchanged since we last wrote it with this key"""
+        entry = manifest.get(output)
+        if not entry or entry["key"] != key:
+            return False
+        try:
+            stat = os.stat(output)
+        except OSError:
+            return False
+        return stat.st_size == entry["size"] and stat.st_mtime_ns == entry["mtime_ns"]
+
+
+def render_section(plan, section_id, logo_path):
+    """Render one section on its own (its pages start on a fresh page either way).
+
+    Returns the PDF bytes and the section's layout: ``{"pages": n,
+    "headings": [...]}`` with 0-based page indexes within the section.
+    """
+    # Deferred: the no-op path must not pay for importing reportlab
+    from reportlab.lib.pagesizes import letter
+    from generate_tdc_guide import OUTLINE_LEVELS, ThunderDragonGuide, get_logo
+
+    buffer = io.BytesIO()
+    doc = ThunderDragonGuide(
+        buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72,
+        title=plan.title, invariant=1, outline_levels=OUTLINE_LEVELS, named_links=True,
+    )
+    logo = get_logo(path=logo_path) if logo_path else None
+    doc.build(list(plan.section(section_id).flowables(logo=logo)))
+    return buffer.getvalue(), {"pages": doc.canv.getPageNumber() - 1, "headings": doc.headings}
+
+
+def render_contents(plan, entries, pages):
+    """Render the table of contents on its own; pages maps heading keys to stitched page numbers"""
+    from reportlab.lib.pagesizes import letter
+    from generate_tdc_guide import ThunderDragonGuide
+    from tdc_contents import contents_flowables
+
+    buffer = io.BytesIO()
+    doc = ThunderDragonGuide(
+        buffer, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72,
+        title=plan.title, invariant=1, named_links=True, contents_pages=pages,
+    )
+    doc.build(contents_flowables(entries, plan.registry, plan.contents.get("title", "Contents")))
+    return buffer.getvalue(), {"pages": doc.canv.getPageNumber() - 1, "headings": []}
+
+
+def _render_section_job(spec_path, section_id, logo_path):
+    """Process pool entry point; plans are memoized per worker process"""
+    from tdc_spec import compile_plan, load_spec
+
+    return render_section(compile_plan(load_spec(spec_path)), section_id, logo_path)
+
+
+def default_outputs(spec):
+    name = os.path.basename(spec.get("output") or "Thunder_Dragon_Club_User_Guide.pdf")
+    return [os.path.join(directory, name) for directory in OUTPUT_DIRS]
+
+
+def _prepare(spec_path):
+    spec_path = os.path.abspath(spec_path or SPEC_PATH)
+    with open(spec_path, "r", encoding="utf-8") as f:
+        spec = json.load(f)
+    logo_path = get_logo_path()
+    return spec_path, spec, logo_path, BuildKeys(spec, logo_path, environment_key())
+
+
+def _document(spec_path, spec, keys, logo_path, cache, report, force, workers):
+    data = None if force else cache.get("documents", keys.document)
+    if data is not None:
+        report["status"] = "copied"
+    else:
+        data = _stitch_sections(spec_path, spec, keys, logo_path, cache, report, workers)
+        cache.put("documents", keys.document, data)
+        report["status"] = "built"
+    return data
+
+
+def guide_bytes(spec_path=None, force=False, cache=None, workers=1):
+    """Return (PDF bytes, report) for the guide, from the cache when possible"""
+    started = time.perf_counter()
+    spec_path, spec, logo_path, keys = _prepare(spec_path)
+    report = {"status": "copied", "key": keys.document, "rendered": [], "reused": [], "outputs": []}
+    data = _document(spec_path, spec, keys, logo_path, cache or BuildCache(), report, force, workers)
+    report["seconds"] = round(time.perf_counter() - started, 4)
+    return data, report
+
+
+def build_guide(outputs=None, spec_path=None, force=False, cache=None, workers=1):
+    """Bring every output up to date, doing as little work as possible.
+
+    Missing sections are rendered by up to ``workers`` processes. Returns a
+    report dict: ``status`` is "fresh" (nothing written), "copied" (a cached
+    document was reused) or "built", with the sections rendered and reused
+    and, for "built", the seconds spent in each step under ``timings``.
+    """
+    started = time.perf_counter()
+    spec_path, spec, logo_path, keys = _prepare(spec_path)
+    outputs = [os.path.abspath(path) for path in (outputs or default_outputs(spec))]
+    cache = cache or BuildCache()
+    manifest = cache.read_manifest()
+    report = {"status": "fresh", "key": keys.document, "rendered": [], "reused": [], "outputs": outputs}
+
+    stale = [path for path in outputs if force or not cache.is_fresh(manifest, path, keys.document)]
+    if stale:
+        data = _document(spec_path, spec, keys, logo_path, cache, report, force, workers)
+        for path in stale:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _atomic_write(path, data)
+            stat = os.stat(path)
+            manifest[path] = {"key": keys.document, "size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+        cache.write_manifest(manifest)
+    report["seconds"] = round(time.perf_counter() - started, 4)
+    return report
+
+
+def _cached_section(cache, key):
+    data = cache.get("sections", key)
+    layout = cache.get("sections", key, ".json")
+    if data is None or layout is None:
+        return None
+    return data, json.loads(layout)
+
+
+def _render_missing(spec_path, missing, logo_path, workers):
+    """Render sections (id -> (data, layout)), in a process pool if it is worth it"""
+    if workers > 1 and len(missing) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(missing))) as pool:
+            futures = [pool.submit(_render_section_job, spec_path, section_id, logo_path) for section_id in missing]
+            return dict(zip(missing, (future.result() for future in futures)))
+    from tdc_spec import compile_plan, load_spec
+
+    plan = compile_plan(load_spec(spec_path))
+    return {section_id: render_section(plan, section_id, logo_path) for section_id in missing}
+
+
+def _place_headings(keys, sections, after, contents_pages):
+    """Every heading with its stitched page index, keys made unique across sections"""
+    placed = []
+    taken = set()
+    page = 0
+    for section_id, _ in keys.sections:
+        layout = sections[section_id][1]
+        for heading in layout["headings"]:
+            key = base = heading["key"]
+            suffix = 2
+            while key in taken:
+                key = f"{base}-{suffix}"
+                suffix += 1
+            taken.add(key)
+            placed.append(dict(heading, key=key, page=page + heading["page"]))
+        page += layout["pages"]
+        if section_id == after:
+            page += contents_pages
+    return placed
+
+
+def _contents(spec_path, spec, keys, sections, cache, report):
+    """The stitched guide's table of contents: its PDF bytes and the placed headings.
+
+    Its length moves every later page, so it is taken from the last build;
+    only if that turns out wrong is the contents rendered a second time.
+    """
+    after = spec["contents"].get("after")
+    estimate = json.loads(cache.get("layouts", "contents", ".json") or b"1")
+    plan = None
+    report["contents_passes"] = 0
+    for _ in range(3):
+        placed = _place_headings(keys, sections, after, estimate)
+        entries = [(heading["level"], heading["title"], heading["key"]) for heading in placed]
+        pages = {heading["key"]: heading["page"] + 1 for heading in placed}
+        key = keys.contents(entries, pages)
+        rendered = _cached_section(cache, key)
+        if rendered is None:
+            if plan is None:
+                from tdc_spec import compile_plan, load_spec
+
+                plan = compile_plan(load_spec(spec_path))
+            rendered = render_contents(plan, entries, pages)
+            cache.put("sections", key, rendered[0])
+            cache.put("sections", key, json.dumps(rendered[1]).encode("utf-8"), ".json")
+            report["contents_passes"] += 1
+        if rendered[1]["pages"] == estimate:
+            break
+        estimate = rendered[1]["pages"]
+    cache.put("layouts", "contents", json.dumps(estimate).encode("utf-8"), ".json")
+    return rendered[0], placed
+
+
+def _stitch_sections(spec_path, spec, keys, logo_path, cache, report, workers=1):
+    from tdc_pdf import Stitcher
+
+    timings = report["timings"] = {}
+    started = time.perf_counter()
+    sections = {}
+    for section_id, key in keys.sections:
+        sections[section_id] = _cached_section(cache, key)
+    missing = [section_id for section_id, _ in keys.sections if sections[section_id] is None]
+    if missing:
+        sections.update(_render_missing(spec_path, missing, logo_path, workers))
+    for section_id, key in keys.sections:
+        if section_id in missing:
+            data, layout = sections[section_id]
+            cache.put("sections", key, data)
+            cache.put("sections", key, json.dumps(layout, sort_keys=True).encode("utf-8"), ".json")
+            report["rendered"].append(section_id)
+        else:
+            report["reused"].append(section_id)
+    timings["sections"] = round(time.perf_counter() - started, 4)
+
+    started = time.perf_counter()
+    after = contents = None
+    if spec.get("contents"):
+        after = spec["contents"].get("after")
+        contents, placed = _contents(spec_path, spec, keys, sections, cache, report)
+    else:
+        placed = _place_headings(keys, sections, None, 0)
+    timings["contents"] = round(time.perf_counter() - started, 4)
+
+    started = time.perf_counter()
+
+    stitcher = Stitcher()
+    if spec.get("page_numbers"):
+        stitcher.number_pages(**spec["page_numbers"])
+    for section_id, _ in keys.sections:
+        stitcher.add_document(sections[section_id][0])
+        if section_id == after:
+            stitcher.add_document(contents)
+    for heading in placed:
+        stitcher.add_outline(heading["title"], heading["page"], heading["top"], heading["level"])
+        stitcher.add_destination(heading["key"], heading["page"], heading["top"])
+    data = stitcher.tobytes(title=spec.get("title", ""))
+    timings["stitch"] = round(time.perf_counter() - started, 4)
+    return data
+
+
+if __name__ == "__main__":
+    import sys
+    from tdc_cli import main
+    sys.exit(main(["guide"] + sys.argv[1:]))
@@ -0,0 +1,317 @@
+"""Command line entry point for the club's document builds.
+
+    python tdc_cli.py guide                      # both published copies, incremental
+    python tdc_cli.py guide -o build/guide.pdf   # somewhere else
+    python tdc_cli.py guide -o - > guide.pdf     # to stdout
+    python tdc_cli.py guide --check              # pre-flight: validate, report staleness, render nothing
+    python tdc_cli.py guide --workers 0          # render missing sections on every core
+    python tdc_cli.py guide --watch              # rebuild on every edit of the spec or logo
+    python tdc_cli.py statements backups/2024-05-01 statements/ --workers 8
+    python tdc_cli.py statements backups/2024-05-01 statements/ --check
+    python tdc_cli.py report backups/2024-05-01 report.pdf --month 2024-05
+    python tdc_cli.py csv thunder-dragon-transactions-2024-05-01.csv transactions.pdf --month 2024-04
+    python tdc_cli.py bench --quick
+
+Everything heavy is imported inside the command that needs it. ``--help``,
+``--check`` and a guide build that hits the cache never import reportlab;
+``python tdc_cli.py bench --only startup`` tracks that with ``-X importtime``.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+
+# Block keys understood by tdc_spec (see its module docstring)
+SPEC_BLOCKS = {"title", "h1", "h2", "p", "paragraph", "steps", "bullets", "spacer", "page_break", "table", "logo"}
+# Styles getSampleStyleSheet() provides, which a spec may use without defining
+SAMPLE_STYLES = {"Normal", "BodyText", "Italic", "Title", "Heading1", "Heading2", "Heading3", "Heading4",
+                 "Heading5", "Heading6", "Bullet", "Definition", "Code", "UnorderedList", "OrderedList"}
+# Keyword arguments of tdc_pdf.Stitcher.number_pages
+PAGE_NUMBER_OPTIONS = {"format", "font_size", "y", "margin", "align", "gray"}
+_HEX_COLOR_RE = re.compile(r"^#[0-9A-Fa-f]{6}$")
+
+
+def _err(message):
+    print(message, file=sys.stderr)
+
+
+def positive_int(value):
+    """argparse type for counts that must be at least 1"""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"{value!r} is not a whole number")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1, not {number}")
+    return number
+
+
+def validate_spec(spec):
+    """Return a list of problems with a guide spec, without compiling it"""
+    problems = []
+    if not isinstance(spec, dict):
+        return ["spec must be a JSON object"]
+    for name, value in spec.get("palette", {}).items():
+        if not isinstance(value, str) or not _HEX_COLOR_RE.match(value):
+            problems.append(f"palette.{name}: {value!r} is not a #RRGGBB colour")
+    styles = SAMPLE_STYLES | set(spec.get("styles", {}))
+    for name, attrs in spec.get("styles", {}).items():
+        parent = attrs.get("parent")
+        if parent and parent not in styles:
+            problems.append(f"styles.{name}: unknown parent style {parent!r}")
+    numbering = spec.get("page_numbers")
+    if numbering is not None:
+        if not isinstance(numbering, dict) or set(numbering) - PAGE_NUMBER_OPTIONS:
+            problems.append(f"page_numbers: expected an object with {', '.join(sorted(PAGE_NUMBER_OPTIONS))}")
+        else:
+            try:
+                numbering.get("format", "").format(page=1, pages=1)
+            except (KeyError, IndexError, ValueError):
+                problems.append("page_numbers.format: only {page} and {pages} may be used")
+    contents = spec.get("contents")
+    section_ids = {section.get("id") for section in spec.get("sections") or [] if isinstance(section, dict)}
+    if contents is not None and (not isinstance(contents, dict) or contents.get("after") not in section_ids):
+        problems.append("contents: expected {\"title\": ..., \"after\": <section id>} naming an existing section")
+    table_styles = set(spec.get("table_styles", {}))
+    sections = spec.get("sections")
+    if not isinstance(sections, list) or not sections:
+        return problems + ["spec has no sections"]
+    seen = set()
+    for number, section in enumerate(sections, 1):
+        section_id = section.get("id") or f"#{number}"
+        if section_id in seen:
+            problems.append(f"section {section_id}: duplicate id")
+        seen.add(section_id)
+        for index, block in enumerate(section.get("blocks", []), 1):
+            where = f"section {section_id} block {index}"
+            keys = set(block) - {"style"} if isinstance(block, dict) else set()
+            if len(keys & SPEC_BLOCKS) != 1:
+                problems.append(f"{where}: expected exactly one of {', '.join(sorted(SPEC_BLOCKS))}, got {sorted(keys)}")
+                continue
+            if "paragraph" in block and block.get("style", "Normal") not in styles:
+                problems.append(f"{where}: unknown style {block['style']!r}")
+            if "table" in block:
+                table = block["table"]
+                if table.get("style") not in table_styles:
+                    problems.append(f"{where}: unknown table style {table.get('style')!r}")
+                widths = len(table.get("col_widths", []))
+                for row in table.get("rows", []):
+                    if len(row) != widths:
+                        problems.append(f"{where}: row has {len(row)} cells for {widths} columns")
+                        break
+    return problems
+
+
+def _writable(path):
+    directory = os.path.dirname(os.path.abspath(path)) or "."
+    while not os.path.exists(directory):
+        directory = os.path.dirname(directory)
+    return os.access(directory, os.W_OK)
+
+
+# guide
+
+def check_guide(outputs=None, spec_path=None):
+    """Pre-flight for a guide build. Returns 0 if a build would succeed"""
+    from tdc_assets import LOCAL_LOGO, LOGO_URL, AssetCache
+    from tdc_build_cache import SPEC_PATH, BuildCache, BuildKeys, default_outputs, environment_key
+
+    spec_path = spec_path or SPEC_PATH
+    try:
+        with open(spec_path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+    except (OSError, ValueError) as e:
+        _err(f"spec {spec_path}: {e}")
+        return 1
+    problems = validate_spec(spec)
+    for problem in problems:
+        _err(f"spec: {problem}")
+
+    # Don't touch the network: only report what a build could use right now
+    if os.path.exists(LOCAL_LOGO):
+        logo_path = LOCAL_LOGO
+    else:
+        entry = AssetCache().lookup(LOGO_URL)
+        logo_path = AssetCache().blob_path(entry["sha256"]) if entry else None
+    print(f"logo: {logo_path or 'not cached (a build will try to download it)'}")
+
+    outputs = [os.path.abspath(path) for path in (outputs or default_outputs(spec))]
+    if not problems:
+        cache = BuildCache()
+        keys = BuildKeys(spec, logo_path, environment_key())
+        manifest = cache.read_manifest()
+        for path in outputs:
+            fresh = cache.is_fresh(manifest, path, keys.document)
+            cached = cache.get("documents", keys.document) is not None
+            state = "up to date" if fresh else ("stale, cached copy available" if cached else "stale, needs rendering")
+            print(f"{path}: {state}")
+    for path in outputs:
+        if not _writable(path):
+            problems.append(f"cannot write {path}")
+            _err(f"cannot write {path}")
+    return 1 if problems else 0
+
+
+def cmd_guide(args):
+    args.workers = args.workers or os.cpu_count() or 1
+    if args.check:
+        return check_guide(None if args.output == ["-"] else args.output, args.spec)
+    if args.watch:
+        if "-" in (args.output or ()):
+            _err("--watch rewrites files; it can't write to stdout")
+            return 2
+        from tdc_watch import watch_guide
+
+        return watch_guide(args.output, args.spec, args.workers, args.interval)
+    from tdc_build_cache import build_guide, guide_bytes
+
+    if args.output == ["-"]:
+        data, report = guide_bytes(args.spec, args.force, workers=args.workers)
+        sys.stdout.buffer.write(data)
+        sys.stdout.flush()
+        if not args.quiet:
+            _err(f"Guide {report['status']} in {report['seconds']:.2f}s ({len(data):,} bytes)")
+        return 0
+    if "-" in (args.output or ()):
+        _err("-o - (stdout) can't be combined with other outputs")
+        return 2
+    report = build_guide(args.output, args.spec, args.force, workers=args.workers)
+    if args.quiet:
+        return 0
+    if report["status"] == "fresh":
+        print(f"Guide is up to date ({report['seconds'] * 1000:.1f} ms)")
+    else:
+        print(f"Guide {report['status']} in {report['seconds']:.2f}s: "
+              f"{len(report['rendered'])} sections rendered, {len(report['reused'])} reused")
+        for path in report["outputs"]:
+            print(f"  {path}")
+    return 0
+
+
+# statements
+
+def check_statements(backup, out_dir):
+    from tdc_backup import COLLECTIONS, find_collection_files
+
+    problems = []
+    if os.path.isdir(backup):
+        files = find_collection_files(backup)
+        for name in COLLECTIONS:
+            print(f"{name}: {files.get(name, 'missing')}")
+        if "members" not in files:
+            problems.append(f"no members file in {backup}")
+    elif os.path.isfile(backup):
+        try:
+            with open(backup, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if "members" not in data:
+                problems.append(f"{backup} has no members collection")
+        except (OSError, ValueError) as e:
+            problems.append(f"{backup}: {e}")
+    else:
+        problems.append(f"backup {backup} does not exist")
+    if not _writable(os.path.join(out_dir, "statement.pdf")):
+        problems.append(f"cannot write to {out_dir}")
+    for problem in problems:
+        _err(problem)
+    return 1 if problems else 0
+
+
+def cmd_statements(args):
+    if args.check:
+        return check_statements(args.backup, args.out_dir)
+    from tdc_statements import DEFAULT_CHUNKSIZE, render_statements
+
+    report = render_statements(args.backup, args.out_dir, args.workers, args.chunksize or DEFAULT_CHUNKSIZE,
+                               args.member_ids)
+    return 1 if report["errors"] else 0
+
+
+# report
+
+def cmd_report(args):
+    from tdc_report import main as report_main
+
+    return report_main(args.forwarded)
+
+
+# csv
+
+def cmd_csv(args):
+    from tdc_csv_pdf import main as csv_main
+
+    return csv_main(args.forwarded)
+
+
+# bench
+
+def cmd_bench(args):
+    from tdc_bench import main as bench_main
+
+    return bench_main(args.forwarded)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="tdc", description="Build Thunder Dragon Club documents")
+    commands = parser.add_subparsers(dest="command", metavar="COMMAND")
+
+    guide = commands.add_parser("guide", help="build the user guide (incrementally)")
+    guide.add_argument("-o", "--output", action="append",
+                       help="output PDF, repeatable, or - for stdout (default: both published copies)")
+    guide.add_argument("--spec", help="guide spec (default: tdc_guide_spec.json)")
+    guide.add_argument("--force", action="store_true", help="re-stitch even if the outputs look up to date")
+    guide.add_argument("--workers", type=int, default=1,
+                       help="processes rendering missing sections in parallel (0: CPU count, default 1)")
+    guide.add_argument("--check", action="store_true", help="pre-flight only: validate and report, render nothing")
+    guide.add_argument("--watch", action="store_true",
+                       help="stay running and rebuild whenever the spec, logo or rendering code changes")
+    guide.add_argument("--interval", type=float, default=0.1, help="seconds between --watch polls (default 0.1)")
+    guide.add_argument("-q", "--quiet", action="store_true")
+    guide.set_defaults(handler=cmd_guide)
+
+    statements = commands.add_parser("statements", help="render a statement for every member in a backup")
+    statements.add_argument("backup", help="backup folder of collection CSVs, or a JSON export")
+    statements.add_argument("out_dir", help="directory for statement_<member id>.pdf files")
+    statements.add_argument("--workers", type=positive_int, help="worker processes (default: CPU count)")
+    statements.add_argument("--chunksize", type=positive_int, help="members per dispatched task (default 32)")
+    statements.add_argument("--member", action="append", dest="member_ids", help="only render this member id")
+    statements.add_argument("--check", action="store_true", help="pre-flight only: check the backup and output dir")
+    statements.set_defaults(handler=cmd_statements)
+
+    report = commands.add_parser("report", help="render the program-wide analytics report (see tdc_report.py --help)",
+                                 add_help=False)
+    report.add_argument("forwarded", nargs=argparse.REMAINDER)
+    report.set_defaults(handler=cmd_report)
+
+    csv_pdf = commands.add_parser("csv", help="print a CSVExport.js download as PDF tables (see tdc_csv_pdf.py --help)",
+                                  add_help=False)
+    csv_pdf.add_argument("forwarded", nargs=argparse.REMAINDER)
+    csv_pdf.set_defaults(handler=cmd_csv)
+
+    bench = commands.add_parser("bench", help="run the benchmark suite (see tdc_bench.py --help)",
+                                add_help=False)
+    bench.add_argument("forwarded", nargs=argparse.REMAINDER)
+    bench.set_defaults(handler=cmd_bench)
+    return parser
+
+
+# Commands whose arguments, options and --help included, go to another module's parser
+# (argparse.REMAINDER stops collecting at a leading option)
+FORWARDING_COMMANDS = {"bench": cmd_bench, "report": cmd_report, "csv": cmd_csv}
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else list(argv)
+    if argv and argv[0] in FORWARDING_COMMANDS:
+        return FORWARDING_COMMANDS[argv[0]](argparse.Namespace(forwarded=argv[1:])) or 0
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if not getattr(args, "handler", None):
+        parser.print_help()
+        return 2
+    return args.handler(args) or 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
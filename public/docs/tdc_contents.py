@@ -0,0 +1,202 @@
+"""Tables of contents, outlines and named destinations in a single layout pass.
+
+Reportlab's ``TableOfContents`` needs ``multiBuild``: the whole document is
+laid out again until the page numbers stop moving. Here the contents only has
+to know *which* headings there are. The page number beside each entry is a
+form XObject that ``ThunderDragonGuide`` defines when the document is saved,
+by which time every heading's page is known, so page numbers moving never
+costs a second layout.
+
+The headings (titles, levels, pages and positions) come from the last build
+of the same kind of document, kept by a ``LayoutCache``. A build is one pass
+unless the headings themselves changed; then it is laid out once more with
+the headings the first pass found.
+
+    data, passes = build_with_contents(
+        lambda buffer: ThunderDragonGuide(buffer, outline_levels=OUTLINE_LEVELS, bookmarks=True),
+        lambda entries: [title, *contents_flowables(entries, styles), *body],
+        "statement",
+    )
+"""
+import hashlib
+import io
+import json
+import os
+from xml.sax.saxutils import escape
+
+from reportlab.lib.units import inch
+from reportlab.platypus import Flowable, Table, TableStyle
+
+from tdc_assets import _atomic_write, cache_root
+from tdc_paragraphs import CachedParagraph
+from tdc_spec import FrozenParagraphStyle
+
+CONTENTS_TABLE_STYLE = TableStyle([
+    ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 0),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 0),
+    ('TOPPADDING', (0, 0), (-1, -1), 2),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 2),
+])
+LEVEL_INDENT = 18
+
+# (base style, name) -> frozen clone, so contents entries share cached layouts across documents
+_contents_styles = {}
+
+
+def page_form_name(key):
+    return "tdcPageOf-" + key
+
+
+class PageReference(Flowable):
+    """The page number of a heading, drawn through a form filled in at save time"""
+
+    def __init__(self, key, width, style):
+        super().__init__()
+        self.key = key
+        self.width = width
+        self.height = style.leading
+        self.font_name = style.fontName
+        self.font_size = style.fontSize
+        self.color = style.textColor
+        # Same baseline as a one-line Paragraph in this style
+        self.baseline = style.leading - style.fontSize
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        self.canv._doctemplate.page_references[self.key] = self
+        self.canv.doForm(page_form_name(self.key))
+
+
+def define_page_forms(canvas, references, pages):
+    """Define the form of every PageReference drawn, from key -> page number"""
+    for key, reference in references.items():
+        canvas.beginForm(page_form_name(key))
+        canvas.setFont(reference.font_name, reference.font_size)
+        canvas.setFillColor(reference.color)
+        canvas.drawRightString(reference.width, reference.baseline, str(pages.get(key, "?")))
+        canvas.endForm()
+
+
+def contents_entries(headings):
+    """(level, title, key) for each recorded heading: what the contents' layout depends on"""
+    return [(heading["level"], heading["title"], heading["key"]) for heading in headings]
+
+
+def _contents_style(base, name, **attrs):
+    style = _contents_styles.get((base, name))
+    if style is None:
+        style = _contents_styles[(base, name)] = FrozenParagraphStyle.freeze(base.clone(name, **attrs))
+    return style
+
+
+def contents_flowables(entries, styles, title="Contents", width=6.5 * inch, number_width=0.6 * inch):
+    """A title and one row per entry: the heading (a link to it) and its page number"""
+    base = styles["Normal"]
+    rows = []
+    for level, text, key in entries:
+        style = _contents_style(base, f"Contents{level}", leftIndent=level * LEVEL_INDENT, spaceBefore=0,
+                                spaceAfter=0, fontName="Helvetica-Bold" if level == 0 else base.fontName)
+        rows.append([CachedParagraph(f'<a href="#{key}">{escape(text)}</a>', style),
+                     PageReference(key, number_width, style)])
+    # Not Heading1 itself, or the contents would list itself
+    heading = _contents_style(styles["Heading1"], "ContentsTitle")
+    elements = [CachedParagraph(escape(title), heading)]
+    if rows:
+        table = Table(rows, colWidths=[width - number_width, number_width], hAlign="LEFT")
+        table.setStyle(CONTENTS_TABLE_STYLE)
+        elements.append(table)
+    return elements
+
+
+class LayoutCache:
+    """Headings of the last build of each kind of document, under ``<root>/layouts``.
+
+    Kept in memory too, so batch workers read each layout from disk once and
+    only write it back when it changed.
+    """
+
+    def __init__(self, root=None):
+        self.root = os.path.join(root or cache_root(), "layouts")
+        self._memo = {}
+
+    def _path(self, name):
+        return os.path.join(self.root, hashlib.sha256(name.encode("utf-8")).hexdigest()[:32] + ".json")
+
+    def get(self, name):
+        if name not in self._memo:
+            try:
+                with open(self._path(name), "r", encoding="utf-8") as f:
+                    self._memo[name] = json.load(f)
+            except (OSError, ValueError):
+                self._memo[name] = None
+        return self._memo[name]
+
+    def put(self, name, headings):
+        if self.get(name) == headings:
+            return
+        self._memo[name] = headings
+        os.makedirs(self.root, exist_ok=True)
+        _atomic_write(self._path(name), json.dumps(headings, sort_keys=True).encode("utf-8"))
+
+
+_default_layouts = None
+
+
+def default_layouts():
+    global _default_layouts
+    if _default_layouts is None:
+        _default_layouts = LayoutCache()
+    return _default_layouts
+
+
+def build_with_contents(make_doc, make_story, layout_name, layouts=None, max_passes=3, target=None):
+    """Build a document whose story includes a table of contents.
+
+    ``make_doc(buffer)`` returns a doc template recording headings (see
+    ``ThunderDragonGuide(outline_levels=...)``); ``make_story(entries)``
+    returns fresh flowables with the contents built from ``entries``.
+    Returns the PDF bytes and the number of layout passes it took.
+
+    With a tdc_output ``target`` the document is written there, page by
+    page, and ``target.commit()`` is returned instead of the bytes. Another
+    pass starts the target over; a target that can't be (a pipe, a socket)
+    gets its passes rendered in memory and the last one written in one go.
+    """
+    layouts = layouts or default_layouts()
+    cached = layouts.get(layout_name)
+    headings = cached or []
+    output = target
+    if target is not None and not target.rewindable:
+        from tdc_output import MemoryTarget
+
+        output = MemoryTarget(target.compression)
+    try:
+        for passes in range(1, max_passes + 1):
+            if output is None:
+                buffer = io.BytesIO()
+                doc = make_doc(buffer)
+                doc.build(make_story(contents_entries(headings)))
+            else:
+                doc = make_doc(output.open())
+                doc.build(make_story(contents_entries(headings)), canvasmaker=output.canvasmaker)
+            moved = contents_entries(doc.headings) != contents_entries(headings)
+            headings = doc.headings
+            if not moved:
+                break
+        if output is not target:
+            view = output.commit()
+            target.open().write(view)
+    except BaseException:
+        if target is not None:
+            target.abort()
+        raise
+    if cached is None or passes > 1:
+        # Only the headings matter to the next build; don't rewrite the
+        # layout for every document whose pages merely differ
+        layouts.put(layout_name, headings)
+    if target is None:
+        return buffer.getvalue(), passes
+    return target.commit(), passes
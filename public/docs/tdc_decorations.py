@@ -0,0 +1,233 @@
+"""Page decorations drawn once per document and reused on every page.
+
+A ``PageDecorator`` is an ``onPage`` callback built from decorations. The
+static ones (background, watermark, footer text) are recorded the first time
+it runs into a single PDF form XObject; every page, the first included, then
+only emits one ``/Form Do`` operator for them. Decorations that change per
+page (page numbers) draw just their variable part directly.
+
+    decorator = PageDecorator([
+        Background(BACKGROUND_COLOR),
+        Watermark("logo.png", width=4 * inch, height=2.4 * inch, alpha=0.08),
+        Footer("Thunder Dragon Club - Member Guide"),
+        PageNumbers(),
+    ])
+    PageTemplate(id="chrome", frames=frame, onPage=decorator)
+
+Run ``python tdc_decorations.py`` to compare the per-page cost in time and
+bytes with drawing the same decorations inline on every page.
+"""
+import argparse
+import io
+import time
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfdoc import PDFResourceDictionary, xObjectName
+
+from tdc_images import draw_image, prepare_image
+
+DEFAULT_FORM_NAME = "tdcPageChrome"
+
+
+class Decoration:
+    """Something drawn on every page. Static decorations go into the shared form"""
+
+    static = True
+
+    def draw(self, canvas, doc):
+        raise NotImplementedError
+
+
+class Background(Decoration):
+    """A full-page solid fill"""
+
+    def __init__(self, color):
+        self.color = color
+
+    def draw(self, canvas, doc):
+        canvas.setFillColor(self.color)
+        canvas.rect(0, 0, doc.pagesize[0], doc.pagesize[1], fill=True)
+
+
+class Watermark(Decoration):
+    """A translucent image, centred on the page unless x/y are given"""
+
+    def __init__(self, image, width, height, alpha=0.1, x=None, y=None):
+        self.image = image
+        self.width = width
+        self.height = height
+        self.alpha = alpha
+        self.x = x
+        self.y = y
+
+    def draw(self, canvas, doc):
+        page_width, page_height = doc.pagesize
+        x = (page_width - self.width) / 2 if self.x is None else self.x
+        y = (page_height - self.height) / 2 if self.y is None else self.y
+        canvas.saveState()
+        canvas.setFillAlpha(self.alpha)
+        draw_image(canvas, prepare_image(self.image, self.width, self.height), x, y, self.width, self.height)
+        canvas.restoreState()
+
+
+class Footer(Decoration):
+    """A line of text and an optional rule above it, centred in the bottom margin"""
+
+    def __init__(self, text, font_name="Helvetica", font_size=8, color=colors.grey, rule_color=None, y=0.5 * inch):
+        self.text = text
+        self.font_name = font_name
+        self.font_size = font_size
+        self.color = color
+        self.rule_color = rule_color
+        self.y = y
+
+    def draw(self, canvas, doc):
+        page_width = doc.pagesize[0]
+        if self.rule_color is not None:
+            canvas.setStrokeColor(self.rule_color)
+            canvas.setLineWidth(0.5)
+            canvas.line(doc.leftMargin, self.y + self.font_size + 4, page_width - doc.rightMargin, self.y + self.font_size + 4)
+        canvas.setFillColor(self.color)
+        canvas.setFont(self.font_name, self.font_size)
+        canvas.drawCentredString(page_width / 2, self.y, self.text)
+
+
+class PageNumbers(Decoration):
+    """The current page number, right-aligned at the right margin by default"""
+
+    static = False
+
+    def __init__(self, format="Page {page}", font_name="Helvetica", font_size=8, color=colors.grey,
+                 align="right", y=0.5 * inch):
+        self.format = format
+        self.font_name = font_name
+        self.font_size = font_size
+        self.color = color
+        self.align = align
+        self.y = y
+
+    def draw(self, canvas, doc):
+        text = self.format.format(page=canvas.getPageNumber())
+        canvas.setFillColor(self.color)
+        canvas.setFont(self.font_name, self.font_size)
+        if self.align == "left":
+            canvas.drawString(doc.leftMargin, self.y, text)
+        elif self.align == "center":
+            canvas.drawCentredString(doc.pagesize[0] / 2, self.y, text)
+        else:
+            canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, self.y, text)
+
+
+def _add_graphics_states(canvas, name):
+    """Give a form the ExtGState resources (alpha etc.) its content uses.
+
+    Reportlab records them on the form but only writes fonts and XObjects
+    into a form's resource dictionary, so translucent watermarks would lose
+    their alpha.
+    """
+    form = canvas._doc.idToObject[xObjectName(name)]
+    if not getattr(form, "ExtGState", None):
+        return
+    resources = PDFResourceDictionary()
+    resources.basicFonts()
+    resources.allProcs()
+    if form.XObjects:
+        resources.XObject = form.XObjects
+    resources.ExtGState = form.ExtGState
+    form.Resources = resources
+
+
+class PageDecorator:
+    """``onPage`` callback drawing static decorations through one shared form XObject.
+
+    With ``use_form=False`` everything is drawn inline on each page, which is
+    only useful for comparison.
+    """
+
+    def __init__(self, decorations, form_name=DEFAULT_FORM_NAME, use_form=True):
+        self.static = [d for d in decorations if d.static]
+        self.dynamic = [d for d in decorations if not d.static]
+        self.form_name = form_name
+        self.use_form = use_form
+
+    def _draw(self, decorations, canvas, doc):
+        for decoration in decorations:
+            canvas.saveState()
+            decoration.draw(canvas, doc)
+            canvas.restoreState()
+
+    def __call__(self, canvas, doc):
+        if self.static:
+            if not self.use_form:
+                self._draw(self.static, canvas, doc)
+            else:
+                # Forms belong to the canvas' document, so the first page of
+                # every build records it (a doc template may build many times)
+                if not canvas.hasForm(self.form_name):
+                    canvas.beginForm(self.form_name)
+                    self._draw(self.static, canvas, doc)
+                    canvas.endForm()
+                    _add_graphics_states(canvas, self.form_name)
+                canvas.doForm(self.form_name)
+        self._draw(self.dynamic, canvas, doc)
+
+
+# Benchmark
+
+def _bench_build(pages, use_form, logo_path):
+    from reportlab.platypus import PageBreak, Paragraph
+    from generate_tdc_guide import BACKGROUND_COLOR, ThunderDragonGuide, build_styles
+
+    if use_form is None:
+        decorations = []
+    else:
+        decorations = [Background(BACKGROUND_COLOR)]
+        if logo_path:
+            decorations.append(Watermark(logo_path, 4 * inch, 2.4 * inch, alpha=0.08))
+        decorations += [Footer("Thunder Dragon Club - Member Guide", rule_color=colors.lightgrey), PageNumbers()]
+    styles = build_styles()
+    story = []
+    for page in range(pages):
+        story.append(Paragraph(f"Page body {page}", styles["Normal"]))
+        story.append(PageBreak())
+    buffer = io.BytesIO()
+    doc = ThunderDragonGuide(buffer, pagesize=letter, invariant=1,
+                             decorator=PageDecorator(decorations, use_form=use_form))
+    started = time.perf_counter()
+    doc.build(story)
+    return time.perf_counter() - started, len(buffer.getvalue())
+
+
+def benchmark(sizes=(10, 100, 1000), logo_path=None):
+    """Per-page cost of the decorations, drawn inline vs. through the shared form.
+
+    Marginal cost is measured between consecutive sizes, so fixed per-document
+    costs (fonts, the form itself, the logo image) drop out; "none" is a
+    build without decorations for reference.
+    """
+    results = []
+    for mode, use_form in (("none", None), ("inline", False), ("form", True)):
+        previous = None
+        for pages in sizes:
+            seconds, size = _bench_build(pages, use_form, logo_path)
+            result = {"mode": mode, "pages": pages, "seconds": round(seconds, 4), "bytes": size}
+            if previous:
+                added = pages - previous["pages"]
+                result["bytes_per_page"] = round((size - previous["bytes"]) / added, 1)
+                result["ms_per_page"] = round((seconds - previous["seconds"]) * 1000 / added, 3)
+            results.append(result)
+            previous = result
+            print(f"{mode:>6} {pages:>6} pages {seconds:>7.3f}s {size:>10,} bytes"
+                  + (f"  marginal {result['bytes_per_page']:>7.1f} B/page {result['ms_per_page']:>6.3f} ms/page"
+                     if "bytes_per_page" in result else ""))
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure per-page decoration overhead")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--logo", help="image to use as a watermark")
+    args = parser.parse_args()
+    benchmark(args.sizes, args.logo)
@@ -0,0 +1,267 @@
+"""Image preparation: scale once, compress to suit, decode once per process.
+
+Handing a full-resolution file to ``Image`` embeds every pixel and, for
+anything but a JPEG, makes reportlab decode and re-compress the bitmap in
+each document it appears in. Here an image goes through three stages:
+
+* ``prepare_image`` scales the source down to the pixels its box needs at
+  ``dpi`` (never up) and recompresses it: PNG (Flate) for anything with
+  transparency or few colours, JPEG for photographs. The result is cached
+  on disk under ``<cache>/images/``, keyed on the source bytes and the
+  target size, so the work happens once per asset, not once per build.
+* ``shared_xobject`` turns a prepared file into a PDF image object once per
+  process (binary streams, no ASCII85), and every document rendered in the
+  process embeds that same object.
+* ``PreparedImage`` is the flowable (and ``draw_image`` the canvas call)
+  that uses them, fitting the image in its box with its aspect ratio kept.
+
+Both per-process memos are bounded LRUs (``MAX_PREPARED`` paths and
+``MAX_XOBJECTS`` decoded images), so a long-running server or watcher does
+not grow with every image it has ever drawn. The path memo also checks the
+source's modification time and size, so an edited file is prepared again.
+Sharing an image object across documents goes through
+``PDFDocument.addForm``, which is not public API; see tdc_reportlab for the
+releases this has been checked against.
+
+Run ``python tdc_images.py photo.jpg logo.png`` to compare size and render
+time per document with plain ``Image`` flowables.
+"""
+import argparse
+import hashlib
+import io
+import os
+import time
+import zlib
+
+from reportlab.lib.units import inch
+from reportlab.pdfbase.pdfdoc import PDFImageXObject, PDFObjectReference, __InternalName__
+from reportlab.platypus import Flowable
+
+from tdc_assets import _atomic_write, cache_root
+from tdc_paragraphs import _LRU
+from tdc_reportlab import require_tested_reportlab
+
+require_tested_reportlab(__name__)
+
+DEFAULT_DPI = 150
+JPEG_QUALITY = 85
+# Images with at most this many colours are graphics: Flate keeps them exact
+# and small, where JPEG would blur edges and grow the file
+GRAPHIC_MAX_COLORS = 256
+# Bump when the output of prepare_image changes for the same input
+PIPELINE_VERSION = 1
+
+MAX_PREPARED = 512
+# Each holds a compressed bitmap, up to a few MB for a photo
+MAX_XOBJECTS = 64
+
+_prepared = _LRU(MAX_PREPARED)  # (source, mtime ns, size, (width px, height px)) -> prepared path
+_xobjects = _LRU(MAX_XOBJECTS)  # prepared path -> (image object, soft mask object or None)
+
+
+def _source_digest(source):
+    with open(source, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def fit_size(size, width, height):
+    """Largest (w, h) with the aspect ratio of size that fits in width x height"""
+    scale = min(width / size[0], height / size[1])
+    return size[0] * scale, size[1] * scale
+
+
+def _has_transparency(image):
+    if image.mode in ("RGBA", "LA"):
+        return image.getchannel("A").getextrema()[0] < 255
+    return image.mode == "P" and "transparency" in image.info
+
+
+def _encode(image):
+    """Bytes and extension for a prepared image: PNG for graphics and transparency, else JPEG"""
+    buffer = io.BytesIO()
+    if _has_transparency(image):
+        image.convert("RGBA").save(buffer, "PNG", optimize=True)
+        return buffer.getvalue(), ".png"
+    image = image.convert("L" if image.mode in ("1", "L", "LA") else "RGB")
+    if image.getcolors(GRAPHIC_MAX_COLORS) is not None:
+        image.save(buffer, "PNG", optimize=True)
+        return buffer.getvalue(), ".png"
+    image.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True)
+    return buffer.getvalue(), ".jpg"
+
+
+def prepare_image(source, width, height, dpi=DEFAULT_DPI, root=None):
+    """Path of source scaled to fit width x height points at dpi and recompressed (cached)"""
+    from PIL import Image
+
+    box = (max(1, round(width * dpi / inch)), max(1, round(height * dpi / inch)))
+    # Keyed on the file's stat too, so an edited source (the logo under tdc watch) is prepared again
+    stat = os.stat(source)
+    memo_key = (source, stat.st_mtime_ns, stat.st_size, box)
+    path = _prepared.get(memo_key)
+    if path is not None:
+        return path
+    directory = os.path.join(root or cache_root(), "images")
+    key = hashlib.sha256(f"{_source_digest(source)}:{box[0]}x{box[1]}:{JPEG_QUALITY}:{PIPELINE_VERSION}"
+                         .encode("ascii")).hexdigest()
+    for extension in (".png", ".jpg"):
+        candidate = os.path.join(directory, key + extension)
+        if os.path.exists(candidate):
+            _prepared.put(memo_key, candidate)
+            return candidate
+
+    with Image.open(source) as image:
+        image.load()
+        size = fit_size(image.size, *box)
+        size = (max(1, round(size[0])), max(1, round(size[1])))
+        if size[0] < image.width:
+            image = image.resize(size, Image.LANCZOS)
+        data, extension = _encode(image)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, key + extension)
+    _atomic_write(path, data)
+    _prepared.put(memo_key, path)
+    return path
+
+
+def _image_object(name, width, height, color_space, data, filters):
+    xobject = PDFImageXObject(name)
+    xobject.width, xobject.height = width, height
+    xobject.bitsPerComponent = 8
+    xobject.colorSpace = color_space
+    xobject.streamContent = data
+    xobject._filters = filters
+    xobject.mask = None
+    return xobject
+
+
+def shared_xobject(path):
+    """The PDF image object (and soft mask) for a prepared file, built once per process"""
+    from PIL import Image
+
+    cached = _xobjects.get(path)
+    if cached is not None:
+        return cached
+    name = "tdcImage" + hashlib.md5(path.encode("utf-8")).hexdigest()
+    with Image.open(path) as image:
+        if image.format == "JPEG":
+            color_space = {"L": "DeviceGray", "CMYK": "DeviceCMYK"}.get(image.mode, "DeviceRGB")
+            with open(path, "rb") as f:
+                xobject = _image_object(name, image.width, image.height, color_space, f.read(), ("DCTDecode",))
+            cached = (xobject, None)
+        else:
+            smask = None
+            if _has_transparency(image):
+                image = image.convert("RGBA")
+                alpha = image.getchannel("A")
+                smask = _image_object(name + "Mask", image.width, image.height, "DeviceGray",
+                                      zlib.compress(alpha.tobytes(), 9), ("FlateDecode",))
+            image = image.convert("L" if image.mode == "L" else "RGB")
+            color_space = "DeviceGray" if image.mode == "L" else "DeviceRGB"
+            xobject = _image_object(name, image.width, image.height, color_space,
+                                    zlib.compress(image.tobytes(), 9), ("FlateDecode",))
+            cached = (xobject, smask)
+    _xobjects.put(path, cached)
+    return cached
+
+
+def _register(canvas, xobject):
+    doc = canvas._doc
+    reg_name = doc.getXObjectName(xobject.name)
+    if not doc.idToObject.get(reg_name):
+        # The object remembers the last document it was registered in
+        xobject.__dict__.pop(__InternalName__, None)
+        doc.addForm(xobject.name, xobject)
+    return reg_name
+
+
+def draw_image(canvas, path, x, y, width, height):
+    """Draw a prepared image fitted (aspect kept, centred) in the box at x, y"""
+    xobject, smask = shared_xobject(path)
+    if smask is not None:
+        # By name, so the shared object is right in every document
+        xobject.smask = PDFObjectReference(_register(canvas, smask))
+    _register(canvas, xobject)
+    draw_width, draw_height = fit_size((xobject.width, xobject.height), width, height)
+    # What drawImage sets: the page declares the image procedure sets
+    canvas._currentPageHasImages = 1
+    canvas.saveState()
+    canvas.translate(x + (width - draw_width) / 2, y + (height - draw_height) / 2)
+    canvas.scale(draw_width, draw_height)
+    # An image XObject is drawn like a form, and doForm puts it in the page's resources
+    canvas.doForm(xobject.name)
+    canvas.restoreState()
+
+
+class PreparedImage(Flowable):
+    """An image fitted in drawWidth x drawHeight, prepared for that size when first drawn.
+
+    Like ``Image``, ``drawWidth``/``drawHeight`` may be changed after
+    construction; here they are the box, and the aspect ratio is kept.
+    """
+
+    def __init__(self, source, width, height, dpi=DEFAULT_DPI, hAlign="CENTER"):
+        super().__init__()
+        self.source = source
+        self.drawWidth = width
+        self.drawHeight = height
+        self.dpi = dpi
+        self.hAlign = hAlign
+
+    def _path(self):
+        return prepare_image(self.source, self.drawWidth, self.drawHeight, self.dpi)
+
+    def wrap(self, availWidth, availHeight):
+        xobject, _ = shared_xobject(self._path())
+        self._size = fit_size((xobject.width, xobject.height), self.drawWidth, self.drawHeight)
+        return self._size
+
+    def draw(self):
+        draw_image(self.canv, self._path(), 0, 0, *self._size)
+
+
+def warm(source, width, height, dpi=DEFAULT_DPI):
+    """Prepare and decode an image ahead of the first document (worker start-up)"""
+    shared_xobject(prepare_image(source, width, height, dpi))
+
+
+# Benchmark
+
+def _bench_document(images, prepared, pages):
+    from reportlab.lib.pagesizes import letter
+    from reportlab.platypus import Image, PageBreak
+    from generate_tdc_guide import ThunderDragonGuide
+
+    story = []
+    for page in range(pages):
+        for source in images:
+            if prepared:
+                story.append(PreparedImage(source, 3.6 * inch, 2.4 * inch))
+            else:
+                story.append(Image(source, width=3.6 * inch, height=2.4 * inch))
+        story.append(PageBreak())
+    buffer = io.BytesIO()
+    ThunderDragonGuide(buffer, pagesize=letter).build(story)
+    return len(buffer.getvalue())
+
+
+def benchmark(images, docs=10, pages=2):
+    """Per-document size and render time: plain Image vs PreparedImage"""
+    results = []
+    for mode, prepared in (("image", False), ("prepared", True)):
+        _bench_document(images, prepared, 1)  # warm-up: imports, and the one-off preparation
+        started = time.perf_counter()
+        sizes = [_bench_document(images, prepared, pages) for _ in range(docs)]
+        ms = (time.perf_counter() - started) * 1000 / docs
+        results.append({"mode": mode, "ms_per_doc": round(ms, 2), "bytes_per_doc": sizes[-1]})
+        print(f"{mode:>9} {ms:>8.2f} ms/doc {sizes[-1]:>11,} bytes/doc")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare plain and prepared images per document")
+    parser.add_argument("images", nargs="+", help="image files, each drawn 3.6 x 2.4 inch on every page")
+    parser.add_argument("--docs", type=int, default=10)
+    parser.add_argument("--pages", type=int, default=2)
+    args = parser.parse_args()
+    benchmark(args.images, args.docs, args.pages)
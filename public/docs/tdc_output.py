@@ -0,0 +1,387 @@
+"""Output targets: where a rendered PDF goes, written as its pages finish.
+
+Reportlab assembles the whole file in memory when the canvas is saved, and
+the document templates only know filenames and files. A target decides
+where the bytes go and how hard page streams are compressed:
+
+* ``MemoryTarget`` builds into a BytesIO and ``result()`` is a
+  ``memoryview`` of it, for handing to an HTTP response or a zip archive
+  without a copy,
+* ``StreamTarget`` writes to any binary file-like object (a pipe,
+  ``socket.makefile("wb")``, ``sys.stdout.buffer``, ``ZipFile.open(name,
+  "w")``); nothing is read back and it never has to seek,
+* ``FileTarget`` writes a temporary file next to the path and renames it
+  into place once the document is complete, so a reader never sees half a
+  PDF and a failed render leaves the old file alone.
+
+Their canvas (``target.canvasmaker``) is an ``IncrementalCanvas``: every
+page's content stream and page dictionary are written out the moment the
+page ends, and only the shared objects (fonts, forms, outline, the
+cross-reference table) and pages that use a form not defined yet wait for
+``save()``. What stays in memory per page is its object numbers and file
+offsets for the cross-reference table, under 1 KB. ``compression`` is the
+zlib level of those page streams, 0 for none to 9 for smallest.
+
+    target = MemoryTarget(compression=1)
+    render(target, lambda f: ThunderDragonGuide(f, pagesize=letter), story)
+    archive.writestr("guide.pdf", target.result())
+
+``python tdc_output.py`` compares the targets and compression levels.
+"""
+import argparse
+import functools
+import io
+import os
+import sys
+import tempfile
+import time
+import zlib
+
+from reportlab import rl_config
+from reportlab.pdfbase.pdfdoc import (
+    NoEncryption, PDFCrossReferenceTable, PDFDocument, PDFFile, PDFIndirectObject, PDFObjectReference, PDFStream,
+    PDFTrailer,
+)
+
+from tdc_assets import _replace
+from tdc_reportlab import require_tested_reportlab
+from tdc_streaming import StreamingCanvas
+
+require_tested_reportlab(__name__)
+
+DEFAULT_COMPRESSION = zlib.Z_DEFAULT_COMPRESSION
+
+
+class _IncrementalFile(PDFFile):
+    """A PDFFile that writes to a stream as it goes instead of collecting strings"""
+
+    def __init__(self, stream, pdfVersion):
+        super().__init__(pdfVersion)
+        self.write = stream.write
+        for data in self.strings:
+            stream.write(data)
+        self.strings = None
+
+    def format(self, document):
+        return b""
+
+
+def _comment(obj, oid):
+    if rl_config.invariant or not rl_config.pdfComments:
+        return None
+    return "%% %s: class %s \n" % (ascii(oid), obj.__class__.__name__[:50])
+
+
+class _IncrementalDocument(PDFDocument):
+    """PDFDocument whose objects can be written before save; IncrementalCanvas swaps it in.
+
+    Reportlab has no hook for either, so this sets the class of the canvas's
+    document and overrides ``format`` with a copy of ``PDFDocument.format``;
+    tdc_reportlab keeps the module to the releases that copy was checked on.
+    """
+
+    def _output(self):
+        if self._file is None:
+            self._file = _IncrementalFile(self._stream, self._pdfVersion)
+        return self._file
+
+    def write_now(self, obj):
+        """Write obj as an indirect object straight away and forget it; returns its name.
+
+        Raises KeyError, writing nothing, if obj refers to an object that is
+        not defined yet.
+        """
+        name = self.Reference(obj).name
+        formatted = PDFIndirectObject(name, obj).format(self)
+        output = self._output()
+        comment = _comment(obj, name)
+        if comment:
+            output.add(comment)
+        self.idToOffset[name] = output.add(formatted)
+        self._written.add(name)
+        # Only its number is needed from here on
+        self.idToObject[name] = None
+        return name
+
+    def format(self):
+        # PDFDocument.format (unchanged from reportlab 4.0 to 5.0), minus the objects
+        # already written and the final join
+        self.encrypt.prepare(self)
+        cat = self.Catalog
+        info = self.info
+        self.Reference(cat)
+        self.Reference(info)
+        encryptref = None
+        encryptinfo = self.encrypt.info()
+        if encryptinfo:
+            encryptref = self.Reference(encryptinfo)
+        output = self.__accum__ = self._output()
+        ids = []
+        counter = 0
+        while True:
+            counter += 1
+            if counter not in self.numberToId:
+                break
+            oid = self.numberToId[counter]
+            ids.append(oid)
+            if oid in self._written:
+                continue
+            obj = self.idToObject[oid]
+            formatted = PDFIndirectObject(oid, obj).format(self)
+            comment = _comment(obj, oid)
+            if comment:
+                output.add(comment)
+            self.idToOffset[oid] = output.add(formatted)
+        del self.__accum__
+        if counter - 1 != len(self.numberToId):
+            raise ValueError("counter %s doesn't match number to id dictionary %s" % (counter, len(self.numberToId)))
+        xref = PDFCrossReferenceTable()
+        xref.addsection(0, ids)
+        xrefoffset = output.add(xref.format(self))
+        trailer = PDFTrailer(startxref=xrefoffset, Size=len(self.numberToId) + 1, Root=self.Reference(cat),
+                             Info=self.Reference(info), Encrypt=encryptref, ID=self.ID())
+        output.add(trailer.format(self))
+        return b""
+
+
+class IncrementalCanvas(StreamingCanvas):
+    """StreamingCanvas writing each finished page's content to its (binary, writable) file at once"""
+
+    def __init__(self, filename, compression=DEFAULT_COMPRESSION, **kw):
+        if not hasattr(filename, "write"):
+            raise TypeError("IncrementalCanvas writes to a file object, not a path")
+        super().__init__(filename, compression=compression, **kw)
+        doc = self._doc
+        doc.__class__ = _IncrementalDocument
+        doc._stream = filename
+        doc._file = None
+        doc._written = set()
+
+    def showPage(self):
+        super().showPage()
+        doc = self._doc
+        # Encryption is only set up at save time; leave those documents to it
+        if not isinstance(doc.encrypt, NoEncryption):
+            return
+        page = doc.Pages.pages[-1]
+        if isinstance(page.Contents, PDFStream):
+            doc.write_now(page.Contents)
+        # The page dictionary too, so nothing of the page stays in memory, unless
+        # it uses a form defined later (tdc_contents' page numbers): that waits for save
+        try:
+            doc.Pages.pages[-1] = PDFObjectReference(doc.write_now(page))
+        except KeyError:
+            pass
+
+
+class _CountingWriter:
+    """Write-through wrapper that counts bytes, for streams without tell()"""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.written = 0
+
+    def write(self, data):
+        self.written += len(data)
+        return self.stream.write(data)
+
+
+class OutputTarget:
+    """Base class: open() a binary file for one document, then commit() or abort()"""
+
+    # Whether open() may be called again to start the document over
+    rewindable = False
+
+    def __init__(self, compression=DEFAULT_COMPRESSION):
+        self.compression = compression
+        self.bytes_written = 0
+
+    @property
+    def canvasmaker(self):
+        return functools.partial(IncrementalCanvas, compression=self.compression)
+
+    def open(self):
+        raise NotImplementedError
+
+    def commit(self):
+        """Finish the document; returns result()"""
+        return self.result()
+
+    def abort(self):
+        """Give up on the document"""
+
+    def result(self):
+        return self.bytes_written
+
+
+class MemoryTarget(OutputTarget):
+    """A document in memory; result() is a memoryview of it (no copy)"""
+
+    rewindable = True
+
+    def __init__(self, compression=DEFAULT_COMPRESSION):
+        super().__init__(compression)
+        self.buffer = None
+
+    def open(self):
+        self.buffer = io.BytesIO()
+        return self.buffer
+
+    def commit(self):
+        self.bytes_written = self.buffer.tell()
+        return self.result()
+
+    def abort(self):
+        self.buffer = None
+
+    def result(self):
+        return self.buffer.getbuffer()
+
+    def getvalue(self):
+        """The document as a bytes copy, for pickling (to a parent process, say).
+
+        BytesIO avoids the copy only while nothing else views the buffer: once
+        result() has handed out a memoryview, every call copies the document.
+        """
+        return self.buffer.getvalue()
+
+
+class StreamTarget(OutputTarget):
+    """A document written to a binary file-like object as its pages finish; result() is its size.
+
+    With ``close=True`` the stream is closed when the document is committed or aborted.
+    """
+
+    def __init__(self, stream, compression=DEFAULT_COMPRESSION, close=False):
+        super().__init__(compression)
+        self.stream = stream
+        self.close = close
+        self._writer = None
+
+    def open(self):
+        if self._writer is not None:
+            raise RuntimeError("a stream target can only take one document")
+        self._writer = _CountingWriter(self.stream)
+        return self._writer
+
+    def commit(self):
+        self.bytes_written = self._writer.written
+        flush = getattr(self.stream, "flush", None)
+        if flush is not None:
+            flush()
+        if self.close:
+            self.stream.close()
+        return self.result()
+
+    def abort(self):
+        if self.close:
+            self.stream.close()
+
+
+class FileTarget(OutputTarget):
+    """A document written to a temporary file and renamed to path when complete; result() is its size"""
+
+    rewindable = True
+
+    def __init__(self, path, compression=DEFAULT_COMPRESSION):
+        super().__init__(compression)
+        self.path = os.path.abspath(path)
+        self._file = None
+        self._temp_path = None
+
+    def open(self):
+        if self._file is not None:
+            self._file.seek(0)
+            self._file.truncate()
+            return self._file
+        fd, self._temp_path = tempfile.mkstemp(dir=os.path.dirname(self.path), prefix=".tmp-", suffix=".pdf")
+        self._file = os.fdopen(fd, "wb")
+        return self._file
+
+    def commit(self):
+        self.bytes_written = self._file.tell()
+        try:
+            self._file.close()
+            _replace(self._temp_path, self.path)
+        except BaseException:
+            self.abort()
+            raise
+        self._file = self._temp_path = None
+        return self.result()
+
+    def abort(self):
+        if self._file is not None:
+            self._file.close()
+        if self._temp_path and os.path.exists(self._temp_path):
+            os.unlink(self._temp_path)
+        self._file = self._temp_path = None
+
+
+def target_for(output, compression=DEFAULT_COMPRESSION):
+    """The target for an output argument: a target as is, a binary file-like object, "-" (stdout) or a path.
+
+    Paths to something other than a regular file (os.devnull, a named pipe)
+    are written in place rather than renamed over.
+    """
+    if isinstance(output, OutputTarget):
+        return output
+    if output == "-":
+        return StreamTarget(sys.stdout.buffer, compression)
+    if hasattr(output, "write"):
+        return StreamTarget(output, compression)
+    if os.path.exists(output) and not os.path.isfile(output):
+        return StreamTarget(open(output, "wb"), compression, close=True)
+    return FileTarget(output, compression)
+
+
+def render(target, make_doc, story, **build_kw):
+    """Build make_doc(file)'s document from story into target and return target.commit()"""
+    stream = target.open()
+    try:
+        make_doc(stream).build(story, canvasmaker=target.canvasmaker, **build_kw)
+    except BaseException:
+        target.abort()
+        raise
+    return target.commit()
+
+
+# Benchmark
+
+def _bench_document(target, rows):
+    from tdc_streaming import StreamingGuide, _bench_rows
+    from generate_tdc_guide import build_styles
+
+    return render(target, StreamingGuide, _bench_rows(rows, build_styles()))
+
+
+def benchmark(rows=5000, levels=(0, 1, 6, 9), workdir=None):
+    """Render the same long document into each kind of target, and at each compression level"""
+    import resource
+
+    results = []
+    with tempfile.TemporaryDirectory(dir=workdir) as directory:
+        path = os.path.join(directory, "bench.pdf")
+        targets = [("memory", lambda level: MemoryTarget(level)),
+                   ("stream", lambda level: StreamTarget(open(os.devnull, "wb"), level, close=True)),
+                   ("file", lambda level: FileTarget(path, level))]
+        _bench_document(MemoryTarget(), 100)  # warm-up: imports and fonts
+        for name, make_target in targets:
+            for level in levels:
+                target = make_target(level)
+                started = time.perf_counter()
+                size = _bench_document(target, rows)
+                seconds = time.perf_counter() - started
+                size = len(size) if isinstance(size, memoryview) else size
+                results.append({"target": name, "compression": level, "seconds": round(seconds, 3), "bytes": size})
+                print(f"{name:>7} level {level} {seconds:>7.3f}s {size:>12,} bytes")
+    scale = 1 if sys.platform == "darwin" else 1024
+    print(f"peak RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6:.1f} MB")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare output targets and page-stream compression levels")
+    parser.add_argument("--rows", type=int, default=5000, help="paragraph rows in the benchmark document")
+    parser.add_argument("--levels", type=int, nargs="+", default=[0, 1, 6, 9])
+    args = parser.parse_args()
+    benchmark(args.rows, args.levels)
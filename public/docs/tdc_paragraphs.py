@@ -0,0 +1,209 @@
+"""Paragraph layout memoized across flowables and documents.
+
+The guide repeats the same steps and bullets, and every statement has the
+same title and headings; each of those Paragraphs is parsed (markup into
+fragments) and then wrapped (fragments into lines) afresh. ``CachedParagraph``
+keeps both results in a process-wide ``ParagraphCache``:
+
+* parsed fragments, keyed on (markup, style, bullet text),
+* wrapped lines and height, keyed on the above plus the available width.
+
+Only paragraphs in a registry's frozen styles (``build_styles()``) are
+cached, since a mutable style could change under its cached layout; others,
+and the parts of split paragraphs, lay themselves out as usual. A split
+always re-wraps first, because reportlab's split edits the lines it splits.
+
+Both tables are bounded LRUs, and their hits, misses and evictions show in
+``BuildProfiler`` summaries (see tdc_profile). ``python tdc_paragraphs.py``
+compares repeated guide and statement builds with and without the cache.
+"""
+import argparse
+import collections
+import time
+
+from reportlab.platypus import Paragraph
+from reportlab.rl_config import _FUZZ
+
+DEFAULT_MAX_PARSED = 4096
+DEFAULT_MAX_LAYOUTS = 8192
+
+
+class _LRU:
+    """A bounded mapping that forgets the least recently used entry, with counters"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = collections.OrderedDict()
+        self.hits = self.misses = self.evictions = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+        return entry
+
+    def put(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.misses = self.evictions = 0
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                "evictions": self.evictions, "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0}
+
+
+class ParagraphCache:
+    """Parsed fragments and wrapped lines of CachedParagraphs, shared by every document in a process"""
+
+    def __init__(self, max_parsed=DEFAULT_MAX_PARSED, max_layouts=DEFAULT_MAX_LAYOUTS):
+        self.parsed = _LRU(max_parsed)
+        self.layouts = _LRU(max_layouts)
+        self.enabled = True
+
+    def clear(self):
+        """Forget every entry and zero the counters"""
+        self.parsed.clear()
+        self.layouts.clear()
+
+    def stats(self):
+        return {"parsed": self.parsed.stats(), "layouts": self.layouts.stats()}
+
+    def summary(self):
+        lines = [f"{'paragraph cache':<24} {'entries':>7} {'hits':>9} {'misses':>9} {'evicted':>9} {'hit rate':>9}"]
+        for name, stats in self.stats().items():
+            lines.append(f"{name:<24} {stats['entries']:>7} {stats['hits']:>9} {stats['misses']:>9} "
+                         f"{stats['evictions']:>9} {stats['hit_rate']:>9.1%}")
+        return "\n".join(lines)
+
+
+_default_cache = None
+
+
+def default_paragraph_cache():
+    global _default_cache
+    if _default_cache is None:
+        _default_cache = ParagraphCache()
+    return _default_cache
+
+
+class CachedParagraph(Paragraph):
+    """A Paragraph whose parse and line breaks come from a ParagraphCache when it can"""
+
+    def __init__(self, text, style=None, bulletText=None, frags=None, caseSensitive=1, encoding="utf8",
+                 cache=None):
+        cache = cache or default_paragraph_cache()
+        self._cache_key = None
+        # tdc_spec.FrozenParagraphStyle marks itself _frozen
+        if (frags is None and cache.enabled and style is not None and style.__dict__.get("_frozen")
+                and style.wordWrap not in ("CJK", "RTL")):
+            bullet = bulletText or getattr(style, "bulletText", None)
+            key = (text, style, bullet, caseSensitive)
+            parsed = cache.parsed.get(key)
+            if parsed is not None:
+                self.caseSensitive = caseSensitive
+                self.encoding = encoding
+                self.text, self.frags, self.style, self.bulletText = parsed
+                self.debug = 0
+                self._cache = cache
+                self._cache_key = key
+                return
+            super().__init__(text, style, bulletText, frags, caseSensitive, encoding)
+            cache.parsed.put(key, (self.text, self.frags, self.style, self.bulletText))
+            self._cache = cache
+            self._cache_key = key
+            return
+        super().__init__(text, style, bulletText, frags, caseSensitive, encoding)
+
+    def wrap(self, availWidth, availHeight):
+        key = self._cache_key
+        # Too narrow to lay out: Paragraph.wrap returns "does not fit" without breaking lines
+        if key is None or "autoLeading" in self.__dict__ or availWidth < _FUZZ:
+            return super().wrap(availWidth, availHeight)
+        layout_key = (key, availWidth)
+        layout = self._cache.layouts.get(layout_key)
+        if layout is None:
+            width, height = super().wrap(availWidth, availHeight)
+            self._cache.layouts.put(layout_key, (self._wrapWidths, self.blPara, height))
+            return width, height
+        self._wrapWidths, self.blPara, self.height = layout
+        self.width = availWidth
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        if self._cache_key is not None and hasattr(self, "blPara"):
+            # Give the split lines of its own to edit
+            Paragraph.wrap(self, availWidth, availHeight)
+        return super().split(availWidth, availHeight)
+
+
+# Benchmark
+
+def _bench_guide(builds):
+    import io
+    from reportlab.lib.pagesizes import letter
+    from generate_tdc_guide import ThunderDragonGuide
+    from tdc_spec import compile_plan, load_spec
+
+    plan = compile_plan(load_spec())
+    for _ in range(builds):
+        doc = ThunderDragonGuide(io.BytesIO(), pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72,
+                                 bottomMargin=72)
+        doc.build(list(plan.flowables()))
+
+
+def _bench_statements(builds):
+    import io
+    import tempfile
+    from tdc_backup import group_by_member
+    from tdc_bench import write_synthetic_backup
+    from tdc_statements import member_points, render_statement
+
+    with tempfile.TemporaryDirectory() as directory:
+        write_synthetic_backup(directory, builds)
+        members = group_by_member(directory)
+    points = member_points(members)
+    for member_id, activity in members.items():
+        render_statement(activity, io.BytesIO(), points=points[member_id])
+
+
+def benchmark(builds=20):
+    """Time repeated guide and statement builds with the cache off and on"""
+    cache = default_paragraph_cache()
+    results = []
+    for name, run in (("guide", _bench_guide), ("statements", _bench_statements)):
+        run(1)  # warm-up: imports, fonts, the logo
+        for enabled in (False, True):
+            cache.enabled = enabled
+            cache.clear()
+            started = time.perf_counter()
+            run(builds)
+            ms = (time.perf_counter() - started) * 1000 / builds
+            stats = cache.stats()
+            results.append({"documents": name, "cache": enabled, "ms_per_doc": round(ms, 2), **stats})
+            print(f"{name:>10} cache {'on' if enabled else 'off':>3} {ms:>8.2f} ms/doc"
+                  + (f"  parse hits {stats['parsed']['hit_rate']:.1%}, layout hits {stats['layouts']['hit_rate']:.1%}"
+                     if enabled else ""))
+    cache.enabled = True
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare repeated builds with and without the paragraph cache")
+    parser.add_argument("--builds", type=int, default=20, help="documents of each kind")
+    args = parser.parse_args()
+    # The documents use the imported module's cache, not this __main__'s
+    import tdc_paragraphs
+    tdc_paragraphs.benchmark(args.builds)
@@ -0,0 +1,388 @@
+"""Minimal reader and page-range stitcher for PDFs written by reportlab.
+
+Reportlab writes classic (non-stream) cross-reference tables and puts every
+indirect object on its own ``N 0 obj ... endobj`` block, with a stream's
+dictionary always followed by ``\\nstream\\n``. That is enough structure to
+copy pages between documents without a general PDF parser: object
+dictionaries are rewritten with a regular expression over ``N G R``
+references, stream data is copied untouched.
+
+``stitch`` concatenates the pages of several documents into one. Objects
+that are byte-identical once their own references are resolved (fonts, the
+logo image, shared forms) are written only once, and the output is fully
+deterministic for deterministic inputs.
+
+Documents rendered separately each number their pages from 1 and know
+nothing of each other's headings, so a ``Stitcher`` can also
+
+* stamp "Page N of M" on every page (``number_pages``),
+* build one outline from per-document heading lists (``add_outline``),
+* publish named destinations (``add_destination``), which is how links
+  between separately rendered documents resolve (see
+  ``generate_tdc_guide.ThunderDragonGuide(named_links=True)``).
+"""
+import hashlib
+import re
+
+_REF_RE = re.compile(rb"(\d+) (\d+) R\b")
+_XREF_ENTRY_RE = re.compile(rb"(\d{10}) (\d{5}) ([nf])")
+_STREAM_MARKER = b"\nstream\n"
+_HEADER = b"%PDF-1.4\n%\x93\x8c\x8b\x9e ReportLab Generated PDF document (opensource)\n"
+
+
+class PdfError(ValueError):
+    pass
+
+
+def _ref_value(body, key):
+    match = re.search(rb"/" + key + rb" (\d+) \d+ R\b", body)
+    return int(match.group(1)) if match else None
+
+
+class PdfDocument:
+    """The indirect objects of one reportlab PDF, indexed by object number"""
+
+    def __init__(self, data):
+        self.data = data
+        self.objects = {}
+        self._read_xref()
+        catalog = self.objects.get(self.root)
+        if catalog is None:
+            raise PdfError("document has no catalog")
+        self.catalog = catalog
+        self.pages_root = _ref_value(self._dict(catalog), b"Pages")
+        self.pages = self._collect_pages(self.pages_root)
+
+    def _read_xref(self):
+        data = self.data
+        start = data.rfind(b"startxref")
+        if start < 0:
+            raise PdfError("no startxref")
+        offset = int(data[start + 9:].split()[0])
+        if not data.startswith(b"xref", offset):
+            raise PdfError("cross-reference streams are not supported")
+        trailer_at = data.index(b"trailer", offset)
+        number = 0
+        for line in data[offset + 4:trailer_at].splitlines():
+            parts = line.split()
+            if len(parts) == 2:
+                number = int(parts[0])
+                continue
+            match = _XREF_ENTRY_RE.match(line.strip())
+            if not match:
+                continue
+            if match.group(3) == b"n":
+                self.objects[number] = self._read_object(number, int(match.group(1)))
+            number += 1
+        trailer = data[trailer_at:start]
+        self.root = _ref_value(trailer, b"Root")
+        self.info = _ref_value(trailer, b"Info")
+
+    def _read_object(self, number, offset):
+        data = self.data
+        header_end = data.index(b"obj", offset) + 3
+        if data[header_end:header_end + 1] == b"\n":
+            header_end += 1
+        end = data.index(b"endobj", header_end)
+        body = data[header_end:end]
+        if _STREAM_MARKER in body:
+            # Stream data may contain the text "endobj"; trust /Length instead
+            dict_part, _ = body.split(_STREAM_MARKER, 1)
+            length = int(re.search(rb"/Length (\d+)", dict_part).group(1))
+            stream_start = header_end + len(dict_part) + len(_STREAM_MARKER)
+            end = data.index(b"endobj", stream_start + length)
+            body = data[header_end:end]
+        return body
+
+    def _dict(self, body):
+        """The dictionary part of an object body (everything before any stream data)"""
+        return body.split(_STREAM_MARKER, 1)[0]
+
+    def _collect_pages(self, number):
+        body = self._dict(self.objects[number])
+        if b"/Type /Pages" not in body:
+            return [number]
+        kids = re.search(rb"/Kids \[([^\]]*)\]", body).group(1)
+        pages = []
+        for match in _REF_RE.finditer(kids):
+            pages.extend(self._collect_pages(int(match.group(1))))
+        return pages
+
+    def references(self, number):
+        """Object numbers referenced from an object's dictionary"""
+        return [int(m.group(1)) for m in _REF_RE.finditer(self._dict(self.objects[number]))]
+
+    def page_count(self):
+        return len(self.pages)
+
+
+def _pdf_string(text):
+    try:
+        encoded = text.encode("latin-1")
+    except UnicodeEncodeError:
+        # Text strings outside Latin-1 are written as UTF-16BE with a BOM
+        return b"<FEFF" + text.encode("utf-16-be").hex().upper().encode("ascii") + b">"
+    return b"(" + encoded.replace(b"\\", b"\\\\").replace(b"(", b"\\(").replace(b")", b"\\)") + b")"
+
+
+def _number(value):
+    return (b"%.2f" % value).rstrip(b"0").rstrip(b".")
+
+
+class PdfWriter:
+    """Collects objects (by new number) and serialises a complete PDF"""
+
+    def __init__(self):
+        self.objects = {}
+        self._next = 1
+
+    def reserve(self):
+        number = self._next
+        self._next += 1
+        return number
+
+    def set(self, number, body):
+        self.objects[number] = body
+
+    def add(self, body):
+        number = self.reserve()
+        self.objects[number] = body
+        return number
+
+    def tobytes(self, root, info=None):
+        out = [_HEADER]
+        offsets = {}
+        position = len(_HEADER)
+        for number in range(1, self._next):
+            chunk = b"%d 0 obj\n" % number + self.objects[number] + b"endobj\n"
+            offsets[number] = position
+            position += len(chunk)
+            out.append(chunk)
+        body = b"".join(out)
+        digest = hashlib.md5(body).hexdigest().encode("ascii")
+        xref = [b"xref\n0 %d\n" % self._next, b"0000000000 65535 f \n"]
+        for number in range(1, self._next):
+            xref.append(b"%010d 00000 n \n" % offsets[number])
+        trailer = b"trailer\n<<\n/ID [<%s><%s>]\n" % (digest, digest)
+        if info:
+            trailer += b"/Info %d 0 R\n" % info
+        trailer += b"/Root %d 0 R\n/Size %d\n>>\nstartxref\n%d\n%%%%EOF\n" % (root, self._next, position)
+        return body + b"".join(xref) + trailer
+
+
+class Stitcher:
+    """Appends page ranges from several documents into one PdfWriter.
+
+    Subclasses (or callers) can post-process page dictionaries through
+    ``page_hook(body, global_page_index) -> body``.
+    """
+
+    def __init__(self, page_hook=None):
+        self.writer = PdfWriter()
+        self.catalog = self.writer.reserve()
+        self.pages_root = self.writer.reserve()
+        self.page_numbers = []  # new object number of every page, in order
+        self.page_hook = page_hook
+        self.outline = []  # (title, level, page index, top)
+        self.destinations = {}  # name -> (page index, top)
+        self._numbering = None
+        self._by_key = {}
+
+    def _canonical(self, doc, number, keys, page_index, in_progress):
+        """Content key of an object: its bytes with references replaced by child keys"""
+        if number in page_index:
+            return b"page:%d" % page_index[number]
+        key = keys.get(number)
+        if key is not None:
+            return key
+        if number in in_progress or number not in doc.objects:
+            # Reference cycle (or dangling ref): never share this object
+            return b"unique:%d:%d" % (id(doc), number)
+        in_progress.add(number)
+        body = doc.objects[number]
+        dict_part, sep, stream = body.partition(_STREAM_MARKER)
+
+        def child(match):
+            return b"<" + self._canonical(doc, int(match.group(1)), keys, page_index, in_progress) + b">"
+
+        canonical = _REF_RE.sub(child, dict_part) + sep + stream
+        in_progress.discard(number)
+        key = keys[number] = hashlib.sha256(canonical).hexdigest().encode("ascii")
+        return key
+
+    def _rewrite(self, doc, body, mapping):
+        dict_part, sep, stream = body.partition(_STREAM_MARKER)
+
+        def ref(match):
+            return b"%d 0 R" % mapping(int(match.group(1)))
+
+        return _REF_RE.sub(ref, dict_part) + sep + stream
+
+    def add_document(self, doc, pages=None):
+        """Append doc's pages (all, or the given 0-based indexes); returns their new indexes"""
+        if not isinstance(doc, PdfDocument):
+            doc = PdfDocument(doc)
+        pages = range(len(doc.pages)) if pages is None else pages
+        selected = [doc.pages[i] for i in pages]
+        first = len(self.page_numbers)
+        page_index = {}
+        for offset, number in enumerate(selected):
+            page_index[number] = first + offset
+            self.page_numbers.append(self.writer.reserve())
+        keys = {}
+        local = {}
+
+        def mapping(number):
+            if number in page_index:
+                return self.page_numbers[page_index[number]]
+            if number == doc.pages_root:
+                return self.pages_root
+            new = local.get(number)
+            if new is not None:
+                return new
+            key = self._canonical(doc, number, keys, page_index, set())
+            new = self._by_key.get(key)
+            if new is None:
+                new = self._by_key[key] = self.writer.reserve()
+                local[number] = new
+                self.writer.set(new, self._rewrite(doc, doc.objects.get(number, b"null\n"), mapping))
+            local[number] = new
+            return new
+
+        for number in selected:
+            index = page_index[number]
+            body = self._rewrite(doc, doc.objects[number], mapping)
+            if self.page_hook:
+                body = self.page_hook(body, index)
+            self.writer.set(self.page_numbers[index], body)
+        return list(range(first, len(self.page_numbers)))
+
+    def add_outline(self, title, page, top=None, level=0):
+        """Add an outline entry for a (0-based, stitched) page; deeper levels nest under the last shallower one"""
+        self.outline.append((title, level, page, top))
+
+    def add_destination(self, name, page, top=None):
+        """Publish a named destination; the first document to define a name wins"""
+        self.destinations.setdefault(name, (page, top))
+
+    def number_pages(self, format="Page {page} of {pages}", font_size=8, y=36, margin=72, align="right", gray=0.5):
+        """Stamp every page with its stitched page number when the PDF is written"""
+        self._numbering = {"format": format, "font_size": font_size, "y": y, "margin": margin,
+                           "align": align, "gray": gray}
+
+    def _destination(self, page, top):
+        if top is None:
+            return b"[ %d 0 R /Fit ]" % self.page_numbers[page]
+        return b"[ %d 0 R /XYZ 0 %s 0 ]" % (self.page_numbers[page], _number(top))
+
+    def _stream(self, data, entries=b""):
+        return b"<<\n%s/Length %d\n>>\nstream\n%s\nendstream\n" % (entries, len(data), data)
+
+    def _stamp_page_numbers(self):
+        from reportlab.pdfbase.pdfmetrics import stringWidth  # ~50 ms, only paid when stamping
+
+        options = self._numbering
+        writer = self.writer
+        font = writer.add(b"<<\n/BaseFont /Helvetica /Encoding /WinAnsiEncoding /Name /F1 /Subtype /Type1 /Type /Font\n>>\n")
+        # Page content may leave the graphics state changed: wrap it in q ... Q
+        save = writer.add(self._stream(b"q"))
+        draw = writer.add(self._stream(b"Q q /TdcPageNumber Do Q"))
+        total = len(self.page_numbers)
+        for index, number in enumerate(self.page_numbers):
+            body = writer.objects[number]
+            box = re.search(rb"/MediaBox \[\s*([-\d.]+) ([-\d.]+) ([-\d.]+) ([-\d.]+)\s*\]", body)
+            left, bottom, right, top = (float(v) for v in box.groups()) if box else (0, 0, 612, 792)
+            text = options["format"].format(page=index + 1, pages=total)
+            width = stringWidth(text, "Helvetica", options["font_size"])
+            if options["align"] == "left":
+                x = left + options["margin"]
+            elif options["align"] == "center":
+                x = (left + right - width) / 2
+            else:
+                x = right - options["margin"] - width
+            content = b"BT /F1 %s Tf %s g %s %s Td %s Tj ET" % (
+                _number(options["font_size"]), _number(options["gray"]), _number(x),
+                _number(bottom + options["y"]), _pdf_string(text))
+            form = writer.add(self._stream(content, b"/BBox [ %s %s %s %s ] /Resources <<\n/Font << /F1 %d 0 R >>\n>> "
+                                           b"/Subtype /Form /Type /XObject\n" % (
+                                               _number(left), _number(bottom), _number(right), _number(top), font)))
+            if b"/XObject <<" in body:
+                body = body.replace(b"/XObject <<", b"/XObject <<\n/TdcPageNumber %d 0 R" % form, 1)
+            elif b"/Resources <<" in body:
+                body = body.replace(b"/Resources <<", b"/Resources <<\n/XObject << /TdcPageNumber %d 0 R >>" % form, 1)
+            else:
+                raise PdfError("page %d has no inline resource dictionary" % (index + 1))
+            contents = re.search(rb"/Contents (\[[^\]]*\]|\d+ \d+ R)", body)
+            if contents is None:
+                raise PdfError("page %d has no contents" % (index + 1))
+            streams = contents.group(1).strip(b"[] ")
+            body = body[:contents.start()] + b"/Contents [ %d 0 R %s %d 0 R ]" % (save, streams, draw) + body[contents.end():]
+            writer.set(number, body)
+
+    def _write_outline(self):
+        writer = self.writer
+        root = writer.reserve()
+        children = {root: []}
+        parents = {}
+        entries = {}
+        stack = [(-1, root)]
+        for title, level, page, top in self.outline:
+            number = writer.reserve()
+            while stack[-1][0] >= level:
+                stack.pop()
+            parent = stack[-1][1]
+            children[parent].append(number)
+            children[number] = []
+            parents[number] = parent
+            entries[number] = (title, page, top)
+            stack.append((level, number))
+
+        def count(number):
+            return sum(1 + count(child) for child in children[number])
+
+        for number, (title, page, top) in entries.items():
+            siblings = children[parents[number]]
+            position = siblings.index(number)
+            parts = []
+            if children[number]:
+                parts.append(b"/Count %d /First %d 0 R /Last %d 0 R" % (count(number), children[number][0], children[number][-1]))
+            parts.append(b"/Dest " + self._destination(page, top))
+            if position + 1 < len(siblings):
+                parts.append(b"/Next %d 0 R" % siblings[position + 1])
+            parts.append(b"/Parent %d 0 R" % parents[number])
+            if position:
+                parts.append(b"/Prev %d 0 R" % siblings[position - 1])
+            parts.append(b"/Title " + _pdf_string(title))
+            writer.set(number, b"<<\n" + b" ".join(parts) + b"\n>>\n")
+        writer.set(root, b"<<\n/Count %d /First %d 0 R /Last %d 0 R /Type /Outlines\n>>\n" % (
+            count(root), children[root][0], children[root][-1]))
+        return root
+
+    def tobytes(self, title=None, extra_catalog=b""):
+        kids = b" ".join(b"%d 0 R" % n for n in self.page_numbers)
+        self.writer.set(self.pages_root, b"<<\n/Count %d /Kids [ %s ] /Type /Pages\n>>\n" % (len(self.page_numbers), kids))
+        if self._numbering:
+            self._stamp_page_numbers()
+        page_mode = b"/UseNone"
+        if self.outline:
+            extra_catalog += b" /Outlines %d 0 R" % self._write_outline()
+            page_mode = b"/UseOutlines"
+        if self.destinations:
+            names = b" ".join(_pdf_string(name) + b" " + self._destination(page, top)
+                              for name, (page, top) in sorted(self.destinations.items()))
+            tree = self.writer.add(b"<<\n/Names [ %s ]\n>>\n" % names)
+            extra_catalog += b" /Names << /Dests %d 0 R >>" % tree
+        self.writer.set(self.catalog, b"<<\n/PageMode %s /Pages %d 0 R /Type /Catalog%s\n>>\n" % (page_mode, self.pages_root, extra_catalog))
+        info = self.writer.add(
+            b"<<\n/Creator (Thunder Dragon Club document builder) /Producer (ReportLab PDF Library - www.reportlab.com)"
+            + (b" /Title " + _pdf_string(title) if title else b"") + b"\n>>\n"
+        )
+        return self.writer.tobytes(self.catalog, info)
+
+
+def stitch(documents, title=None):
+    """Concatenate the pages of several PDFs (bytes or PdfDocuments) into one PDF"""
+    stitcher = Stitcher()
+    for doc in documents:
+        stitcher.add_document(doc)
+    return stitcher.tobytes(title)
@@ -0,0 +1,312 @@
+"""Points earned, redeemed and balance over time, for every member at once.
+
+The member dashboard charts points by month (``PointsChart.js``). Doing the
+same per member in Python, a loop over each history per statement, would
+cost more than rendering the statement. Here the whole backup becomes one
+set of columns, one row per dated transaction, referral or redemption:
+
+    columns = PointsColumns.from_activities(group_by_member(backup))
+    series = aggregate(columns, "month")          # or "day"
+    chart = points_chart(series.for_member(member_id))
+
+``aggregate`` sums each (member, period) with one ``bincount`` and turns the
+sums into running balances with one ``cumsum``, so the cost is that of a few
+array passes over the backup whatever the number of members. The result is
+kept sparse (only the periods a member was active in, grouped by member),
+and ``for_member`` fills in a member's quiet periods when a chart needs
+them. Earned includes referral points, as on the statement; undated rows
+have no place on a time axis and are left out. Balances are the running
+net of the recorded history, starting from zero.
+
+Run ``python tdc_points.py backups/2024-05-01`` to compare with per-member
+Python loops.
+"""
+import argparse
+import datetime
+import io
+import time
+
+import numpy as np
+from reportlab.graphics.charts.barcharts import VerticalBarChart
+from reportlab.graphics.charts.legends import Legend
+from reportlab.graphics.charts.linecharts import HorizontalLineChart
+from reportlab.graphics.shapes import Drawing, String
+from reportlab.lib import colors
+from reportlab.lib.units import inch
+
+from generate_tdc_guide import ACCENT_COLOR, PRIMARY_COLOR
+
+FREQUENCIES = {"day": "datetime64[D]", "month": "datetime64[M]"}
+# Most periods a statement chart shows (the most recent ones)
+CHART_PERIODS = 24
+AXIS_COLOR = colors.HexColor("#B3B3B3")
+GRID_COLOR = colors.HexColor("#333333")
+BALANCE_COLOR = colors.white
+FONT_NAME = "Helvetica"
+_EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+class PointsColumns:
+    """One row per dated points event, grouped by member.
+
+    ``member`` indexes ``member_ids``; ``day`` is a ``datetime64[D]``
+    array; ``earned`` and ``redeemed`` are float64 (one of them is zero in
+    every row).
+    """
+
+    def __init__(self, member_ids, member, day, earned, redeemed):
+        self.member_ids = member_ids
+        self.member = member
+        self.day = day
+        self.earned = earned
+        self.redeemed = redeemed
+
+    def __len__(self):
+        return len(self.member)
+
+    @classmethod
+    def from_activities(cls, members):
+        """Columns from {member_id: MemberActivity}, e.g. ``group_by_member``"""
+        member_ids = list(members)
+        index, days, earned, redeemed = [], [], [], []
+        for number, activity in enumerate(members.values()):
+            for rows, points_at, into in ((activity.transactions, 2, earned), (activity.referrals, 2, earned),
+                                          (activity.redemptions, 1, redeemed)):
+                dated = [row for row in rows if row[0] is not None]
+                index.extend([number] * len(dated))
+                days.extend([row[0].toordinal() for row in dated])
+                into.extend([row[points_at] for row in dated])
+                (redeemed if into is earned else earned).extend([0] * len(dated))
+        day = (np.array(days, dtype=np.int64) - _EPOCH_ORDINAL).astype("datetime64[D]")
+        return cls(member_ids, np.array(index, dtype=np.int64), day,
+                   np.array(earned, dtype=np.float64), np.array(redeemed, dtype=np.float64))
+
+
+class MemberSeries:
+    """One member's series over consecutive periods (``datetime64`` array)"""
+
+    def __init__(self, freq, periods, earned, redeemed, balance):
+        self.freq = freq
+        self.periods = periods
+        self.earned = earned
+        self.redeemed = redeemed
+        self.balance = balance
+
+    def __len__(self):
+        return len(self.periods)
+
+    def labels(self):
+        """Axis labels: "Jan 2024" for months (as on the dashboard), ISO dates for days"""
+        if self.freq == "month":
+            return [period.item().strftime("%b %Y") for period in self.periods]
+        return [str(period) for period in self.periods]
+
+
+class PointsSeries:
+    """Earned, redeemed and balance per (member, period) with activity, grouped by member.
+
+    Rows of member ``i`` are ``offsets[i]:offsets[i + 1]``, in period order.
+    """
+
+    def __init__(self, member_ids, freq, member, period, earned, redeemed, balance, offsets, last_period):
+        self.member_ids = member_ids
+        self.freq = freq
+        self.member = member
+        self.period = period
+        self.earned = earned
+        self.redeemed = redeemed
+        self.balance = balance
+        self.offsets = offsets
+        self.last_period = last_period
+        self._index = None
+
+    def for_member(self, member_id, periods=None):
+        """A member's series from their first active period to the last one in the backup.
+
+        Quiet periods are filled in (nothing earned or redeemed, balance
+        carried forward). ``periods`` keeps only that many of the most recent.
+        Returns None for a member with no dated activity.
+        """
+        if self._index is None:
+            self._index = {key: number for number, key in enumerate(self.member_ids)}
+        number = self._index.get(member_id)
+        if number is None:
+            return None
+        start, stop = self.offsets[number], self.offsets[number + 1]
+        if start == stop:
+            return None
+        period = self.period[start:stop]
+        first = period[0]
+        if periods is not None:
+            first = max(first, self.last_period - (periods - 1))
+        length = self.last_period - first + 1
+        position = period - first
+        shown = position >= 0
+        earned = np.zeros(length)
+        redeemed = np.zeros(length)
+        earned[position[shown]] = self.earned[start:stop][shown]
+        redeemed[position[shown]] = self.redeemed[start:stop][shown]
+        # Balance at each period: that of the last active period up to it
+        balance = self.balance[start:stop]
+        last_active = np.searchsorted(period, first + np.arange(length), side="right") - 1
+        balance = np.where(last_active >= 0, balance[np.maximum(last_active, 0)], 0.0)
+        dtype = FREQUENCIES[self.freq]
+        periods_axis = (first + np.arange(length)).astype(dtype)
+        return MemberSeries(self.freq, periods_axis, earned, redeemed, balance)
+
+
+def aggregate(columns, freq="month"):
+    """Sum a PointsColumns into per-member ``freq`` ("day" or "month") series"""
+    if freq not in FREQUENCIES:
+        raise ValueError(f"freq must be one of {', '.join(FREQUENCIES)}")
+    count = len(columns.member_ids)
+    if not len(columns):
+        empty = np.zeros(0)
+        return PointsSeries(columns.member_ids, freq, np.zeros(0, np.int64), np.zeros(0, np.int64), empty, empty,
+                            empty, np.zeros(count + 1, np.int64), 0)
+    period = columns.day.astype(FREQUENCIES[freq]).astype(np.int64)
+    first, last = period.min(), period.max()
+    span = last - first + 1
+    # One key per (member, period); sorting the keys groups by member, then period
+    keys, inverse = np.unique(columns.member * span + (period - first), return_inverse=True)
+    earned = np.bincount(inverse, weights=columns.earned, minlength=len(keys))
+    redeemed = np.bincount(inverse, weights=columns.redeemed, minlength=len(keys))
+    member = keys // span
+    offsets = np.searchsorted(member, np.arange(count + 1))
+    # Running balance per member: a global running sum, less what came before the member's first row
+    running = np.cumsum(earned - redeemed)
+    before = np.concatenate(([0.0], running))[offsets[:-1]]
+    balance = running - np.repeat(before, np.diff(offsets))
+    return PointsSeries(columns.member_ids, freq, member, keys % span + first, earned, redeemed, balance,
+                        offsets, last)
+
+
+def points_chart(series, width=6.5 * inch, height=2.6 * inch, names=("Earned", "Redeemed", "Balance")):
+    """A vector chart of one MemberSeries: earned and redeemed bars, the balance as a line.
+
+    Bars use the left axis and the balance the right one, since a balance
+    soon dwarfs a month's activity. ``names`` label the three series.
+    """
+    drawing = Drawing(width, height)
+    labels = series.labels()
+    left, right, bottom, top = 42, 42, 38, 30
+
+    bars = VerticalBarChart()
+    bars.x, bars.y = left, bottom
+    bars.width, bars.height = width - left - right, height - bottom - top
+    bars.data = [series.earned.tolist(), series.redeemed.tolist()]
+    bars.bars[0].fillColor = ACCENT_COLOR
+    bars.bars[1].fillColor = PRIMARY_COLOR
+    bars.bars.strokeColor = None
+    bars.groupSpacing = 2
+    bars.valueAxis.valueMin = 0
+    bars.valueAxis.strokeColor = AXIS_COLOR
+    bars.valueAxis.gridStrokeColor = GRID_COLOR
+    bars.valueAxis.visibleGrid = True
+    bars.valueAxis.labels.fontName = FONT_NAME
+    bars.valueAxis.labels.fontSize = 7
+    bars.valueAxis.labels.fillColor = AXIS_COLOR
+    bars.categoryAxis.categoryNames = labels
+    bars.categoryAxis.strokeColor = AXIS_COLOR
+    bars.categoryAxis.labels.fontName = FONT_NAME
+    bars.categoryAxis.labels.fontSize = 6
+    bars.categoryAxis.labels.fillColor = AXIS_COLOR
+    bars.categoryAxis.labels.angle = 45 if len(labels) > 8 else 0
+    bars.categoryAxis.labels.boxAnchor = "ne" if len(labels) > 8 else "n"
+    drawing.add(bars)
+
+    line = HorizontalLineChart()
+    line.x, line.y, line.width, line.height = bars.x, bars.y, bars.width, bars.height
+    line.data = [series.balance.tolist()]
+    line.lines[0].strokeColor = BALANCE_COLOR
+    line.lines[0].strokeWidth = 1.5
+    line.categoryAxis.visible = False
+    line.valueAxis.valueMin = min(0, float(series.balance.min()))
+    line.valueAxis.joinAxisMode = "right"
+    line.valueAxis.strokeColor = AXIS_COLOR
+    line.valueAxis.labels.fontName = FONT_NAME
+    line.valueAxis.labels.fontSize = 7
+    line.valueAxis.labels.fillColor = AXIS_COLOR
+    line.valueAxis.labels.boxAnchor = "w"
+    line.valueAxis.labels.dx = 5
+    drawing.add(line)
+
+    legend = Legend()
+    legend.x, legend.y = width / 2 - 120, height - 6
+    legend.alignment = "right"
+    legend.columnMaximum = 1
+    legend.fontName = FONT_NAME
+    legend.fontSize = 7
+    legend.fillColor = AXIS_COLOR
+    legend.dxTextSpace = 4
+    legend.deltax = 90
+    legend.colorNamePairs = list(zip((ACCENT_COLOR, PRIMARY_COLOR, BALANCE_COLOR), names))
+    drawing.add(legend)
+    for x, text, anchor in ((left, "Points", "end"), (width - right, names[2], "start")):
+        drawing.add(String(x, bars.y + bars.height + 8, text, fontName=FONT_NAME, fontSize=7, fillColor=AXIS_COLOR,
+                           textAnchor=anchor))
+    return drawing
+
+
+# Benchmark
+
+def _loop_series(activity):
+    """The per-member Python equivalent of aggregate(..., "month"), for comparison"""
+    months = {}
+    for rows, points_at, is_earned in ((activity.transactions, 2, True), (activity.referrals, 2, True),
+                                       (activity.redemptions, 1, False)):
+        for row in rows:
+            if row[0] is None:
+                continue
+            month = months.setdefault((row[0].year, row[0].month), [0, 0])
+            month[0 if is_earned else 1] += row[points_at]
+    balance, series = 0, []
+    for key in sorted(months):
+        balance += months[key][0] - months[key][1]
+        series.append((key, months[key][0], months[key][1], balance))
+    return series
+
+
+def benchmark(backup, freq="month", charts=50):
+    """Time the per-member loops against the vectorized aggregation, and the chart per member"""
+    from reportlab.lib.pagesizes import letter
+    from generate_tdc_guide import ThunderDragonGuide
+    from tdc_backup import group_by_member
+
+    members = group_by_member(backup)
+    started = time.perf_counter()
+    for activity in members.values():
+        _loop_series(activity)
+    loop = time.perf_counter() - started
+
+    started = time.perf_counter()
+    columns = PointsColumns.from_activities(members)
+    gathered = time.perf_counter() - started
+    series = aggregate(columns, freq)
+    vectorized = time.perf_counter() - started - gathered
+    print(f"{len(members):,} members, {len(columns):,} dated events")
+    print(f"  python loops     {loop * 1000:8.1f} ms")
+    print(f"  columns          {gathered * 1000:8.1f} ms")
+    print(f"  aggregate ({freq}) {vectorized * 1000:7.1f} ms")
+
+    timings = []
+    for member_id in list(members)[:charts]:
+        member = series.for_member(member_id, CHART_PERIODS)
+        if member is None:
+            continue
+        started = time.perf_counter()
+        ThunderDragonGuide(io.BytesIO(), pagesize=letter).build([points_chart(member)])
+        timings.append(time.perf_counter() - started)
+    if timings:
+        timings.sort()
+        print(f"  chart document   {timings[len(timings) // 2] * 1000:8.2f} ms p50, "
+              f"{timings[-1] * 1000:.2f} ms max over {len(timings)} members")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare per-member loops with the vectorized points aggregation")
+    parser.add_argument("backup", help="backup folder of collection CSVs, or a JSON export")
+    parser.add_argument("--freq", choices=sorted(FREQUENCIES), default="month")
+    parser.add_argument("--charts", type=int, default=50, help="members to time a chart document for")
+    args = parser.parse_args()
+    benchmark(args.backup, args.freq, args.charts)
@@ -0,0 +1,402 @@
+"""Opt-in build profiling for ThunderDragonGuide documents.
+
+Pass a ``BuildProfiler`` to any ThunderDragonGuide (or subclass) and it is
+fed from the document's ``handle_flowable``, ``handle_pageBegin`` /
+``handle_pageEnd``, ``afterFlowable`` and build-phase hooks:
+
+    profiler = BuildProfiler(memory=True)
+    doc = ThunderDragonGuide("guide.pdf", pagesize=letter, profiler=profiler)
+    doc.build(story)
+    profiler.write_json("guide.profile.json")
+    profiler.write_chrome_trace("guide.trace.json")  # chrome://tracing or ui.perfetto.dev
+    print(profiler.summary())
+
+It records wall time per section, per flowable type and per page; wrap,
+split and draw counts and times per flowable type; and, with
+``memory=True``, tracemalloc peaks per section and flowable type, each
+measured above the memory in use when the section or flowable started
+(which slows the build down several times, so treat its timings with care).
+It also counts hits and misses in tdc_paragraphs' cache of parsed and
+wrapped paragraphs, from the profiler's creation (or the previous build) to
+the end of each build, so building the story before ``build()`` counts too.
+
+A section starts at a flowable carrying a ``profile_section`` attribute (see
+``tag_sections``) or, in stories without such tags, at a Paragraph in one
+of ``section_styles``; its pages are those its flowables were drawn on, so
+a trailing ``PageBreak`` does not add one. The Chrome trace nests flowables
+inside sections, with page events on a second track, so it reads as a flame
+chart.
+
+    python tdc_profile.py --memory --json guide.profile.json --chrome guide.trace.json
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+DEFAULT_SECTION_STYLES = ("Title", "Heading1")
+
+
+def now_us():
+    return time.perf_counter_ns() / 1000.0
+
+
+class _Stats:
+    __slots__ = ("count", "seconds", "wraps", "wrap_seconds", "splits", "split_seconds",
+                 "draws", "draw_seconds", "peak_bytes")
+
+    def __init__(self):
+        self.count = self.wraps = self.splits = self.draws = self.peak_bytes = 0
+        self.seconds = self.wrap_seconds = self.split_seconds = self.draw_seconds = 0.0
+
+    def as_dict(self):
+        result = {name: getattr(self, name) for name in self.__slots__}
+        for name in ("seconds", "wrap_seconds", "split_seconds", "draw_seconds"):
+            result[name] = round(result[name], 6)
+        return result
+
+
+def _paragraph_counters():
+    """(hits, misses, evictions) of the process's paragraph cache tables"""
+    # Not imported yet means nothing counted yet (and keeps reportlab unimported here)
+    module = sys.modules.get("tdc_paragraphs")
+    cache = module.default_paragraph_cache() if module else None
+    return {name: (getattr(cache, name).hits, getattr(cache, name).misses, getattr(cache, name).evictions)
+            if cache else (0, 0, 0) for name in ("parsed", "layouts")}
+
+
+def _lays_out_content(flowable):
+    """False for page breaks, template switches and the like (reportlab's locChanger) and zero-height flowables"""
+    return not getattr(flowable, "locChanger", 0) and getattr(flowable, "height", 1) > 0
+
+
+class _Section:
+    def __init__(self, name, start_us):
+        self.name = name
+        self.start_us = start_us
+        self.end_us = start_us
+        # Pages of the first and last flowable drawn in the section (None until one is)
+        self.first_page = None
+        self.last_page = None
+        self.flowables = 0
+        # Traced memory when the section started; peak_bytes is the most above it
+        self.baseline_bytes = 0
+        self.peak_bytes = 0
+
+
+_profiled_classes = {}
+
+
+def _timed(method, counter, timer):
+    def timed(self, *args, **kw):
+        stats = self.__dict__.get("_profile_stats")
+        if stats is None:
+            return getattr(super(type(self), self), method)(*args, **kw)
+        started = time.perf_counter()
+        try:
+            result = getattr(super(type(self), self), method)(*args, **kw)
+        finally:
+            setattr(stats, counter, getattr(stats, counter) + 1)
+            setattr(stats, timer, getattr(stats, timer) + time.perf_counter() - started)
+        if method == "split":
+            # The first part is drawn before the document sees it again; charge
+            # all parts to the flowable they came from
+            for part in result:
+                _instrument(part, stats)
+        return result
+    timed.__name__ = method
+    return timed
+
+
+def _profiled_class(cls):
+    """A subclass of cls whose wrap/split/draw report to the instance's _profile_stats.
+
+    Swapping an instance's class (rather than patching bound methods onto it)
+    keeps copies made by platypus during splitting working on themselves.
+    """
+    profiled = _profiled_classes.get(cls)
+    if profiled is None:
+        profiled = _profiled_classes[cls] = type(cls.__name__, (cls,), {
+            "_profile_base": cls,
+            "__module__": cls.__module__,
+            "wrap": _timed("wrap", "wraps", "wrap_seconds"),
+            "split": _timed("split", "splits", "split_seconds"),
+            "draw": _timed("draw", "draws", "draw_seconds"),
+        })
+    return profiled
+
+
+def _instrument(flowable, stats):
+    cls = type(flowable)
+    if "_profile_base" not in cls.__dict__:
+        try:
+            flowable.__class__ = _profiled_class(cls)
+        except TypeError:
+            # Classes with __slots__ or a C layout can't be swapped; only time them as a whole
+            return
+    flowable._profile_stats = stats
+
+
+class BuildProfiler:
+    """Collects timings (and optionally memory peaks) from one or more builds"""
+
+    def __init__(self, memory=False, section_styles=DEFAULT_SECTION_STYLES, flowable_events=True):
+        self.memory = memory
+        self.section_styles = set(section_styles)
+        self.flowable_events = flowable_events
+        self.events = []
+        self.phases = {}
+        self.sections = []
+        self.types = {}
+        self.pages = []
+        self.document = None
+        self._section = None
+        self._tagged = False
+        self._page_start = None
+        self._build_start = None
+        self._started_tracemalloc = False
+        # Paragraph cache name -> [hits, misses, evictions] during the profiled builds
+        self.paragraph_cache = {}
+        self._paragraph_start = _paragraph_counters()
+
+    # Trace events
+
+    def _event(self, name, category, start_us, end_us, tid=1, **args):
+        event = {"name": name, "cat": category, "ph": "X", "ts": round(start_us, 3),
+                 "dur": round(end_us - start_us, 3), "pid": 1, "tid": tid}
+        if args:
+            event["args"] = args
+        self.events.append(event)
+
+    def _phase(self, name, start_us, end_us):
+        self.phases[name] = round(self.phases.get(name, 0.0) + (end_us - start_us) / 1e6, 6)
+        self._event(name, "phase", start_us, end_us, tid=0)
+
+    # Hooks called by ThunderDragonGuide
+
+    def build_started(self, doc):
+        self.document = getattr(doc, "filename", None)
+        if not isinstance(self.document, str):
+            self.document = type(self.document).__name__
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._build_start = now_us()
+
+    def build_finished(self, doc):
+        end = now_us()
+        self._close_section(end)
+        self._phase("build", self._build_start, end)
+        counters = _paragraph_counters()
+        for name, current in counters.items():
+            totals = self.paragraph_cache.setdefault(name, [0, 0, 0])
+            for i, (before, after) in enumerate(zip(self._paragraph_start[name], current)):
+                # The counters restart if the cache is cleared in between
+                totals[i] += after - before if after >= before else after
+        self._paragraph_start = counters
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+    def wrap_save(self, canvas):
+        """Time canvas.save() (serialising and writing the PDF) as its own phase"""
+        save = canvas.save
+
+        def timed_save(*args, **kw):
+            started = now_us()
+            self._close_section(started)
+            try:
+                return save(*args, **kw)
+            finally:
+                self._phase("save", started, now_us())
+
+        canvas.save = timed_save
+
+    def _section_name(self, flowable):
+        name = getattr(flowable, "profile_section", None)
+        if name is not None:
+            # Explicitly tagged stories don't need the heading heuristic
+            self._tagged = True
+        elif not self._tagged:
+            style = getattr(flowable, "style", None)
+            if getattr(style, "name", None) in self.section_styles and hasattr(flowable, "getPlainText"):
+                name = flowable.getPlainText()[:60]
+        return name
+
+    def _close_section(self, end_us):
+        section = self._section
+        if section is not None:
+            section.end_us = end_us
+            self._event(section.name, "section", section.start_us, end_us,
+                        flowables=section.flowables, first_page=section.first_page, last_page=section.last_page,
+                        **({"peak_kb": round(section.peak_bytes / 1024, 1)} if self.memory else {}))
+            self._section = None
+
+    def flowable_started(self, doc, flowable):
+        """Called before the document lays out flowable; returns a token for flowable_finished"""
+        name = self._section_name(flowable)
+        start = now_us()
+        # Content ahead of the first section gets one of its own, but a page
+        # template switch or break does not make a section
+        if name is not None or (self._section is None and not getattr(flowable, "locChanger", 0)):
+            self._close_section(start)
+            self._section = _Section(name or "(document start)", start)
+            self.sections.append(self._section)
+        kind = getattr(type(flowable), "_profile_base", type(flowable)).__name__
+        stats = self.types.get(kind)
+        if stats is None:
+            stats = self.types[kind] = _Stats()
+        _instrument(flowable, stats)
+        baseline = 0
+        if self.memory:
+            baseline = tracemalloc.get_traced_memory()[0]
+            tracemalloc.reset_peak()
+            if self._section is not None and self._section.flowables == 0:
+                self._section.baseline_bytes = baseline
+        return (flowable, kind, stats, start, baseline)
+
+    def flowable_finished(self, doc, token):
+        flowable, kind, stats, start, baseline = token
+        end = now_us()
+        stats.count += 1
+        stats.seconds += (end - start) / 1e6
+        section = self._section
+        if section is not None:
+            section.flowables += 1
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            stats.peak_bytes = max(stats.peak_bytes, peak - baseline)
+            if section is not None:
+                section.peak_bytes = max(section.peak_bytes, peak - section.baseline_bytes)
+        if self.flowable_events:
+            self._event(kind, "flowable", start, end)
+
+    def flowable_drawn(self, doc, flowable):
+        """afterFlowable: flowable (or a split part of it) has been placed on doc.page"""
+        section = self._section
+        # A section's closing PageBreak is "drawn" on the next page; it takes no room on either
+        if section is not None and _lays_out_content(flowable):
+            if section.first_page is None:
+                section.first_page = doc.page
+            section.last_page = doc.page
+
+    def page_started(self, doc, start_us, end_us):
+        """handle_pageBegin ran from start_us to end_us (onPage decorations included)"""
+        self._page_start = start_us
+        self._event("pageBegin", "page", start_us, end_us)
+
+    def page_finished(self, doc, start_us, end_us):
+        """handle_pageEnd ran from start_us to end_us (showPage included)"""
+        self._event("pageEnd", "page", start_us, end_us)
+        if self._page_start is not None:
+            self.pages.append(round((end_us - self._page_start) / 1e6, 6))
+            self._event(f"page {doc.page}", "page", self._page_start, end_us, tid=2)
+        self._page_start = None
+
+    # Reports
+
+    def as_dict(self):
+        return {
+            "document": self.document,
+            "phases": self.phases,
+            "pages": {"count": len(self.pages), "seconds": self.pages},
+            "sections": [
+                {"name": s.name, "seconds": round((s.end_us - s.start_us) / 1e6, 6), "flowables": s.flowables,
+                 "first_page": s.first_page, "last_page": s.last_page,
+                 **({"peak_kb": round(s.peak_bytes / 1024, 1)} if self.memory else {})}
+                for s in self.sections
+            ],
+            "flowable_types": {kind: stats.as_dict() for kind, stats in sorted(self.types.items())},
+            "paragraph_cache": {
+                name: {"hits": hits, "misses": misses, "evictions": evictions,
+                       "hit_rate": round(hits / (hits + misses), 4) if hits + misses else 0.0}
+                for name, (hits, misses, evictions) in self.paragraph_cache.items()
+            },
+            "memory": self.memory,
+        }
+
+    def write_json(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.as_dict(), f, indent=2)
+
+    def chrome_trace(self):
+        names = [(0, "build phases"), (1, "sections / flowables"), (2, "pages")]
+        metadata = [{"name": "thread_name", "ph": "M", "pid": 1, "tid": tid, "args": {"name": name}}
+                    for tid, name in names]
+        return {"traceEvents": metadata + self.events, "displayTimeUnit": "ms"}
+
+    def write_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def summary(self):
+        lines = [f"{'section':<40} {'seconds':>9} {'flowables':>9} {'pages':>9}"
+                 + (f" {'peak KB':>10}" if self.memory else "")]
+        for s in self.as_dict()["sections"]:
+            pages = f"{s['first_page']}-{s['last_page']}" if s["first_page"] is not None else "-"
+            lines.append(f"{s['name'][:40]:<40} {s['seconds']:>9.4f} {s['flowables']:>9} {pages:>9}"
+                         + (f" {s['peak_kb']:>10.1f}" if self.memory else ""))
+        lines.append("")
+        lines.append(f"{'flowable type':<24} {'count':>7} {'seconds':>9} {'wraps':>7} {'wrap s':>8} "
+                     f"{'splits':>6} {'split s':>8} {'draws':>7} {'draw s':>8}"
+                     + (f" {'peak KB':>10}" if self.memory else ""))
+        for kind, stats in sorted(self.types.items(), key=lambda item: -item[1].seconds):
+            lines.append(f"{kind[:24]:<24} {stats.count:>7} {stats.seconds:>9.4f} {stats.wraps:>7} "
+                         f"{stats.wrap_seconds:>8.4f} {stats.splits:>6} {stats.split_seconds:>8.4f} "
+                         f"{stats.draws:>7} {stats.draw_seconds:>8.4f}"
+                         + (f" {stats.peak_bytes / 1024:>10.1f}" if self.memory else ""))
+        lines.append("")
+        for name, stats in self.as_dict()["paragraph_cache"].items():
+            lines.append(f"paragraph cache {name}: {stats['hits']} hits, {stats['misses']} misses "
+                         f"({stats['hit_rate']:.1%}), {stats['evictions']} evicted")
+        lines.append("phases: " + ", ".join(f"{name} {seconds:.4f}s" for name, seconds in self.phases.items())
+                     + f"; {len(self.pages)} pages")
+        return "\n".join(lines)
+
+
+def tag_sections(plan, logo=None):
+    """Yield a GuidePlan's flowables with each section's first flowable tagged for profiling"""
+    from reportlab.platypus import PageBreak
+
+    last = len(plan.sections) - 1
+    for i, section in enumerate(plan.sections):
+        first = True
+        for flowable in section.flowables(logo):
+            if first:
+                flowable.profile_section = section.id
+                first = False
+            yield flowable
+        if i != last:
+            yield PageBreak()
+
+
+def profile_guide(filename, spec_path=None, memory=False):
+    """Build the user guide with a profiler attached and return the profiler"""
+    from reportlab.lib.pagesizes import letter
+    from generate_tdc_guide import ThunderDragonGuide, get_logo
+    from tdc_spec import compile_plan, load_spec
+
+    profiler = BuildProfiler(memory=memory)
+    plan = compile_plan(load_spec(spec_path))
+    doc = ThunderDragonGuide(filename, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72,
+                             bottomMargin=72, profiler=profiler)
+    doc.build(list(tag_sections(plan, logo=get_logo())))
+    return profiler
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile a build of the user guide")
+    parser.add_argument("--output", default=os.devnull, help="PDF to write (default: discard)")
+    parser.add_argument("--spec", help="guide spec (default: tdc_guide_spec.json)")
+    parser.add_argument("--memory", action="store_true", help="record tracemalloc peaks (slower)")
+    parser.add_argument("--json", help="write the profile as JSON")
+    parser.add_argument("--chrome", help="write a Chrome trace-event file")
+    args = parser.parse_args()
+    result = profile_guide(args.output, args.spec, args.memory)
+    print(result.summary())
+    if args.json:
+        result.write_json(args.json)
+    if args.chrome:
+        result.write_chrome_trace(args.chrome)
@@ -0,0 +1,516 @@
+"""Program-wide analytics report, printable counterpart of ReportingDashboard.js.
+
+The report covers a period (a month, a date range or everything) with:
+totals by member type, points issued vs. redeemed by month, trade vs.
+non-trade spend by month, the top referrers, and the recorded points set
+against the earning rules of the guide's "Points Calculation" section
+(``floor(amount x rate)``, the rate depending on the member type).
+
+The backup is read with ``tdc_backup.stream_backup``, one document at a
+time, into ``ReportColumns``: members become rows of small per-member
+arrays, and transactions, redemptions and referrals are appended to typed
+``array`` columns that are folded into per-month and per-member totals every
+``FOLD_ROWS`` events. Events that arrive before their member (a JSON
+export may list transactions first) are held in memory up to
+``PENDING_ROWS`` and beyond that spilled to a temporary file. Memory grows
+with the number of members and months, not with the size of the export.
+numpy is imported by the functions that use it, so ``tdc report --help``
+stays light.
+
+    python tdc_report.py backups/2024-05-01 report.pdf --month 2024-05
+    python tdc_report.py export.json report.pdf --start 2024-01-01 --end 2024-06-30
+    python tdc_report.py --bench 1000 10000 100000     # throughput and peak RSS
+"""
+import argparse
+import csv
+import datetime
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from array import array
+
+from tdc_backup import backup_size, member_name, parse_date, stream_backup, to_number
+
+NON_TRADE, TRADE = 0, 1
+MEMBER_TYPES = ("Non-Trade", "Trade")
+# ConfigManager's defaults, points per Nu. spent
+DEFAULT_RATES = (1, 2)
+TRANSACTION, REDEMPTION, REFERRAL = 0, 1, 2
+# Per (month, member type): the measures kept for every month
+MEASURES = ("spend", "transactions", "points_issued", "points_redeemed", "redemptions", "referrals",
+            "points_at_rates")
+FOLD_ROWS = 1 << 18
+# Events held back for members not seen yet, kept in memory before spilling to disk
+PENDING_ROWS = 1 << 16
+UNDATED = -1
+DEFAULT_TOP_REFERRERS = 10
+
+
+def month_number(date):
+    return date.year * 12 + date.month - 1
+
+
+def month_label(number):
+    return datetime.date(number // 12, number % 12 + 1, 1).strftime("%b %Y")
+
+
+class ReportColumns:
+    """Report totals accumulated from a stream of backup documents.
+
+    Events of a member not seen yet are held back until the member turns up
+    (a folder backup is always read members first), ``PENDING_ROWS`` in
+    memory and the rest in a temporary file; those whose member never
+    appears are dropped at the end, as ``group_by_member`` does.
+    """
+
+    def __init__(self, start=None, end=None, rates=DEFAULT_RATES):
+        import numpy as np
+
+        self.start = start
+        self.end = end
+        self.rates = np.array(rates, dtype=np.float64)
+        self.member_index = {}
+        self.member_type = bytearray()
+        self.member_joined = array("q")
+        self.member_names = []
+        self.referral_count = np.zeros(0, dtype=np.int64)
+        self.referral_points = np.zeros(0)
+        self.months = {}  # (month, member type) -> MEASURES totals
+        self.records = 0
+        self.dropped = 0
+        self._pending = []
+        self._spill = None
+        self._reset_events()
+
+    def _reset_events(self):
+        self._member = array("q")
+        self._month = array("q")
+        self._kind = bytearray()
+        self._amount = array("d")
+        self._points = array("d")
+
+    def _in_period(self, date):
+        if date is None:
+            return self.start is None and self.end is None
+        return (self.start is None or date >= self.start) and (self.end is None or date <= self.end)
+
+    def add(self, collection, record):
+        self.records += 1
+        if collection == "members":
+            member_id = str(record.get("id", ""))
+            if member_id in self.member_index:
+                return
+            self.member_index[member_id] = len(self.member_type)
+            self.member_type.append(TRADE if record.get("memberType") == "trade" else NON_TRADE)
+            joined = parse_date(record.get("createdAt"))
+            self.member_joined.append(month_number(joined) if self._in_period(joined) and joined else UNDATED)
+            self.member_names.append(member_name(record))
+            return
+        date = parse_date(record.get("date"))
+        if not self._in_period(date):
+            return
+        if collection == "transactions":
+            event = (TRANSACTION, to_number(record.get("amount")), to_number(record.get("pointsEarned")))
+        elif collection == "redemptions":
+            event = (REDEMPTION, 0, to_number(record.get("points")))
+        elif collection == "referrals":
+            event = (REFERRAL, 0, to_number(record.get("pointsEarned")))
+        else:
+            return
+        member_id = str(record.get("memberId", ""))
+        month = month_number(date) if date else UNDATED
+        index = self.member_index.get(member_id)
+        if index is None:
+            self._pending.append((member_id, month, *event))
+            if len(self._pending) >= PENDING_ROWS:
+                self._spill_pending()
+            return
+        self._append(index, month, event)
+
+    def _spill_pending(self):
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile("w+", encoding="utf-8", newline="")
+        csv.writer(self._spill).writerows(self._pending)
+        self._pending = []
+
+    def _held_back(self):
+        """Every held-back event, from the spill file and then from memory"""
+        if self._spill is not None:
+            self._spill.seek(0)
+            for member_id, month, kind, amount, points in csv.reader(self._spill):
+                yield member_id, int(month), (int(kind), float(amount), float(points))
+            self._spill.close()
+            self._spill = None
+        pending, self._pending = self._pending, []
+        for member_id, month, *event in pending:
+            yield member_id, month, event
+
+    def _append(self, index, month, event):
+        self._member.append(index)
+        self._month.append(month)
+        self._kind.append(event[0])
+        self._amount.append(event[1])
+        self._points.append(event[2])
+        if len(self._kind) >= FOLD_ROWS:
+            self.fold()
+
+    def fold(self):
+        """Fold the buffered events into the monthly and per-member totals"""
+        import numpy as np
+
+        if not self._kind:
+            return
+        member = np.frombuffer(self._member, dtype=np.int64)
+        month = np.frombuffer(self._month, dtype=np.int64)
+        kind = np.frombuffer(bytes(self._kind), dtype=np.uint8)
+        amount = np.frombuffer(self._amount, dtype=np.float64)
+        points = np.frombuffer(self._points, dtype=np.float64)
+        member_type = np.frombuffer(bytes(self.member_type), dtype=np.uint8)[member]
+        is_transaction, is_redemption, is_referral = kind == TRANSACTION, kind == REDEMPTION, kind == REFERRAL
+
+        # One key per (month, member type); undated events sort first
+        keys, inverse = np.unique((month + 1) * 2 + member_type, return_inverse=True)
+        at_rates = np.floor(amount * self.rates[member_type])
+        weights = (
+            np.where(is_transaction, amount, 0),
+            is_transaction.astype(np.float64),
+            np.where(is_redemption, 0, points),
+            np.where(is_redemption, points, 0),
+            is_redemption.astype(np.float64),
+            is_referral.astype(np.float64),
+            np.where(is_transaction, at_rates, 0),
+        )
+        sums = np.stack([np.bincount(inverse, weights=w, minlength=len(keys)) for w in weights], axis=1)
+        for key, row in zip(keys.tolist(), sums):
+            key = (key // 2 - 1, key % 2)
+            totals = self.months.get(key)
+            self.months[key] = row if totals is None else totals + row
+
+        count = len(self.member_type)
+        if len(self.referral_count) < count:
+            grow = count - len(self.referral_count)
+            self.referral_count = np.concatenate((self.referral_count, np.zeros(grow, dtype=np.int64)))
+            self.referral_points = np.concatenate((self.referral_points, np.zeros(grow)))
+        self.referral_count += np.bincount(member[is_referral], minlength=count)
+        self.referral_points += np.bincount(member[is_referral], weights=points[is_referral], minlength=count)
+        self._reset_events()
+
+    def finish(self, top=DEFAULT_TOP_REFERRERS):
+        """Resolve held-back events, fold what is buffered, and return a ProgramReport"""
+        for member_id, month, event in self._held_back():
+            index = self.member_index.get(member_id)
+            if index is None:
+                self.dropped += 1
+            else:
+                self._append(index, month, event)
+        self.fold()
+        return ProgramReport(self, top)
+
+
+class ProgramReport:
+    """The figures the report shows, computed from folded ReportColumns"""
+
+    def __init__(self, columns, top=DEFAULT_TOP_REFERRERS):
+        import numpy as np
+
+        self.start, self.end = columns.start, columns.end
+        self.rates = tuple(columns.rates.tolist())
+        member_type = np.frombuffer(bytes(columns.member_type), dtype=np.uint8)
+        joined = np.frombuffer(columns.member_joined, dtype=np.int64)
+        self.members = np.bincount(member_type, minlength=2)
+        self.new_members = np.bincount(member_type[joined != UNDATED], minlength=2)
+        self.new_by_month = {}
+        for month, type_ in zip(joined[joined != UNDATED].tolist(), member_type[joined != UNDATED].tolist()):
+            self.new_by_month.setdefault(month, [0, 0])[type_] += 1
+
+        self.by_type = np.zeros((2, len(MEASURES)))
+        for (month, type_), row in columns.months.items():
+            self.by_type[type_] += row
+        dated = [month for month, _ in columns.months if month != UNDATED]
+        # Every month from the first to the last with activity, quiet ones included
+        self.month_numbers = list(range(min(dated), max(dated) + 1)) if dated else []
+        empty = np.zeros(len(MEASURES))
+        self.by_month = [(month, columns.months.get((month, NON_TRADE), empty),
+                          columns.months.get((month, TRADE), empty)) for month in self.month_numbers]
+
+        count = columns.referral_count
+        order = np.lexsort((-columns.referral_points, -count))[:top]
+        self.top_referrers = [(columns.member_names[i], MEMBER_TYPES[columns.member_type[i]], int(count[i]),
+                               float(columns.referral_points[i])) for i in order.tolist() if count[i]]
+        self.records = columns.records
+        self.dropped = columns.dropped
+
+    def measure(self, name, member_type=None):
+        column = self.by_type[:, MEASURES.index(name)]
+        return column.sum() if member_type is None else column[member_type]
+
+    def period_label(self):
+        if self.start is None and self.end is None:
+            return "All recorded activity"
+        start = self.start.isoformat() if self.start else "the beginning"
+        end = self.end.isoformat() if self.end else "the latest record"
+        return f"{start} to {end}"
+
+
+def read_report(backup, start=None, end=None, rates=DEFAULT_RATES, top=DEFAULT_TOP_REFERRERS):
+    """Stream a backup into a ProgramReport; returns it and the read throughput"""
+    started = time.perf_counter()
+    columns = ReportColumns(start, end, rates)
+    for collection, record in stream_backup(backup):
+        columns.add(collection, record)
+    report = columns.finish(top)
+    seconds = time.perf_counter() - started
+    size = backup_size(backup)
+    stats = {"records": columns.records, "bytes": size, "seconds": seconds,
+             "records_per_second": columns.records / seconds if seconds else 0.0,
+             "mb_per_second": size / 1e6 / seconds if seconds else 0.0, "dropped": columns.dropped}
+    return report, stats
+
+
+# Rendering
+
+def _number(value):
+    return f"{value:,.0f}" if float(value).is_integer() else f"{value:,.2f}"
+
+
+def _amount(value):
+    return f"Nu. {value:,.2f}"
+
+
+def report_flowables(report, styles):
+    import numpy as np
+    from reportlab.lib.units import inch
+    from reportlab.platypus import KeepTogether, Paragraph, Spacer, Table
+
+    from tdc_points import MemberSeries, points_chart
+    from tdc_statements import SUMMARY_TABLE_STYLE
+    from tdc_tables import Column, HistoryTable
+
+    def section(title, *flowables):
+        elements.append(KeepTogether([Paragraph(title, styles["Heading2"]), flowables[0]]))
+        elements.extend(flowables[1:])
+        elements.append(Spacer(1, 0.25 * inch))
+
+    elements = [
+        Paragraph("Thunder Dragon Club", styles["Title"]),
+        Paragraph("Program Report", styles["Title"]),
+        Paragraph(report.period_label(), styles["Normal"]),
+        Spacer(1, 0.2 * inch),
+    ]
+
+    summary = Table([
+        ["Members", f"{report.members.sum():,} ({report.new_members.sum():,} new)"],
+        ["Total Amount Spent", _amount(report.measure("spend"))],
+        ["Points Issued", _number(report.measure("points_issued"))],
+        ["Points Redeemed", _number(report.measure("points_redeemed"))],
+        ["Redemptions", f"{report.measure('redemptions'):,.0f}"],
+        ["Referrals", f"{report.measure('referrals'):,.0f}"],
+    ], colWidths=[2 * inch, 4.5 * inch], hAlign="LEFT")
+    summary.setStyle(SUMMARY_TABLE_STYLE)
+    section("Summary", summary)
+
+    type_rows = [(MEMBER_TYPES[t], report.members[t], report.new_members[t], report.measure("spend", t),
+                  report.measure("points_issued", t), report.measure("points_redeemed", t),
+                  report.measure("referrals", t)) for t in (TRADE, NON_TRADE)]
+    section("Totals by Member Type", HistoryTable([
+        Column("Member Type", 1.0 * inch),
+        Column("Members", 0.75 * inch, "RIGHT", _number),
+        Column("New", 0.6 * inch, "RIGHT", _number),
+        Column("Spend", 1.35 * inch, "RIGHT", _amount),
+        Column("Issued", 0.95 * inch, "RIGHT", _number),
+        Column("Redeemed", 0.95 * inch, "RIGHT", _number),
+        Column("Referrals", 0.9 * inch, "RIGHT", _number),
+    ], type_rows))
+
+    issued = MEASURES.index("points_issued")
+    redeemed = MEASURES.index("points_redeemed")
+    spend = MEASURES.index("spend")
+    if report.by_month:
+        earned = np.array([non_trade[issued] + trade[issued] for _, non_trade, trade in report.by_month])
+        spent = np.array([non_trade[redeemed] + trade[redeemed] for _, non_trade, trade in report.by_month])
+        periods = (np.array(report.month_numbers) - month_number(datetime.date(1970, 1, 1))).astype("datetime64[M]")
+        series = MemberSeries("month", periods, earned, spent, np.cumsum(earned - spent))
+        chart = points_chart(series, names=("Issued", "Redeemed", "Outstanding"))
+        section("Points Issued vs. Redeemed", chart, Spacer(1, 0.1 * inch), HistoryTable([
+            Column("Month", 1.5 * inch),
+            Column("Issued", 1.6 * inch, "RIGHT", _number),
+            Column("Redeemed", 1.6 * inch, "RIGHT", _number),
+            Column("Net", 1.8 * inch, "RIGHT", _number),
+        ], [(month_label(month), e, r, e - r) for month, e, r in zip(report.month_numbers, earned, spent)]))
+        section("Trade vs. Non-Trade Spend", HistoryTable([
+            Column("Month", 1.5 * inch),
+            Column("Trade", 1.6 * inch, "RIGHT", _amount),
+            Column("Non-Trade", 1.6 * inch, "RIGHT", _amount),
+            Column("Trade Share", 1.8 * inch, "RIGHT", lambda share: f"{share:.1%}"),
+        ], [(month_label(month), trade[spend], non_trade[spend],
+             trade[spend] / (trade[spend] + non_trade[spend]) if trade[spend] + non_trade[spend] else 0.0)
+            for month, non_trade, trade in report.by_month]))
+
+    if report.top_referrers:
+        referrers = HistoryTable([
+            Column("#", 0.4 * inch, "RIGHT"),
+            Column("Member", 2.9 * inch),
+            Column("Member Type", 1.2 * inch),
+            Column("Referrals", 0.9 * inch, "RIGHT", _number),
+            Column("Points", 1.1 * inch, "RIGHT", _number),
+        ], [(rank, *row) for rank, row in enumerate(report.top_referrers, 1)])
+    else:
+        referrers = Paragraph("No referrals recorded in this period.", styles["Normal"])
+    section("Top Referrers", referrers)
+
+    at_rates = MEASURES.index("points_at_rates")
+    issued_by_transactions = [report.by_type[t, at_rates] for t in (TRADE, NON_TRADE)]
+    rules = Paragraph(
+        "Points are calculated from the transaction amount and member type: Trade members earn "
+        f"{_number(report.rates[TRADE])} and Non-Trade members {_number(report.rates[NON_TRADE])} "
+        "points per ngultrum spent, rounded down. Recorded points include referral points, "
+        "which the rates do not cover.", styles["Normal"])
+    section("Earning Rules", rules, Spacer(1, 0.1 * inch), HistoryTable([
+        Column("Member Type", 1.4 * inch),
+        Column("Spend", 1.6 * inch, "RIGHT", _amount),
+        Column("At Configured Rates", 1.8 * inch, "RIGHT", _number),
+        Column("Recorded", 1.7 * inch, "RIGHT", _number),
+    ], [(MEMBER_TYPES[t], report.measure("spend", t), expected, report.measure("points_issued", t))
+        for t, expected in zip((TRADE, NON_TRADE), issued_by_transactions)]))
+    return elements
+
+
+def render_report(report, filename, styles=None):
+    """Render a ProgramReport to a path, binary file or tdc_output target.
+
+    Returns the target's result: the size in bytes for paths and files.
+    """
+    from reportlab.lib.pagesizes import letter
+    from generate_tdc_guide import OUTLINE_LEVELS, ThunderDragonGuide, build_styles
+    from tdc_output import render, target_for
+
+    styles = styles or build_styles()
+
+    def make_doc(stream):
+        return ThunderDragonGuide(stream, pagesize=letter, rightMargin=72, leftMargin=72, topMargin=72,
+                                  bottomMargin=72, title="Thunder Dragon Club Program Report",
+                                  outline_levels=OUTLINE_LEVELS, bookmarks=True)
+
+    return render(target_for(filename), make_doc, report_flowables(report, styles))
+
+
+def parse_period(month=None, start=None, end=None):
+    """(start, end) dates from --month YYYY-MM or --start/--end YYYY-MM-DD"""
+    if month:
+        first = datetime.date.fromisoformat(f"{month}-01")
+        following = datetime.date(first.year + first.month // 12, first.month % 12 + 1, 1)
+        return first, following - datetime.timedelta(days=1)
+    return (datetime.date.fromisoformat(start) if start else None,
+            datetime.date.fromisoformat(end) if end else None)
+
+
+# Benchmark
+
+def write_synthetic_export(filename, members, seed=1):
+    """A single-file JSON export of the synthetic backup tdc_bench writes, streamed to disk"""
+    import random
+
+    rng = random.Random(seed)
+
+    def day():
+        return f"2024-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T12:00:00Z"
+
+    collections = {
+        "members": lambda i: {"id": f"m{i}", "firstName": "Tashi", "lastName": f"Dorji {i}",
+                              "memberType": "trade" if i % 3 == 0 else "non-trade",
+                              "createdAt": {"_seconds": 1704189600 + i}},
+        "transactions": lambda i: {"id": f"t{i}", "memberId": f"m{rng.randrange(members)}",
+                                   "amount": rng.randint(100, 9000), "pointsEarned": rng.randint(1, 90),
+                                   "date": day(), "notes": "Wine purchase"},
+        "redemptions": lambda i: {"id": f"r{i}", "memberId": f"m{rng.randrange(members)}",
+                                  "points": rng.randint(10, 500), "item": "Glass of wine", "date": day()},
+        "referrals": lambda i: {"id": f"f{i}", "memberId": f"m{rng.randrange(members)}",
+                                "referralName": "Pema Wangmo", "pointsEarned": 20, "date": day()},
+    }
+    counts = {"members": members, "transactions": members * 20, "redemptions": members * 3, "referrals": members}
+    with open(filename, "w", encoding="utf-8") as f:
+        f.write("{")
+        for number, (name, make) in enumerate(collections.items()):
+            f.write(f'{"," if number else ""}"{name}": [')
+            for i in range(counts[name]):
+                f.write(("," if i else "") + json.dumps(make(i)))
+            f.write("]")
+        f.write("}")
+
+
+def _bench_child(filename):
+    import resource
+
+    report, stats = read_report(filename)
+    started = time.perf_counter()
+    size = render_report(report, os.devnull)
+    stats["render_seconds"] = time.perf_counter() - started
+    stats["pdf_bytes"] = size
+    # ru_maxrss is kilobytes on Linux and bytes on macOS
+    scale = 1 if sys.platform == "darwin" else 1024
+    stats["peak_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale / 1e6
+    print(json.dumps(stats))
+
+
+def benchmark(sizes=(1000, 10000, 100000), workdir=None):
+    """Read and render synthetic JSON exports in fresh interpreters; report throughput and peak RSS"""
+    import tempfile
+
+    results = []
+    with tempfile.TemporaryDirectory(dir=workdir) as directory:
+        for members in sizes:
+            filename = os.path.join(directory, f"export_{members}.json")
+            write_synthetic_export(filename, members)
+            out = subprocess.run([sys.executable, __file__, "--child", filename],
+                                 check=True, capture_output=True, text=True).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            result["members"] = members
+            results.append(result)
+            print(f"{members:>8,} members {result['bytes'] / 1e6:>8.1f} MB {result['records']:>10,} records "
+                  f"{result['records_per_second']:>9,.0f} rec/s {result['mb_per_second']:>6.1f} MB/s "
+                  f"render {result['render_seconds']:>5.2f}s peak RSS {result['peak_rss_mb']:>6.1f} MB")
+            os.remove(filename)
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="tdc report", description="Render the program-wide analytics report")
+    parser.add_argument("backup", nargs="?", help="backup folder of collection CSVs, or a JSON export")
+    parser.add_argument("output", nargs="?", help="report PDF")
+    parser.add_argument("--month", help="report on one month, YYYY-MM")
+    parser.add_argument("--start", help="first day, YYYY-MM-DD")
+    parser.add_argument("--end", help="last day, YYYY-MM-DD")
+    parser.add_argument("--trade-rate", type=float, default=DEFAULT_RATES[TRADE], help="points per Nu. (trade)")
+    parser.add_argument("--non-trade-rate", type=float, default=DEFAULT_RATES[NON_TRADE],
+                        help="points per Nu. (non-trade)")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_REFERRERS, help="referrers listed")
+    parser.add_argument("--bench", type=int, nargs="+", metavar="MEMBERS",
+                        help="benchmark synthetic exports of these many members instead")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        _bench_child(args.child)
+        return 0
+    if args.bench:
+        benchmark(args.bench)
+        return 0
+    if not args.backup or not args.output:
+        parser.error("backup and output are required")
+    try:
+        start, end = parse_period(args.month, args.start, args.end)
+    except ValueError as e:
+        parser.error(f"bad period: {e}")
+    report, stats = read_report(args.backup, start, end, (args.non_trade_rate, args.trade_rate), args.top)
+    size = render_report(report, args.output)
+    print(f"Read {stats['records']:,} records ({stats['bytes'] / 1e6:.1f} MB) in {stats['seconds']:.2f}s: "
+          f"{stats['records_per_second']:,.0f} records/s, {stats['mb_per_second']:.1f} MB/s"
+          + (f", {stats['dropped']:,} without a member" if stats["dropped"] else ""), file=sys.stderr)
+    print(f"Report written to {args.output} ({size:,} bytes)", file=sys.stderr)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
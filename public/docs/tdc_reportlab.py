@@ -0,0 +1,33 @@
+"""The reportlab releases whose internals tdc_output and tdc_images rely on.
+
+tdc_output's ``IncrementalCanvas`` swaps in a ``PDFDocument`` subclass with
+a copy of ``PDFDocument.format`` that skips objects already written, and
+writes page dictionaries early, counting on a page that uses an undefined
+form to fail with KeyError. tdc_images registers one image object in many
+documents through ``PDFDocument.addForm``. Neither is public API, so both
+modules call ``require_tested_reportlab`` at import and refuse to load on a
+release they have not been checked against, rather than write broken PDFs.
+
+Checked: 4.0.9, 4.1.0, 4.2.5, 4.4.4 and 5.0.1 (``PDFDocument.format`` is
+unchanged across them). To allow a new release, render the guide and a
+``python tdc_output.py`` run with it, check the PDFs, and widen the range.
+"""
+import reportlab
+
+# Oldest and newest (major, minor) releases checked
+TESTED_REPORTLAB = ((4, 0), (5, 0))
+
+
+def reportlab_release(version=None):
+    """(major, minor) of a reportlab version string, the installed one by default"""
+    parts = (version or reportlab.Version).split(".")
+    return int(parts[0]), int(parts[1]) if len(parts) > 1 and parts[1].isdigit() else 0
+
+
+def require_tested_reportlab(module):
+    """Raise ImportError for module if the installed reportlab is outside TESTED_REPORTLAB"""
+    oldest, newest = TESTED_REPORTLAB
+    if not oldest <= reportlab_release() <= newest:
+        raise ImportError(f"{module} relies on reportlab internals checked on {oldest[0]}.{oldest[1]} to "
+                          f"{newest[0]}.{newest[1]}, but reportlab {reportlab.Version} is installed "
+                          f"(see tdc_reportlab.py)")
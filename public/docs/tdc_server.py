@@ -0,0 +1,523 @@
+"""Local render service with warm worker processes.
+
+An asyncio HTTP front end, on localhost or a Unix socket, dispatching render
+jobs to a pool of worker processes. Each worker imports reportlab, compiles
+the guide spec and styles, resolves and decodes the logo and renders one
+warm-up guide at start-up, so a request only pays for its own layout.
+
+    python tdc_server.py serve --port 8750 --workers 4
+    python tdc_server.py serve --socket /tmp/tdc.sock
+    python tdc_server.py render guide -o guide.pdf
+    python tdc_server.py render statement member_id=abc123 backup=backups/latest -o abc123.pdf
+    python tdc_server.py render report backup=backups/latest month=2024-05 -o report.pdf
+    python tdc_server.py metrics
+
+Endpoints:
+
+``POST /render/<kind>``
+    JSON parameters in the body, PDF bytes back. ``guide`` takes an optional
+    ``spec`` path. ``statement`` takes either ``backup`` (folder or JSON
+    export) plus ``member_id``, or the raw Firestore documents as
+    ``member`` and optional ``transactions``, ``redemptions`` and
+    ``referrals`` lists. ``report`` takes ``backup`` and optionally
+    ``month`` (YYYY-MM) or ``start``/``end`` (YYYY-MM-DD). Other job kinds
+    can be added with ``register_job``.
+``GET /metrics``
+    Request counts, queue depth, in-flight jobs and latency percentiles.
+``GET /health``
+
+At most ``concurrency`` jobs run at once (default: one per worker); up to
+``max_queue`` more wait, and further requests get 503. A job that exceeds
+its timeout (the server's, or a shorter ``timeout`` parameter in seconds)
+gets 504; its worker finishes it in the background, since a process pool
+task can't be interrupted, and it keeps its concurrency slot until then.
+If a worker dies the pool is replaced, and the request that found it
+broken gets 500.
+"""
+import argparse
+import asyncio
+import collections
+import http.client
+import json
+import math
+import os
+import socket
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlsplit
+
+from tdc_stats import percentile
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8750
+DEFAULT_TIMEOUT = 30.0
+DEFAULT_MAX_QUEUE = 64
+LATENCY_WINDOW = 1000  # latencies kept per job kind for the percentiles
+CHUNK_SIZE = 64 * 1024
+MAX_BODY = 16 * 1024 * 1024
+
+
+class JobError(ValueError):
+    """A job's parameters are wrong; reported to the client as 400"""
+
+
+class RenderError(Exception):
+    """Raised by the client for non-200 responses"""
+
+    def __init__(self, status, message):
+        super().__init__(f"{status}: {message}")
+        self.status = status
+        self.message = message
+
+
+# Worker side. Job functions take the request parameters and return PDF bytes.
+
+JOBS = {}
+_worker_state = {}
+
+
+def register_job(kind, function):
+    """Make function(params) -> bytes available as POST /render/<kind>.
+
+    Register at import time: workers are forked from the server process.
+    """
+    JOBS[kind] = function
+
+
+def _job_guide(params):
+    from generate_tdc_guide import render_guide
+    from tdc_spec import compile_plan, load_spec
+
+    try:
+        plan = compile_plan(load_spec(params.get("spec")))
+    except OSError as e:
+        raise JobError(f"cannot read spec: {e}")
+    logo_path = _worker_state.get("logo_path")
+    # The guide only changes with its spec (or logo), so keep the last render
+    key = (plan.digest, logo_path)
+    cached = _worker_state.get("guide")
+    if cached and cached[0] == key:
+        return cached[1]
+    data, _ = render_guide(plan, logo_path)
+    _worker_state["guide"] = (key, data)
+    return data
+
+
+def _load_members(backup):
+    """group_by_member for a backup, kept while the backup is unchanged on disk"""
+    from tdc_backup import group_by_member
+
+    try:
+        stat = os.stat(backup)
+    except OSError as e:
+        raise JobError(f"cannot read backup: {e}")
+    key = (os.path.abspath(backup), stat.st_mtime_ns, stat.st_size)
+    cached = _worker_state.get("backup")
+    if not cached or cached[0] != key:
+        cached = _worker_state["backup"] = (key, group_by_member(backup))
+    return cached[1]
+
+
+def _job_statement(params):
+    from tdc_backup import MemberActivity
+    from tdc_output import MemoryTarget
+    from tdc_statements import render_statement
+
+    if "member" in params:
+        activity = MemberActivity.from_records(
+            params["member"], params.get("transactions", ()), params.get("redemptions", ()),
+            params.get("referrals", ()))
+    elif "backup" in params and "member_id" in params:
+        activity = _load_members(params["backup"]).get(str(params["member_id"]))
+        if activity is None:
+            raise JobError(f"no member {params['member_id']!r} in backup")
+    else:
+        raise JobError("statement needs 'member', or 'backup' and 'member_id'")
+    target = MemoryTarget()
+    render_statement(activity, target, _worker_state["styles"], _worker_state.get("logo_path"))
+    # Bytes, not the memoryview: the result is pickled back to the server process
+    return target.getvalue()
+
+
+def _job_report(params):
+    from tdc_output import MemoryTarget
+    from tdc_report import parse_period, read_report, render_report
+
+    if "backup" not in params:
+        raise JobError("report needs 'backup'")
+    try:
+        start, end = parse_period(params.get("month"), params.get("start"), params.get("end"))
+    except ValueError as e:
+        raise JobError(f"bad period: {e}")
+    try:
+        report, _ = read_report(params["backup"], start, end)
+    except OSError as e:
+        raise JobError(f"cannot read backup: {e}")
+    target = MemoryTarget()
+    render_report(report, target, _worker_state["styles"])
+    return target.getvalue()
+
+
+register_job("guide", _job_guide)
+register_job("statement", _job_statement)
+register_job("report", _job_report)
+
+
+def _init_worker():
+    """Pay every one-off cost before the first request arrives"""
+    from reportlab.lib.units import inch
+    from generate_tdc_guide import build_styles, get_logo_path
+    from tdc_images import warm
+
+    _worker_state["styles"] = build_styles()
+    logo_path = _worker_state["logo_path"] = get_logo_path()
+    if logo_path:
+        warm(logo_path, 2.5 * inch, 1.5 * inch)
+    _job_guide({})
+
+
+def _run_job(kind, params):
+    started = time.perf_counter()
+    try:
+        data = JOBS[kind](params)
+    except JobError as e:
+        return None, str(e), time.perf_counter() - started
+    return data, None, time.perf_counter() - started
+
+
+# Server side
+
+class _Metrics:
+    def __init__(self):
+        self.started = time.time()
+        self.counts = collections.Counter()
+        self.latencies = collections.defaultdict(lambda: collections.deque(maxlen=LATENCY_WINDOW))
+        self.render_times = collections.defaultdict(lambda: collections.deque(maxlen=LATENCY_WINDOW))
+        self.bytes = 0
+
+    def as_dict(self, server):
+        kinds = {}
+        for kind, values in self.latencies.items():
+            renders = self.render_times[kind]
+            kinds[kind] = {
+                "count": len(values),
+                "p50_ms": round(percentile(values, 0.50) * 1000, 2),
+                "p99_ms": round(percentile(values, 0.99) * 1000, 2),
+                "render_p50_ms": round(percentile(renders, 0.50) * 1000, 2) if renders else None,
+            }
+        return {
+            "uptime_seconds": round(time.time() - self.started, 1),
+            "workers": server.workers,
+            "concurrency": server.concurrency,
+            "queued": server.queued,
+            "in_flight": server.in_flight,
+            "max_queue": server.max_queue,
+            "requests": dict(self.counts),
+            "bytes_sent": self.bytes,
+            "jobs": kinds,
+        }
+
+
+class RenderServer:
+    """Asyncio HTTP front end over a warm ProcessPoolExecutor"""
+
+    def __init__(self, workers=None, concurrency=None, max_queue=DEFAULT_MAX_QUEUE, timeout=DEFAULT_TIMEOUT):
+        self.workers = workers or os.cpu_count() or 1
+        self.concurrency = concurrency or self.workers
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.queued = 0
+        self.in_flight = 0
+        self.metrics = _Metrics()
+        self._pool = None
+        self._server = None
+        self._slots = None
+
+    async def _start_pool(self):
+        loop = asyncio.get_running_loop()
+        pool = self._pool = ProcessPoolExecutor(self.workers, initializer=_init_worker)
+        # Run the initializer in every worker now rather than on the first requests
+        await asyncio.gather(*(loop.run_in_executor(pool, time.sleep, 0.05) for _ in range(self.workers)))
+
+    async def _replace_pool(self, broken):
+        """Swap a broken pool for a fresh one (once, however many requests saw it break)"""
+        if self._pool is not broken:
+            return
+        self.metrics.counts["pool_restarts"] += 1
+        broken.shutdown(wait=False, cancel_futures=True)
+        await self._start_pool()
+
+    async def start(self, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+        await self._start_pool()
+        self._slots = asyncio.Semaphore(self.concurrency)
+        if socket_path:
+            if os.path.exists(socket_path):
+                os.unlink(socket_path)
+            self._server = await asyncio.start_unix_server(self._handle_connection, socket_path)
+        else:
+            self._server = await asyncio.start_server(self._handle_connection, host, port)
+        return self._server
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+
+    # HTTP
+
+    async def _read_request(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        method, target, version = line.decode("latin-1").split(None, 2)
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        length = int(headers.get("content-length") or 0)
+        if length > MAX_BODY:
+            raise ValueError("request body too large")
+        body = await reader.readexactly(length) if length else b""
+        keep_alive = headers.get("connection", "").lower() != "close" and version.strip() == "HTTP/1.1"
+        return method, urlsplit(target).path, body, keep_alive
+
+    async def _write_response(self, writer, status, payload, content_type, keep_alive, headers=None):
+        head = [f"HTTP/1.1 {status} {http.client.responses.get(status, '')}",
+                f"Content-Type: {content_type}", f"Content-Length: {len(payload)}",
+                f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+        head += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+        view = memoryview(payload)
+        for offset in range(0, len(view), CHUNK_SIZE):
+            writer.write(view[offset:offset + CHUNK_SIZE])
+            await writer.drain()
+        await writer.drain()
+        self.metrics.bytes += len(payload)
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader)
+                except ValueError as e:
+                    await self._write_response(writer, 400, _json({"error": str(e)}), "application/json", False)
+                    break
+                if request is None:
+                    break
+                method, path, body, keep_alive = request
+                status, payload, content_type, headers = await self._dispatch(method, path, body)
+                await self._write_response(writer, status, payload, content_type, keep_alive, headers)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _dispatch(self, method, path, body):
+        if method == "GET" and path == "/health":
+            return 200, _json({"status": "ok"}), "application/json", None
+        if method == "GET" and path == "/metrics":
+            return 200, _json(self.metrics.as_dict(self)), "application/json", None
+        if method == "POST" and path.startswith("/render/"):
+            return await self._render(path[len("/render/"):], body)
+        return 404, _json({"error": f"no route for {method} {path}"}), "application/json", None
+
+    async def _render(self, kind, body):
+        counts = self.metrics.counts
+        counts["received"] += 1
+        if kind not in JOBS:
+            counts["unknown_kind"] += 1
+            return 404, _json({"error": f"unknown job kind {kind!r}", "kinds": sorted(JOBS)}), "application/json", None
+        try:
+            params = json.loads(body or b"{}")
+            if not isinstance(params, dict):
+                raise ValueError("parameters must be a JSON object")
+        except ValueError as e:
+            counts["bad_request"] += 1
+            return 400, _json({"error": str(e)}), "application/json", None
+        if self.queued >= self.max_queue:
+            counts["rejected"] += 1
+            return 503, _json({"error": "render queue is full"}), "application/json", {"Retry-After": "1"}
+
+        try:
+            timeout = float(params.pop("timeout", self.timeout))
+            if not (math.isfinite(timeout) and timeout > 0):
+                raise ValueError
+        except (TypeError, ValueError):
+            counts["bad_request"] += 1
+            return 400, _json({"error": "timeout must be a positive number of seconds"}), "application/json", None
+        timeout = min(timeout, self.timeout)
+
+        started = time.perf_counter()
+        self.queued += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), timeout)
+        except asyncio.TimeoutError:
+            counts["timeout"] += 1
+            return 504, _json({"error": "timed out waiting in the queue"}), "application/json", None
+        finally:
+            self.queued -= 1
+        queued = time.perf_counter() - started
+        self.in_flight += 1
+        pool = self._pool
+        try:
+            future = asyncio.get_running_loop().run_in_executor(pool, _run_job, kind, params)
+        except BrokenProcessPool as e:
+            self._job_done(None)
+            return await self._broken(pool, e)
+        # The slot is held until the worker is done with the job, even after a 504
+        future.add_done_callback(self._job_done)
+        try:
+            data, error, render_seconds = await asyncio.wait_for(asyncio.shield(future), max(timeout - queued, 0.001))
+        except asyncio.TimeoutError:
+            counts["timeout"] += 1
+            return 504, _json({"error": f"job exceeded {timeout:.1f}s"}), "application/json", None
+        except BrokenProcessPool as e:
+            return await self._broken(pool, e)
+        except Exception as e:
+            counts["failed"] += 1
+            return 500, _json({"error": f"{type(e).__name__}: {e}"}), "application/json", None
+        if error is not None:
+            counts["bad_request"] += 1
+            return 400, _json({"error": error}), "application/json", None
+        counts["completed"] += 1
+        elapsed = time.perf_counter() - started
+        self.metrics.latencies[kind].append(elapsed)
+        self.metrics.render_times[kind].append(render_seconds)
+        return 200, data, "application/pdf", {
+            "X-Queue-Ms": f"{queued * 1000:.1f}",
+            "X-Render-Ms": f"{render_seconds * 1000:.1f}",
+        }
+
+
+    def _job_done(self, future):
+        self.in_flight -= 1
+        self._slots.release()
+        if future is not None and not future.cancelled():
+            future.exception()  # retrieved, so a job that timed out and then failed isn't logged
+
+    async def _broken(self, pool, error):
+        self.metrics.counts["failed"] += 1
+        await self._replace_pool(pool)
+        return 500, _json({"error": f"worker process died ({error}); workers restarted"}), "application/json", None
+
+
+def _json(value):
+    return json.dumps(value).encode("utf-8")
+
+
+def serve(host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, **options):
+    """Run a RenderServer until interrupted"""
+    async def main():
+        server = RenderServer(**options)
+        await server.start(host, port, socket_path)
+        where = socket_path or f"http://{host}:{port}"
+        print(f"Rendering on {where} with {server.workers} warm workers", flush=True)
+        try:
+            await server.serve_forever()
+        finally:
+            await server.close()
+
+    try:
+        asyncio.run(main())
+    except KeyboardInterrupt:
+        pass
+
+
+# Client
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout=None):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+def _connection(host, port, socket_path, timeout):
+    if socket_path:
+        return _UnixHTTPConnection(socket_path, timeout)
+    return http.client.HTTPConnection(host, port, timeout=timeout)
+
+
+def render(kind, params=None, host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None, timeout=DEFAULT_TIMEOUT + 5):
+    """Ask a running server for a document and return its PDF bytes"""
+    connection = _connection(host, port, socket_path, timeout)
+    try:
+        connection.request("POST", f"/render/{kind}", _json(params or {}), {"Content-Type": "application/json"})
+        response = connection.getresponse()
+        data = response.read()
+    finally:
+        connection.close()
+    if response.status != 200:
+        try:
+            message = json.loads(data)["error"]
+        except (ValueError, KeyError):
+            message = data.decode("utf-8", "replace")
+        raise RenderError(response.status, message)
+    return data
+
+
+def fetch_metrics(host=DEFAULT_HOST, port=DEFAULT_PORT, socket_path=None):
+    connection = _connection(host, port, socket_path, 5)
+    try:
+        connection.request("GET", "/metrics")
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Warm local render service for club documents")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--socket", help="Unix socket path (instead of host/port)")
+    commands = parser.add_subparsers(dest="command", required=True)
+    serve_parser = commands.add_parser("serve", help="run the server")
+    serve_parser.add_argument("--workers", type=int, help="worker processes (default: CPU count)")
+    serve_parser.add_argument("--concurrency", type=int, help="jobs rendering at once (default: workers)")
+    serve_parser.add_argument("--max-queue", type=int, default=DEFAULT_MAX_QUEUE)
+    serve_parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT, help="per-job timeout in seconds")
+    render_parser = commands.add_parser("render", help="request a document from a running server")
+    render_parser.add_argument("kind")
+    render_parser.add_argument("params", nargs="*", metavar="KEY=VALUE")
+    render_parser.add_argument("-o", "--output", required=True)
+    commands.add_parser("metrics", help="print a running server's metrics")
+    args = parser.parse_args(argv)
+
+    if args.command == "serve":
+        serve(args.host, args.port, args.socket, workers=args.workers, concurrency=args.concurrency,
+              max_queue=args.max_queue, timeout=args.timeout)
+    elif args.command == "render":
+        params = dict(item.split("=", 1) for item in args.params)
+        started = time.perf_counter()
+        try:
+            data = render(args.kind, params, args.host, args.port, args.socket)
+        except RenderError as e:
+            print(f"Render failed: {e}", file=sys.stderr)
+            return 1
+        with open(args.output, "wb") as f:
+            f.write(data)
+        print(f"Wrote {args.output} ({len(data):,} bytes in {(time.perf_counter() - started) * 1000:.1f} ms)")
+    else:
+        print(json.dumps(fetch_metrics(args.host, args.port, args.socket), indent=2))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
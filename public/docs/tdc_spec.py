@@ -0,0 +1,325 @@
+"""Declarative document specifications compiled into reusable render plans.
+
+The guide's palette, paragraph styles, table styles and content live in
+``tdc_guide_spec.json``. A spec is compiled in two memoized steps:
+
+* ``compile_styles`` turns the palette and style overrides into an immutable
+  ``StyleRegistry`` (frozen ParagraphStyles, shared TableStyles),
+* ``compile_plan`` turns the sections into a ``GuidePlan``: per-section
+  tuples of pre-resolved operations that only have to instantiate fresh
+  flowables on each render (paragraphs through tdc_paragraphs' layout cache).
+
+Both are keyed on a digest of the spec, and ``load_spec`` is keyed on the
+file's mtime and size, so batch and server processes pay the parse and
+style set-up cost once, however many documents they render.
+
+Content blocks, one key per block:
+
+``{"title": text}``, ``{"h1": text}``, ``{"h2": text}``, ``{"p": text}``
+    Paragraphs in the Title, Heading1, Heading2 and Normal styles.
+``{"steps": [item, ...]}``
+    Numbered CustomBullet lines; an item may be
+    ``{"text": ..., "bullets": [...]}`` to nest bullets under a step.
+``{"bullets": [...]}``
+    "•" CustomBullet lines.
+``{"spacer": inches}``, ``{"page_break": true}``
+``{"table": {"col_widths": [inches...], "style": name, "rows": [[...]]}}``
+``{"logo": {"width": inches, "height": inches, "space_after": inches}}``
+    Placed only when a logo is supplied at render time.
+``{"paragraph": text, "style": name}``
+    A paragraph in any registered style.
+
+Sections are separated by page breaks. A top-level
+``"contents": {"title": ..., "after": section id}`` puts a table of contents
+on its own page(s) after that section (see tdc_contents).
+"""
+import hashlib
+import json
+import os
+import types
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_JUSTIFY, TA_LEFT, TA_RIGHT
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import PageBreak, Spacer, Table, TableStyle
+
+from tdc_paragraphs import _LRU, CachedParagraph
+
+SPEC_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "tdc_guide_spec.json")
+
+ALIGNMENTS = {"left": TA_LEFT, "center": TA_CENTER, "right": TA_RIGHT, "justify": TA_JUSTIFY}
+BLOCK_STYLES = {"title": "Title", "h1": "Heading1", "h2": "Heading2", "p": "Normal"}
+# Table commands whose string arguments are never colours
+NON_COLOR_COMMANDS = {"FONT", "FONTNAME", "FACE", "ALIGN", "ALIGNMENT", "VALIGN"}
+
+# Compiled registries and plans kept per process. A watcher or server sees a
+# new digest on every edit of the spec; only the last few are worth keeping.
+MAX_COMPILED = 4
+
+_spec_cache = {}
+_styles_cache = _LRU(MAX_COMPILED)
+_plan_cache = _LRU(MAX_COMPILED)
+
+
+class SpecError(ValueError):
+    pass
+
+
+class FrozenParagraphStyle(ParagraphStyle):
+    """A ParagraphStyle that refuses changes once it is in a registry"""
+
+    def __setattr__(self, name, value):
+        if self.__dict__.get("_frozen"):
+            raise AttributeError(f"style {self.name!r} is frozen; clone() it to make changes")
+        super().__setattr__(name, value)
+
+    @classmethod
+    def freeze(cls, style):
+        frozen = cls.__new__(cls)
+        frozen.__dict__.update(style.__dict__)
+        frozen.__dict__["parent"] = None
+        frozen.__dict__["_frozen"] = True
+        return frozen
+
+    def clone(self, name, parent=None, **kwds):
+        # Clones are ordinary, mutable styles
+        style = ParagraphStyle(name)
+        style.__dict__.update(self.__dict__)
+        style.__dict__.pop("_frozen", None)
+        style.name = name
+        style.parent = parent
+        style._setKwds(**kwds)
+        return style
+
+
+def load_spec(path=None):
+    """Load a spec file, re-reading it only when it changes on disk"""
+    path = os.path.abspath(path or SPEC_PATH)
+    stat = os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+    spec = _spec_cache.get(key)
+    if spec is None:
+        with open(path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        _spec_cache.clear()
+        _spec_cache[key] = spec
+    return spec
+
+
+def spec_digest(value):
+    """Stable hash of any JSON-serialisable part of a spec"""
+    data = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+class StyleRegistry:
+    """Immutable palette, paragraph styles and table styles for one spec"""
+
+    def __init__(self, palette, paragraph_styles, table_styles, digest):
+        self.palette = types.MappingProxyType(palette)
+        self.paragraph_styles = types.MappingProxyType(paragraph_styles)
+        self.table_styles = types.MappingProxyType(table_styles)
+        self.digest = digest
+
+    def __getitem__(self, name):
+        return self.paragraph_styles[name]
+
+    def __contains__(self, name):
+        return name in self.paragraph_styles
+
+    def get(self, name, default=None):
+        return self.paragraph_styles.get(name, default)
+
+    def color(self, name):
+        return self.palette[name]
+
+
+def _resolve_color(value, palette):
+    if isinstance(value, str):
+        if value in palette:
+            return palette[value]
+        if value.startswith("#"):
+            return colors.HexColor(value)
+        named = getattr(colors, value, None)
+        if isinstance(named, colors.Color):
+            return named
+    return value
+
+
+def _style_attrs(attrs, palette):
+    resolved = {}
+    for key, value in attrs.items():
+        if key == "alignment" and isinstance(value, str):
+            value = ALIGNMENTS[value.lower()]
+        elif key.lower().endswith("color"):
+            value = _resolve_color(value, palette)
+        resolved[key] = value
+    return resolved
+
+
+def _table_command(command, palette):
+    name = command[0]
+    args = [tuple(arg) if isinstance(arg, list) and len(arg) == 2 and all(isinstance(v, int) for v in arg)
+            else arg for arg in command[1:]]
+    if name.upper() not in NON_COLOR_COMMANDS:
+        args = [[_resolve_color(v, palette) for v in arg] if isinstance(arg, list)
+                else _resolve_color(arg, palette) for arg in args]
+    return (name,) + tuple(args)
+
+
+def compile_styles(spec):
+    """Compile (and memoize) the spec's palette and styles into a StyleRegistry"""
+    source = {key: spec.get(key, {}) for key in ("palette", "styles", "table_styles")}
+    digest = spec_digest(source)
+    registry = _styles_cache.get(digest)
+    if registry is not None:
+        return registry
+
+    palette = {name: colors.HexColor(value) for name, value in source["palette"].items()}
+    sheet = getSampleStyleSheet()
+    for name, attrs in source["styles"].items():
+        attrs = _style_attrs(attrs, palette)
+        if name in sheet:
+            # Modify existing styles, like the hand-written guide always did
+            for key, value in attrs.items():
+                setattr(sheet[name], key, value)
+        else:
+            parent = attrs.pop("parent", None)
+            sheet.add(ParagraphStyle(name=name, parent=sheet[parent] if parent else None, **attrs))
+    paragraph_styles = {name: FrozenParagraphStyle.freeze(style) for name, style in sheet.byName.items()}
+    table_styles = {
+        name: TableStyle([_table_command(command, palette) for command in commands])
+        for name, commands in source["table_styles"].items()
+    }
+    registry = StyleRegistry(palette, paragraph_styles, table_styles, digest)
+    _styles_cache.put(digest, registry)
+    return registry
+
+
+# Plan operations. Each is (builder, args); builders yield fresh flowables.
+
+def _op_paragraph(text, style, logo):
+    yield CachedParagraph(text, style)
+
+
+def _op_spacer(height, logo):
+    yield Spacer(1, height)
+
+
+def _op_page_break(logo):
+    yield PageBreak()
+
+
+def _op_table(rows, col_widths, table_style, logo):
+    table = Table([list(row) for row in rows], colWidths=list(col_widths))
+    table.setStyle(table_style)
+    yield table
+
+
+def _op_logo(width, height, space_after, logo):
+    if logo:
+        logo.drawWidth = width
+        logo.drawHeight = height
+        yield logo
+        yield Spacer(1, space_after)
+
+
+class SectionPlan:
+    """Compiled operations for one section of a document"""
+
+    def __init__(self, section_id, title, ops, digest):
+        self.id = section_id
+        self.title = title
+        self.ops = ops
+        self.digest = digest
+
+    def flowables(self, logo=None):
+        for builder, args in self.ops:
+            yield from builder(*args, logo)
+
+
+class GuidePlan:
+    """A compiled spec: style registry plus per-section plans"""
+
+    def __init__(self, spec, registry, sections, digest):
+        self.title = spec.get("title", "")
+        self.output = spec.get("output")
+        self.contents = spec.get("contents")
+        self.registry = registry
+        self.sections = sections
+        self.digest = digest
+
+    def section(self, section_id):
+        for section in self.sections:
+            if section.id == section_id:
+                return section
+        raise KeyError(section_id)
+
+    def flowables(self, logo=None, contents=None):
+        """Yield fresh flowables for the whole document, sections separated by page breaks.
+
+        ``contents`` (the table of contents' flowables) get their own page(s)
+        after the section named by the spec's ``contents.after``.
+        """
+        after = (self.contents or {}).get("after")
+        last = len(self.sections) - 1
+        for i, section in enumerate(self.sections):
+            yield from section.flowables(logo)
+            if contents and section.id == after:
+                yield PageBreak()
+                yield from contents
+            if i != last:
+                yield PageBreak()
+
+
+def _compile_block(block, registry):
+    styles = registry.paragraph_styles
+    bullet = styles["CustomBullet"]
+    for key, style_name in BLOCK_STYLES.items():
+        if key in block:
+            return [(_op_paragraph, (block[key], styles[style_name]))]
+    if "paragraph" in block:
+        return [(_op_paragraph, (block["paragraph"], styles[block.get("style", "Normal")]))]
+    if "steps" in block:
+        ops = []
+        for number, item in enumerate(block["steps"], 1):
+            if isinstance(item, str):
+                item = {"text": item}
+            ops.append((_op_paragraph, (f"{number}. {item['text']}", bullet)))
+            ops.extend((_op_paragraph, (f"• {text}", bullet)) for text in item.get("bullets", ()))
+        return ops
+    if "bullets" in block:
+        return [(_op_paragraph, (f"• {text}", bullet)) for text in block["bullets"]]
+    if "spacer" in block:
+        return [(_op_spacer, (block["spacer"] * inch,))]
+    if "page_break" in block:
+        return [(_op_page_break, ())]
+    if "table" in block:
+        table = block["table"]
+        rows = tuple(tuple(row) for row in table["rows"])
+        col_widths = tuple(width * inch for width in table["col_widths"])
+        return [(_op_table, (rows, col_widths, registry.table_styles[table["style"]]))]
+    if "logo" in block:
+        logo = block["logo"]
+        return [(_op_logo, (logo["width"] * inch, logo["height"] * inch, logo.get("space_after", 0) * inch))]
+    raise SpecError(f"unknown block: {block!r}")
+
+
+def compile_plan(spec):
+    """Compile (and memoize) a spec into a GuidePlan"""
+    digest = spec_digest(spec)
+    plan = _plan_cache.get(digest)
+    if plan is not None:
+        return plan
+    registry = compile_styles(spec)
+    sections = []
+    for section in spec["sections"]:
+        ops = []
+        for block in section["blocks"]:
+            ops.extend(_compile_block(block, registry))
+        title = next((block["h1"] for block in section["blocks"] if "h1" in block), section["id"])
+        sections.append(SectionPlan(section["id"], title, tuple(ops), spec_digest(section)))
+    plan = GuidePlan(spec, registry, tuple(sections), digest)
+    _plan_cache.put(digest, plan)
+    return plan
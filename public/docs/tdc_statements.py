@@ -0,0 +1,342 @@
+"""Bulk per-member PDF statements rendered from a Firestore backup.
+
+Each statement follows the "Member Details" view described in section 5 of
+the guide: basic information, the activity summary, a chart of points over
+the last two years, and the transaction, redemption and referral histories.
+The backup is grouped by member in one pass over each collection, the
+points series of all members are aggregated at once (``tdc_points``), and
+the statements are rendered across a
+ProcessPoolExecutor whose workers build the style sheet and resolve the
+logo once at start-up instead of once per document.
+
+    python tdc_statements.py backups/2024-05-01 statements/ --workers 8
+"""
+import argparse
+import itertools
+import os
+import re
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.units import inch
+from reportlab.platypus import KeepTogether, Spacer, Table, TableStyle
+
+from generate_tdc_guide import (
+    ACCENT_COLOR, OUTLINE_LEVELS, ThunderDragonGuide, build_styles, get_logo, get_logo_path,
+)
+from tdc_backup import group_by_member
+from tdc_contents import build_with_contents, contents_flowables
+from tdc_images import warm
+from tdc_output import target_for
+from tdc_paragraphs import CachedParagraph
+from tdc_points import CHART_PERIODS, PointsColumns, aggregate, points_chart
+from tdc_tables import Column, HistoryTable
+
+DEFAULT_CHUNKSIZE = 32
+# Chunks queued per worker; more only holds pickled members in the queue
+CHUNKS_IN_FLIGHT = 2
+
+SUMMARY_TABLE_STYLE = TableStyle([
+    ('TEXTCOLOR', (0, 0), (0, -1), ACCENT_COLOR),
+    ('TEXTCOLOR', (1, 0), (1, -1), colors.white),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 4),
+])
+
+
+def format_date(value):
+    return value.isoformat() if value else ""
+
+
+def format_amount(value):
+    return f"Nu. {value:,.2f}"
+
+
+def format_points(value):
+    return f"{value:,}" if isinstance(value, int) else f"{value:,.2f}"
+
+
+# Column schemas matching the MemberActivity history tuples
+TRANSACTION_COLUMNS = [
+    Column("Date", 1.2 * inch, format=format_date),
+    Column("Amount", 1.4 * inch, "RIGHT", format_amount),
+    Column("Points Earned", 1.2 * inch, "RIGHT", format_points),
+    Column("Notes", 2.7 * inch),
+]
+REDEMPTION_COLUMNS = [
+    Column("Date", 1.2 * inch, format=format_date),
+    Column("Points Redeemed", 1.4 * inch, "RIGHT", format_points),
+    Column("Item", 3.9 * inch),
+]
+REFERRAL_COLUMNS = [
+    Column("Date", 1.2 * inch, format=format_date),
+    Column("Referred Person", 3.9 * inch),
+    Column("Points Earned", 1.4 * inch, "RIGHT", format_points),
+]
+
+# Per-worker state, set up once by _init_worker
+_worker_styles = None
+_worker_logo_path = None
+
+
+def _history_section(title, columns, rows, styles):
+    elements = [CachedParagraph(title, styles["Heading2"])]
+    if rows:
+        elements.append(HistoryTable(columns, rows))
+    else:
+        elements.append(CachedParagraph(f"No {title.lower()} recorded.", styles["Normal"]))
+    elements.append(Spacer(1, 0.2 * inch))
+    return elements
+
+
+def member_points(members, member_ids=None):
+    """{member_id: MemberSeries or None} of monthly points for the chart, aggregated in one go"""
+    series = aggregate(PointsColumns.from_activities(members), "month")
+    return {member_id: series.for_member(member_id, CHART_PERIODS) for member_id in (member_ids or members)}
+
+
+def statement_flowables(activity, styles, logo=None, contents=None, points=None):
+    """Build the flowables for one member's statement, with the contents' flowables after the title.
+
+    ``points`` is the member's monthly MemberSeries (see ``member_points``).
+    """
+    elements = []
+    if logo:
+        elements.append(logo)
+        elements.append(Spacer(1, 0.3 * inch))
+    elements.append(CachedParagraph("Thunder Dragon Club", styles["Title"]))
+    elements.append(CachedParagraph("Member Statement", styles["Title"]))
+    if contents:
+        elements.extend(contents)
+        elements.append(Spacer(1, 0.2 * inch))
+
+    elements.append(CachedParagraph("Basic Information", styles["Heading2"]))
+    info = Table([
+        ["Name", activity.name],
+        ["Email", activity.email],
+        ["Phone", activity.phone],
+        ["Member Type", activity.member_type],
+        ["Member Since", format_date(activity.member_since)],
+    ], colWidths=[2 * inch, 4.5 * inch], hAlign="LEFT")
+    info.setStyle(SUMMARY_TABLE_STYLE)
+    elements.append(info)
+    elements.append(Spacer(1, 0.2 * inch))
+
+    elements.append(CachedParagraph("Activity Summary", styles["Heading2"]))
+    summary = Table([
+        ["Total Amount Spent", format_amount(activity.total_spent)],
+        ["Total Points Earned", format_points(activity.total_earned)],
+        ["Total Points Redeemed", format_points(activity.total_redeemed)],
+        ["Current Points Balance", format_points(activity.points)],
+    ], colWidths=[2 * inch, 4.5 * inch], hAlign="LEFT")
+    summary.setStyle(SUMMARY_TABLE_STYLE)
+    elements.append(summary)
+    elements.append(Spacer(1, 0.3 * inch))
+
+    if points is not None:
+        chart = points_chart(points)
+    else:
+        chart = CachedParagraph("No dated points activity recorded.", styles["Normal"])
+    elements.append(KeepTogether([CachedParagraph("Points Over Time", styles["Heading2"]), chart]))
+    elements.append(Spacer(1, 0.2 * inch))
+
+    elements.extend(_history_section("Transactions", TRANSACTION_COLUMNS, activity.transactions, styles))
+    elements.extend(_history_section("Redemptions", REDEMPTION_COLUMNS, activity.redemptions, styles))
+    elements.extend(_history_section("Referrals", REFERRAL_COLUMNS, activity.referrals, styles))
+    return elements
+
+
+def render_statement(activity, filename, styles=None, logo_path=None, layouts=None, points=False):
+    """Render one statement PDF to a path, binary file or tdc_output target.
+
+    Returns the target's result: the size in bytes for paths and files,
+    which are written page by page (paths through a temporary file).
+
+    Every statement has the same headings, so the contents laid out for the
+    last one fits the next and each statement takes a single pass. Batches
+    pass each member's ``points`` from ``member_points``; by default they
+    are aggregated for this member alone.
+    """
+    if styles is None:
+        styles = build_styles()
+    if points is False:
+        points = member_points({activity.member_id: activity})[activity.member_id]
+
+    def make_doc(buffer):
+        return ThunderDragonGuide(
+            buffer,
+            pagesize=letter,
+            rightMargin=72,
+            leftMargin=72,
+            topMargin=72,
+            bottomMargin=72,
+            title=f"Thunder Dragon Club Statement - {activity.name}",
+            outline_levels=OUTLINE_LEVELS,
+            bookmarks=True,
+        )
+
+    def make_story(entries):
+        logo = get_logo(path=logo_path) if logo_path else None
+        return statement_flowables(activity, styles, logo, contents_flowables(entries, styles), points)
+
+    result, _ = build_with_contents(make_doc, make_story, "statement", layouts, target=target_for(filename))
+    return result
+
+
+def _init_worker(logo_path):
+    """Pre-warm a worker: build styles and touch the logo once"""
+    global _worker_styles, _worker_logo_path
+    _worker_styles = build_styles()
+    _worker_logo_path = logo_path
+    if logo_path:
+        # Scale and decode the logo once; every statement shares the result
+        warm(logo_path, 2.5 * inch, 1.5 * inch)
+
+
+def _render_task(task):
+    activity, filename, points = task
+    try:
+        return activity.member_id, render_statement(activity, filename, _worker_styles, _worker_logo_path,
+                                                    points=points), None
+    except Exception as e:
+        return activity.member_id, 0, f"{type(e).__name__}: {e}"
+
+
+def _render_chunk(tasks):
+    return [_render_task(task) for task in tasks]
+
+
+def _chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(itertools.islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def statement_filename(out_dir, member_id):
+    safe_id = re.sub(r"[^A-Za-z0-9_.-]", "_", member_id) or "unknown"
+    return os.path.join(out_dir, f"statement_{safe_id}.pdf")
+
+
+class ProgressReport:
+    """Prints progress and throughput at most once per interval"""
+
+    def __init__(self, total, interval=2.0, stream=sys.stderr):
+        self.total = total
+        self.interval = interval
+        self.stream = stream
+        self.done = 0
+        self.errors = 0
+        self.bytes = 0
+        self.started = time.perf_counter()
+        self._last = self.started
+
+    def update(self, size, error=None):
+        self.done += 1
+        self.bytes += size
+        if error:
+            self.errors += 1
+        now = time.perf_counter()
+        if now - self._last >= self.interval:
+            self._last = now
+            self._print(now)
+
+    def _print(self, now):
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        remaining = (self.total - self.done) / rate if rate else 0.0
+        percent = 100.0 * self.done / self.total if self.total else 100.0
+        print(f"[{self.done}/{self.total}] {percent:5.1f}% {rate:8.1f} docs/s "
+              f"ETA {remaining:6.0f}s errors {self.errors}", file=self.stream)
+
+    def finish(self):
+        elapsed = time.perf_counter() - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        print(f"Rendered {self.done - self.errors}/{self.total} statements in {elapsed:.1f}s "
+              f"({rate:.1f} docs/s, {self.bytes / 1e6:.1f} MB, {self.errors} errors)", file=self.stream)
+        return {"documents": self.done, "errors": self.errors, "seconds": elapsed,
+                "docs_per_second": rate, "bytes": self.bytes}
+
+
+def render_statements(backup_path, out_dir, workers=None, chunksize=DEFAULT_CHUNKSIZE, member_ids=None):
+    """Render a statement for every member in a backup into out_dir.
+
+    Tasks are submitted ``chunksize`` members at a time, so the per-task
+    IPC cost is amortised, with at most two chunks per worker in flight.
+
+    The pool only pays for itself with more than one core and at least two
+    chunks of work (64 members at the default chunksize): starting a worker
+    costs about 10 ms where processes fork and 270 ms where they are spawned
+    (macOS, Windows), against about 20 ms per statement. Smaller batches,
+    single-core machines and ``workers=1`` render in this process, which is
+    also easier to debug.
+
+    Raises ValueError if workers or chunksize is less than 1.
+    """
+    if workers is not None and workers < 1:
+        raise ValueError(f"workers must be at least 1, not {workers}")
+    if chunksize < 1:
+        raise ValueError(f"chunksize must be at least 1, not {chunksize}")
+    members = group_by_member(backup_path)
+    if member_ids:
+        members = {key: members[key] for key in member_ids if key in members}
+    os.makedirs(out_dir, exist_ok=True)
+    points = member_points(members)
+    tasks = ((activity, statement_filename(out_dir, activity.member_id), points[activity.member_id])
+             for activity in members.values())
+    logo_path = get_logo_path()
+    progress = ProgressReport(len(members))
+    failures = []
+
+    def record(results):
+        for member_id, size, error in results:
+            progress.update(size, error)
+            if error:
+                failures.append((member_id, error))
+
+    workers = workers or os.cpu_count() or 1
+    if workers == 1 or len(members) < 2 * chunksize:
+        _init_worker(logo_path)
+        record(map(_render_task, tasks))
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(logo_path,)) as pool:
+            pending = set()
+            for chunk in _chunked(tasks, chunksize):
+                pending.add(pool.submit(_render_chunk, chunk))
+                if len(pending) >= workers * CHUNKS_IN_FLIGHT:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        record(future.result())
+            for future in wait(pending)[0]:
+                record(future.result())
+
+    for member_id, error in failures[:20]:
+        print(f"Failed to render statement for {member_id}: {error}", file=sys.stderr)
+    report = progress.finish()
+    report["failures"] = failures
+    return report
+
+
+def main(argv=None):
+    from tdc_cli import positive_int
+
+    parser = argparse.ArgumentParser(description="Render a PDF statement for every member in a backup")
+    parser.add_argument("backup", help="backup folder of collection CSVs, or a JSON export")
+    parser.add_argument("out_dir", help="directory to write statement_<member id>.pdf files into")
+    parser.add_argument("--workers", type=positive_int, default=None, help="worker processes (default: CPU count)")
+    parser.add_argument("--chunksize", type=positive_int, default=DEFAULT_CHUNKSIZE,
+                        help="members per dispatched task")
+    parser.add_argument("--member", action="append", dest="member_ids", help="only render this member id")
+    args = parser.parse_args(argv)
+    report = render_statements(args.backup, args.out_dir, args.workers, args.chunksize, args.member_ids)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
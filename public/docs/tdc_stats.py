@@ -0,0 +1,10 @@
+"""Summary statistics shared by the benchmarks and the render server's metrics."""
+import math
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list: the smallest value with fraction of them at or below it"""
+    ordered = sorted(values)
+    # Rounded first so that float noise (0.07 * 100 == 7.000000000000001) cannot push it up a rank
+    rank = math.ceil(round(fraction * len(ordered), 9))
+    return ordered[max(0, min(len(ordered), rank) - 1)]
@@ -0,0 +1,395 @@
+"""Paginated history tables for 10k-500k row transaction and redemption lists.
+
+``Table`` measures every cell, resolves every style command per cell and,
+when it splits, re-measures the whole remainder, which makes long histories
+quadratically slow. ``HistoryTable`` trades generality for speed:
+
+* column widths come from a schema and are resolved once per frame width,
+* every row is a single line of fixed height (text that does not fit is
+  truncated), so a page split is just an index computation,
+* the header row is repeated on every page,
+* zebra striping and the grid are drawn as one filled path and one stroked
+  path per page, and all cell text goes into a single text object.
+
+Rows can be any sequence (split pieces share it, nothing is copied) or any
+iterator, in which case only one page's worth of rows is buffered at a time.
+
+Run ``python tdc_tables.py`` to compare against ``Table`` and ``LongTable``.
+"""
+import argparse
+import collections.abc
+import math
+import time
+
+from reportlab.lib import colors
+from reportlab.pdfbase.pdfmetrics import getFont, stringWidth
+from reportlab.platypus.flowables import Flowable
+
+from generate_tdc_guide import ACCENT_COLOR, TABLE_ROW_COLOR
+
+ELLIPSIS = "..."
+# Octal escapes for a PDF literal string of WinAnsi bytes (kept 7-bit, like reportlab's own)
+_PDF_ESCAPES = {code: f"\\{code:03o}" for code in range(256) if code < 32 or code > 126}
+_PDF_ESCAPES.update({ord("\\"): "\\\\", ord("("): "\\(", ord(")"): "\\)"})
+
+
+class Column:
+    """One column of a HistoryTable schema.
+
+    ``width`` is in points, or a fraction of the available width when it is
+    at most 1. ``format`` turns a raw cell value into text.
+    """
+
+    def __init__(self, title, width, align="LEFT", format=str):
+        self.title = title
+        self.width = width
+        self.align = align.upper()
+        self.format = format
+
+
+class HistoryTableStyle:
+    """Visual settings shared by every page of a HistoryTable"""
+
+    def __init__(self, font_name="Helvetica", font_size=9, header_font_name="Helvetica-Bold",
+                 padding=3, header_background=ACCENT_COLOR, header_text_color=colors.black,
+                 text_color=colors.white, row_colors=(TABLE_ROW_COLOR, colors.HexColor('#222222')),
+                 grid_color=colors.HexColor('#666666'), grid_width=0.25):
+        self.font_name = font_name
+        self.font_size = font_size
+        self.header_font_name = header_font_name
+        self.padding = padding
+        self.header_background = header_background
+        self.header_text_color = header_text_color
+        self.text_color = text_color
+        self.row_colors = row_colors
+        self.grid_color = grid_color
+        self.grid_width = grid_width
+        self.row_height = font_size * 1.2 + 2 * padding
+        # Widest glyph in the font: strings shorter than width / this always fit
+        font = getFont(font_name)
+        self.max_glyph_width = max(font.widths) * font_size / 1000.0 or font_size
+
+
+class _WinAnsiText:
+    """Measure and encode cells for a standard Type 1 font without the text object.
+
+    ``TextObject.textOut`` and ``stringWidth`` go through reportlab's
+    per-character font fallback logic, most of a long table's cost without
+    the C accelerator. For text the font's own encoding covers, these give
+    the same widths and the same operators; ``encode`` returns None for text
+    they do not cover, which then goes through reportlab as before.
+    """
+
+    def __init__(self, font_name, font_size):
+        font = getFont(font_name)
+        self.usable = not getattr(font, "_dynamicFont", 0) and font.encoding.name == "WinAnsiEncoding"
+        self.widths = font.widths
+        self.scale = font_size / 1000.0
+
+    def encode(self, text):
+        try:
+            return text.encode("cp1252")
+        except UnicodeEncodeError:
+            return None
+
+    def width(self, encoded):
+        return sum(map(self.widths.__getitem__, encoded)) * self.scale
+
+    def literal(self, encoded):
+        return encoded.decode("latin-1").translate(_PDF_ESCAPES)
+
+
+class _SequenceRows:
+    def __init__(self, rows, start, stop):
+        self.rows = rows
+        self.start = start
+        self.stop = stop
+
+    def count(self, limit):
+        return min(limit, self.stop - self.start)
+
+    def split(self, n):
+        middle = self.start + n
+        return _SequenceRows(self.rows, self.start, middle), _SequenceRows(self.rows, middle, self.stop)
+
+    def __iter__(self):
+        rows = self.rows
+        for i in range(self.start, self.stop):
+            yield rows[i]
+
+
+class _IteratorRows:
+    def __init__(self, source, buffer=None):
+        self.source = source
+        self.buffer = buffer or []
+
+    def count(self, limit):
+        buffer = self.buffer
+        source = self.source
+        while len(buffer) < limit:
+            try:
+                buffer.append(next(source))
+            except StopIteration:
+                break
+        return min(limit, len(buffer))
+
+    def split(self, n):
+        head = self.buffer[:n]
+        return _SequenceRows(head, 0, len(head)), _IteratorRows(self.source, self.buffer[n:])
+
+    def __iter__(self):
+        yield from self.buffer
+        yield from self.source
+
+
+class _Layout:
+    """Column geometry shared by all the pieces of one split table"""
+
+    def __init__(self, columns, style):
+        self.columns = columns
+        self.style = style
+        self._by_width = {}
+
+    def resolve(self, avail_width):
+        layout = self._by_width.get(avail_width)
+        if layout is None:
+            widths = [c.width * avail_width if c.width <= 1 else c.width for c in self.columns]
+            xs = [0]
+            for width in widths[:-1]:
+                xs.append(xs[-1] + width)
+            padding = self.style.padding
+            text_widths = [max(0, w - 2 * padding) for w in widths]
+            safe_chars = [int(w / self.style.max_glyph_width) for w in text_widths]
+            layout = self._by_width[avail_width] = (widths, xs, text_widths, safe_chars)
+        return layout
+
+
+class HistoryTable(Flowable):
+    """Fast single-line-per-row table that paginates with a repeated header"""
+
+    def __init__(self, columns, rows, style=None, _layout=None, _row_offset=0):
+        super().__init__()
+        self.columns = columns
+        self.table_style = style or HistoryTableStyle()
+        if isinstance(rows, (_SequenceRows, _IteratorRows)):
+            self._rows = rows
+        elif isinstance(rows, collections.abc.Sequence):
+            self._rows = _SequenceRows(rows, 0, len(rows))
+        else:
+            self._rows = _IteratorRows(iter(rows))
+        self._layout = _layout or _Layout(columns, self.table_style)
+        self._row_offset = _row_offset
+        self._avail_width = None
+
+    def _capacity(self, avail_height):
+        style = self.table_style
+        return max(0, int(math.floor((avail_height - style.row_height) / style.row_height)))
+
+    def wrap(self, availWidth, availHeight):
+        self._avail_width = availWidth
+        widths = self._layout.resolve(availWidth)[0]
+        row_height = self.table_style.row_height
+        # Ask for one more row than fits so we know whether we need to split
+        count = self._rows.count(self._capacity(availHeight) + 1)
+        self.width = sum(widths)
+        self.height = row_height * (count + 1)
+        self._count = count
+        return self.width, self.height
+
+    def split(self, availWidth, availHeight):
+        capacity = self._capacity(availHeight)
+        if capacity < 1:
+            return []
+        count = self._rows.count(capacity + 1)
+        if count <= capacity:
+            return [self]
+        head, tail = self._rows.split(capacity)
+        return [
+            HistoryTable(self.columns, head, self.table_style, self._layout, self._row_offset),
+            HistoryTable(self.columns, tail, self.table_style, self._layout, self._row_offset + capacity),
+        ]
+
+    def _fit(self, text, max_width, safe_chars, font_name, font_size, width=None):
+        width = width or (lambda text: stringWidth(text, font_name, font_size))
+        if len(text) <= safe_chars or width(text) <= max_width:
+            return text
+        # Binary search the longest prefix that fits with the ellipsis
+        lo, hi = 0, len(text)
+        while lo < hi:
+            mid = (lo + hi + 1) // 2
+            if width(text[:mid] + ELLIPSIS) <= max_width:
+                lo = mid
+            else:
+                hi = mid - 1
+        return text[:lo] + ELLIPSIS
+
+    def _draw_text_row(self, text_object, cells, y, font_name, layout, measure_all=False, fast=None):
+        style = self.table_style
+        widths, xs, text_widths, safe_chars = layout
+        # The safe-length shortcut only holds for the body font
+        if measure_all:
+            safe_chars = [0] * len(widths)
+        padding = style.padding
+        font_size = style.font_size
+        for i, text in enumerate(cells):
+            if not text:
+                continue
+            encoded = fast.encode(text) if fast else None
+            if encoded is not None:
+                # Same fitting and placement as below, on the encoded bytes
+                if len(text) > safe_chars[i] and fast.width(encoded) > text_widths[i]:
+                    text = self._fit(text, text_widths[i], 0, font_name, font_size,
+                                     lambda text: fast.width(text.encode("cp1252")))
+                    encoded = text.encode("cp1252")
+                align = self.columns[i].align
+                if align == "LEFT":
+                    x = xs[i] + padding
+                elif align == "RIGHT":
+                    x = xs[i] + widths[i] - padding - fast.width(encoded)
+                else:
+                    x = xs[i] + (widths[i] - fast.width(encoded)) / 2.0
+                text_object._code.append(f"1 0 0 1 {x:.2f} {y:.2f} Tm ({fast.literal(encoded)}) Tj")
+                continue
+            text = self._fit(text, text_widths[i], safe_chars[i], font_name, font_size)
+            align = self.columns[i].align
+            if align == "LEFT":
+                x = xs[i] + padding
+            else:
+                text_width = stringWidth(text, font_name, font_size)
+                if align == "RIGHT":
+                    x = xs[i] + widths[i] - padding - text_width
+                else:
+                    x = xs[i] + (widths[i] - text_width) / 2.0
+            text_object.setTextOrigin(x, y)
+            text_object.textOut(text)
+
+    def draw(self):
+        canv = self.canv
+        style = self.table_style
+        layout = self._layout.resolve(self._avail_width)
+        widths, xs, _, _ = layout
+        width = self.width
+        height = self.height
+        row_height = style.row_height
+        count = self._count
+        # Centre the line box in the row; Helvetica descends ~0.2em below the baseline
+        baseline = style.padding + style.font_size * 0.3
+
+        canv.saveState()
+        # Header background, then the whole body in the first zebra colour and
+        # every other row in the second, as a single path
+        canv.setFillColor(style.header_background)
+        canv.rect(0, height - row_height, width, row_height, stroke=0, fill=1)
+        if count:
+            canv.setFillColor(style.row_colors[0])
+            canv.rect(0, 0, width, height - row_height, stroke=0, fill=1)
+            if len(style.row_colors) > 1:
+                path = canv.beginPath()
+                for i in range(count):
+                    if (self._row_offset + i) % 2:
+                        path.rect(0, height - row_height * (i + 2), width, row_height)
+                canv.setFillColor(style.row_colors[1])
+                canv.drawPath(path, stroke=0, fill=1)
+
+        if style.grid_width:
+            path = canv.beginPath()
+            for i in range(count + 2):
+                path.moveTo(0, i * row_height)
+                path.lineTo(width, i * row_height)
+            for x in xs + [width]:
+                path.moveTo(x, 0)
+                path.lineTo(x, height)
+            canv.setStrokeColor(style.grid_color)
+            canv.setLineWidth(style.grid_width)
+            canv.drawPath(path, stroke=1, fill=0)
+
+        text = canv.beginText()
+        text.setFont(style.header_font_name, style.font_size)
+        text.setFillColor(style.header_text_color)
+        self._draw_text_row(text, [c.title for c in self.columns], height - row_height + baseline,
+                            style.header_font_name, layout, measure_all=True)
+        text.setFont(style.font_name, style.font_size)
+        text.setFillColor(style.text_color)
+        formats = [c.format for c in self.columns]
+        fast = _WinAnsiText(style.font_name, style.font_size)
+        fast = fast if fast.usable else None
+        y = height - 2 * row_height + baseline
+        for row in self._rows:
+            self._draw_text_row(text, [fmt(value) for fmt, value in zip(formats, row)], y,
+                                style.font_name, layout, fast=fast)
+            y -= row_height
+        canv.drawText(text)
+        canv.restoreState()
+
+
+# Benchmark
+
+def _bench_rows(count):
+    return [
+        (f"2024-{i % 12 + 1:02d}-{i % 28 + 1:02d}", f"Nu. {(i * 37) % 9000 + 100:,}.00",
+         str((i * 7) % 90 + 1), "Wine purchase" if i % 5 else "Tasting event, two bottles of Ser Kem")
+        for i in range(count)
+    ]
+
+
+def _bench_build(kind, rows):
+    import io
+
+    from reportlab.lib.pagesizes import letter
+    from reportlab.lib.units import inch
+    from reportlab.platypus import LongTable, Table, TableStyle
+
+    from generate_tdc_guide import ThunderDragonGuide
+
+    buffer = io.BytesIO()
+    doc = ThunderDragonGuide(buffer, pagesize=letter, leftMargin=72, rightMargin=72,
+                             topMargin=72, bottomMargin=72)
+    header = ["Date", "Amount", "Points", "Notes"]
+    if kind == "HistoryTable":
+        columns = [Column("Date", 1.2 * inch), Column("Amount", 1.4 * inch, "RIGHT"),
+                   Column("Points", 0.9 * inch, "RIGHT"), Column("Notes", 3.0 * inch)]
+        story = [HistoryTable(columns, rows)]
+    else:
+        cls = Table if kind == "Table" else LongTable
+        table = cls([header] + [list(r) for r in rows], colWidths=[1.2 * inch, 1.4 * inch, 0.9 * inch, 3.0 * inch],
+                    repeatRows=1)
+        # Same shape of per-cell commands the guide's member table uses
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), ACCENT_COLOR),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.black),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [TABLE_ROW_COLOR, colors.HexColor('#222222')]),
+            ('TEXTCOLOR', (0, 1), (-1, -1), colors.white),
+            ('FONTSIZE', (0, 0), (-1, -1), 9),
+            ('ALIGN', (1, 1), (2, -1), 'RIGHT'),
+            ('GRID', (0, 0), (-1, -1), 0.25, colors.HexColor('#666666')),
+        ]))
+        story = [table]
+    started = time.perf_counter()
+    doc.build(story)
+    return time.perf_counter() - started, len(buffer.getvalue()), doc.page
+
+
+def benchmark(sizes=(1000, 10000, 100000), max_plain_rows=20000):
+    """Time HistoryTable against Table and LongTable on the same rows"""
+    results = []
+    for count in sizes:
+        rows = _bench_rows(count)
+        for kind in ("HistoryTable", "LongTable", "Table"):
+            if kind != "HistoryTable" and count > max_plain_rows:
+                print(f"{kind:>12} {count:>7} rows  skipped (over --max-plain-rows)")
+                continue
+            seconds, size, pages = _bench_build(kind, rows)
+            results.append({"kind": kind, "rows": count, "seconds": seconds, "bytes": size, "pages": pages})
+            print(f"{kind:>12} {count:>7} rows {pages:>6} pages {seconds:>8.2f}s "
+                  f"{count / seconds:>10.0f} rows/s {size / 1024:>9.0f} KB")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark HistoryTable against Table/LongTable")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--max-plain-rows", type=int, default=20000,
+                        help="skip Table/LongTable above this many rows")
+    args = parser.parse_args()
+    benchmark(args.sizes, args.max_plain_rows)
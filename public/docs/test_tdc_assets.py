@@ -0,0 +1,119 @@
+"""AssetCache against a local stand-in for the logo host.
+
+    python -m pytest public/docs
+"""
+import http.server
+import json
+import os
+import stat
+import subprocess
+import sys
+import threading
+import time
+
+import pytest
+
+from tdc_assets import AssetCache, _atomic_write
+
+DOCS_DIR = os.path.dirname(os.path.abspath(__file__))
+LOGO = b"\x89PNG\r\n\x1a\n stand-in logo"
+ETAG = '"logo-v1"'
+
+
+class _LogoHandler(http.server.BaseHTTPRequestHandler):
+    delay = 0.0
+    requests = []
+
+    def do_GET(self):
+        type(self).requests.append(dict(self.headers))
+        time.sleep(self.delay)
+        if self.headers.get("If-None-Match") == ETAG:
+            self.send_response(304)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("ETag", ETAG)
+        self.send_header("Content-Length", str(len(LOGO)))
+        self.end_headers()
+        self.wfile.write(LOGO)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server():
+    _LogoHandler.delay = 0.0
+    _LogoHandler.requests = []
+    httpd = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _LogoHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}/logo.png"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def _index(root):
+    with open(os.path.join(root, "index.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def test_cold_fetch_downloads_and_records_validators(server, tmp_path):
+    cache = AssetCache(root=str(tmp_path), offline=False)
+    path = cache.fetch(server)
+    with open(path, "rb") as f:
+        assert f.read() == LOGO
+    entry = _index(str(tmp_path))[server]
+    assert entry["etag"] == ETAG
+    # Fresh: served without another request
+    assert cache.fetch(server) == path
+    assert len(_LogoHandler.requests) == 1
+
+
+def test_stale_entry_is_revalidated_with_a_conditional_request(server, tmp_path):
+    cache = AssetCache(root=str(tmp_path), offline=False)
+    path = cache.fetch(server)
+    cache._update_index(server, dict(_index(str(tmp_path))[server], checked_at=0))
+    assert cache.fetch(server) == path
+    assert _LogoHandler.requests[-1].get("If-None-Match") == ETAG
+    assert _index(str(tmp_path))[server]["checked_at"] > 0
+
+
+def test_background_refresh_finishes_before_a_short_process_exits(server, tmp_path):
+    cache = AssetCache(root=str(tmp_path), offline=False)
+    cache.store(server, LOGO)  # stale seed: no validators
+    cache._update_index(server, dict(_index(str(tmp_path))[server], checked_at=0))
+    _LogoHandler.delay = 0.3
+    script = ("import sys; from tdc_assets import AssetCache; "
+              "print(AssetCache(root=sys.argv[1], offline=False).fetch(sys.argv[2], background=True))")
+    subprocess.run([sys.executable, "-c", script, str(tmp_path), server], cwd=DOCS_DIR, check=True,
+                   capture_output=True)
+    entry = _index(str(tmp_path))[server]
+    assert entry["etag"] == ETAG
+    assert entry["checked_at"] > 0
+
+
+def test_concurrent_index_updates_keep_every_entry(tmp_path):
+    root = str(tmp_path)
+    script = ("import sys; from tdc_assets import AssetCache; cache = AssetCache(root=sys.argv[1], offline=True)\n"
+              "for i in range(20): cache.store(f'https://example.test/{sys.argv[2]}/{i}', sys.argv[2].encode())")
+    processes = [subprocess.Popen([sys.executable, "-c", script, root, f"p{n}"], cwd=DOCS_DIR) for n in range(4)]
+    for process in processes:
+        assert process.wait() == 0
+    assert len(_index(root)) == 80
+
+
+def test_atomic_write_keeps_the_mode_of_the_file_it_replaces(tmp_path):
+    path = str(tmp_path / "guide.pdf")
+    umask = os.umask(0o022)
+    try:
+        _atomic_write(path, b"first")
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+        os.chmod(path, 0o640)
+        _atomic_write(path, b"second")
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o640
+    finally:
+        os.umask(umask)
+    with open(path, "rb") as f:
+        assert f.read() == b"second"
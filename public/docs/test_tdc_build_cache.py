@@ -0,0 +1,65 @@
+"""The stitched guide: parallel sections, reuse of unchanged sections, and its outline.
+
+    python -m pytest public/docs
+"""
+import json
+import multiprocessing
+import re
+
+import pytest
+
+from tdc_build_cache import BuildCache, guide_bytes
+from tdc_pdf import PdfDocument
+from tdc_spec import SPEC_PATH
+
+
+@pytest.fixture
+def spec_path(tmp_path, monkeypatch):
+    monkeypatch.setenv("TDC_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("TDC_OFFLINE", "1")
+    monkeypatch.chdir(tmp_path)  # no ./logo.png: the guide is built without one
+    path = tmp_path / "spec.json"
+    path.write_text(open(SPEC_PATH, encoding="utf-8").read(), encoding="utf-8")
+    return str(path)
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="slow to spawn workers")
+def test_parallel_sections_stitch_to_the_same_bytes(spec_path, tmp_path):
+    serial, _ = guide_bytes(spec_path, cache=BuildCache(str(tmp_path / "serial")))
+    parallel, report = guide_bytes(spec_path, cache=BuildCache(str(tmp_path / "parallel")), workers=2)
+    assert len(report["rendered"]) == 9
+    assert parallel == serial
+
+
+def test_only_the_edited_section_is_laid_out_again(spec_path, tmp_path):
+    cache = BuildCache(str(tmp_path / "builds"))
+    before, _ = guide_bytes(spec_path, cache=cache)
+    with open(spec_path, encoding="utf-8") as f:
+        spec = json.load(f)
+    spec["sections"][3]["blocks"].append({"p": "One more paragraph."})
+    with open(spec_path, "w", encoding="utf-8") as f:
+        json.dump(spec, f)
+    after, report = guide_bytes(spec_path, cache=cache)
+    assert report["rendered"] == [spec["sections"][3]["id"]]
+    assert len(report["reused"]) == len(spec["sections"]) - 1
+    assert after != before and b"One more paragraph." not in before
+
+
+def test_outline_and_page_numbers_cover_the_stitched_guide(spec_path, tmp_path):
+    data, _ = guide_bytes(spec_path, cache=BuildCache(str(tmp_path / "builds")))
+    doc = PdfDocument(data)
+    total = doc.page_count()
+    with open(spec_path, encoding="utf-8") as f:
+        spec = json.load(f)
+    titles = [block["h1"] for section in spec["sections"] for block in section["blocks"] if "h1" in block]
+    outline = [re.search(rb"/Title \((.*?)\)", body).group(1).decode()
+               for body in doc.objects.values() if b"/Title (" in body and b"/Dest [" in body]
+    assert set(titles) <= set(outline)
+    # Outline destinations point at pages of the stitched document
+    pages = set(doc.pages)
+    for body in doc.objects.values():
+        if b"/Title (" in body and b"/Dest [" in body:
+            assert int(re.search(rb"/Dest \[ (\d+) 0 R", body).group(1)) in pages
+    stamps = [body for body in doc.objects.values() if b"Tj" in body and b"(Page " in body]
+    assert sorted(int(re.search(rb"\(Page (\d+) of (\d+)\)", s).group(1)) for s in stamps) == list(range(1, total + 1))
+    assert all(b"of %d)" % total in s for s in stamps)
@@ -0,0 +1,122 @@
+"""Single-pass tables of contents: headings from the last build, page numbers filled in at save.
+
+    python -m pytest public/docs
+"""
+import io
+import json
+import os
+import base64
+import re
+import zlib
+
+import pytest
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import PageBreak, Paragraph
+
+from generate_tdc_guide import OUTLINE_LEVELS, ThunderDragonGuide, build_styles
+from tdc_build_cache import BuildCache, guide_bytes
+from tdc_contents import LayoutCache, build_with_contents, contents_flowables
+from tdc_pdf import PdfDocument
+from tdc_spec import SPEC_PATH
+
+
+@pytest.fixture(autouse=True)
+def private_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("TDC_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("TDC_OFFLINE", "1")
+
+
+def _make_doc(buffer):
+    return ThunderDragonGuide(buffer, pagesize=letter, outline_levels=OUTLINE_LEVELS, bookmarks=True,
+                              pageCompression=0)
+
+
+def _story(titles):
+    styles = build_styles()
+
+    def make_story(entries):
+        story = contents_flowables(entries, styles)
+        for title, style in titles:
+            story += [PageBreak(), Paragraph(title, styles[style])]
+        return story
+
+    return make_story
+
+
+def _stream(body):
+    data = body[body.index(b"stream") + 6:body.rindex(b"endstream")].strip()
+    if b"/ASCII85Decode" in body:
+        data = base64.a85decode(data, adobe=True)
+    return zlib.decompress(data) if b"/FlateDecode" in body else data
+
+
+def _page_numbers(data):
+    """Heading key -> the page number its contents entry shows"""
+    doc = PdfDocument(data)
+    forms = {}
+    for body in doc.objects.values():
+        for key, number in re.findall(rb"/FormXob\.tdcPageOf-([\w-]+) (\d+) 0 R", body):
+            text = re.search(rb"\((\d+)\) Tj", _stream(doc.objects[int(number)]))
+            forms[key.decode()] = int(text.group(1))
+    return forms
+
+
+def test_headings_from_the_last_build_make_it_one_pass(tmp_path):
+    layouts = LayoutCache(str(tmp_path / "cache"))
+    story = _story([("Alpha", "Heading1"), ("Beta", "Heading2")])
+    _, passes = build_with_contents(_make_doc, story, "sample", layouts)
+    assert passes == 2
+    path = layouts._path("sample")
+    written = os.stat(path).st_mtime_ns
+    # A fresh cache reads the layout back from disk
+    data, passes = build_with_contents(_make_doc, story, "sample", LayoutCache(str(tmp_path / "cache")))
+    assert passes == 1
+    assert os.stat(path).st_mtime_ns == written
+    assert _page_numbers(data) == {"alpha": 2, "beta": 3}
+
+
+def test_pages_moving_does_not_cost_a_pass(tmp_path):
+    layouts = LayoutCache(str(tmp_path / "cache"))
+    build_with_contents(_make_doc, _story([("Alpha", "Heading1"), ("Beta", "Heading2")]), "sample", layouts)
+    # Same headings, one more page ahead of Beta
+    longer = _story([("Alpha", "Heading1"), ("Filler", "Normal"), ("Beta", "Heading2")])
+    data, passes = build_with_contents(_make_doc, longer, "sample", layouts)
+    assert passes == 1
+    assert _page_numbers(data) == {"alpha": 2, "beta": 4}
+
+
+def test_changed_headings_are_laid_out_again(tmp_path):
+    layouts = LayoutCache(str(tmp_path / "cache"))
+    build_with_contents(_make_doc, _story([("Alpha", "Heading1")]), "sample", layouts)
+    data, passes = build_with_contents(_make_doc, _story([("Alpha", "Heading1"), ("Gamma", "Heading1")]),
+                                       "sample", layouts)
+    assert passes == 2
+    assert _page_numbers(data) == {"alpha": 2, "gamma": 3}
+    assert [heading["key"] for heading in layouts.get("sample")] == ["alpha", "gamma"]
+
+
+def test_guide_contents_shows_the_stitched_pages(tmp_path):
+    spec_path = tmp_path / "spec.json"
+    with open(SPEC_PATH, encoding="utf-8") as f:
+        spec = json.load(f)
+    spec_path.write_text(json.dumps(spec), encoding="utf-8")
+    cache = BuildCache(str(tmp_path / "builds"))
+    data, report = guide_bytes(str(spec_path), cache=cache)
+    assert report["contents_passes"] >= 1
+    doc = PdfDocument(data)
+    outline = {}
+    for body in doc.objects.values():
+        entry = re.search(rb"/Dest \[ (\d+) 0 R /XYZ", body)
+        if b"/Title (" in body and entry:
+            title = re.search(rb"/Title \((.*?)\)", body).group(1)
+            outline[title] = doc.pages.index(int(entry.group(1))) + 1
+    numbers = _page_numbers(data)
+    assert len(numbers) == len(outline) > 9
+    assert sorted(numbers.values()) == sorted(outline.values())
+
+    # Text edits that move no heading reuse the rendered contents
+    spec["sections"][-1]["blocks"].append({"p": "A closing remark."})
+    spec_path.write_text(json.dumps(spec), encoding="utf-8")
+    again, report = guide_bytes(str(spec_path), cache=cache)
+    assert report["contents_passes"] == 0
+    assert _page_numbers(again) == numbers
@@ -0,0 +1,52 @@
+"""CSV export to PDF: lazy imports for --help, period errors, and pages written as they end.
+
+    python -m pytest public/docs
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+import tdc_csv_pdf
+from tdc_csv_pdf import convert, write_synthetic_export
+from tdc_output import IncrementalCanvas
+
+DOCS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_help_does_not_import_reportlab():
+    script = ("import sys, tdc_cli\n"
+              "try:\n    tdc_cli.main(['csv', '--help'])\nexcept SystemExit:\n    pass\n"
+              "print(sorted({m.split('.')[0] for m in sys.modules} & {'reportlab', 'numpy'}))")
+    out = subprocess.run([sys.executable, "-c", script], cwd=DOCS_DIR, check=True, capture_output=True, text=True)
+    assert out.stdout.strip().splitlines()[-1] == "[]"
+
+
+def test_bad_month_is_a_usage_error(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        tdc_csv_pdf.main(["in.csv", "out.pdf", "--month", "2024-13"])
+    assert exit_info.value.code == 2
+    assert "bad period" in capsys.readouterr().err
+
+
+def test_pages_are_written_as_they_end(tmp_path, monkeypatch):
+    monkeypatch.setenv("TDC_CACHE_DIR", str(tmp_path / "cache"))
+    source = str(tmp_path / "export.csv")
+    output = str(tmp_path / "export.pdf")
+    write_synthetic_export(source, 2000)
+    held = []
+    show_page = IncrementalCanvas.showPage
+
+    def counting_show_page(canvas):
+        show_page(canvas)
+        held.append(sum(1 for page in canvas._doc.Pages.pages if hasattr(page, "Contents")))
+
+    monkeypatch.setattr(IncrementalCanvas, "showPage", counting_show_page)
+    stats = convert(source, output)
+    # No page dictionary is left waiting for save()
+    assert stats["pages"] > 40 and max(held) == 0
+    with open(output, "rb") as f:
+        data = f.read()
+    assert data.count(b"/Type /Page\n") == stats["pages"]
+    assert data.rstrip().endswith(b"%%EOF")
@@ -0,0 +1,94 @@
+"""Prepared images: per-document size and time against plain Image, and the bounded memos.
+
+    python -m pytest public/docs -s     # -s shows the measured sizes and times
+"""
+import io
+import os
+import time
+
+import pytest
+from PIL import Image
+
+import tdc_images
+from tdc_bench import fixture_photos
+from tdc_images import PreparedImage, _bench_document, prepare_image, shared_xobject
+
+
+@pytest.fixture(autouse=True)
+def private_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("TDC_CACHE_DIR", str(tmp_path / "cache"))
+    tdc_images._prepared.clear()
+    tdc_images._xobjects.clear()
+    yield
+    tdc_images._prepared.clear()
+    tdc_images._xobjects.clear()
+
+
+@pytest.fixture
+def photos(tmp_path):
+    return fixture_photos(str(tmp_path), count=2)
+
+
+def _per_document(photos, prepared, docs=3):
+    _bench_document(photos, prepared, 1)  # warm-up: imports, and the one-off preparation
+    started = time.perf_counter()
+    sizes = [_bench_document(photos, prepared, 2) for _ in range(docs)]
+    return (time.perf_counter() - started) / docs, sizes
+
+
+def test_prepared_images_are_smaller_and_faster_per_document(photos):
+    plain_seconds, plain_sizes = _per_document(photos, prepared=False)
+    prepared_seconds, prepared_sizes = _per_document(photos, prepared=True)
+    print(f"\nplain {plain_seconds * 1000:.1f} ms/doc {plain_sizes[-1]:,} bytes/doc, "
+          f"prepared {prepared_seconds * 1000:.1f} ms/doc {prepared_sizes[-1]:,} bytes/doc")
+    assert prepared_sizes[-1] < plain_sizes[-1] / 2
+    assert prepared_seconds < plain_seconds / 2
+    # Every document embeds the same bytes
+    assert len(set(prepared_sizes)) == 1
+
+
+def test_documents_share_one_decoded_image(photos):
+    _bench_document(photos, True, 1)
+    first = shared_xobject(prepare_image(photos[0], 3.6 * 72, 2.4 * 72))
+    _bench_document(photos, True, 1)
+    assert shared_xobject(prepare_image(photos[0], 3.6 * 72, 2.4 * 72)) is first
+
+
+def test_transparent_image_keeps_its_soft_mask(tmp_path):
+    source = str(tmp_path / "logo.png")
+    image = Image.new("RGBA", (400, 200), (0, 0, 0, 0))
+    image.paste((212, 175, 55, 255), (100, 50, 300, 150))
+    image.save(source)
+    xobject, smask = shared_xobject(prepare_image(source, 200, 100))
+    assert smask is not None and xobject.width <= 400
+
+
+def test_memos_are_bounded(photos, monkeypatch):
+    monkeypatch.setattr(tdc_images._prepared, "max_entries", 2)
+    monkeypatch.setattr(tdc_images._xobjects, "max_entries", 2)
+    for width in (100, 150, 200, 250):
+        shared_xobject(prepare_image(photos[0], width, width))
+    assert len(tdc_images._prepared) == 2
+    assert len(tdc_images._xobjects) == 2
+
+
+def test_flowable_draws_in_a_document(photos):
+    from reportlab.lib.pagesizes import letter
+    from generate_tdc_guide import ThunderDragonGuide
+
+    buffer = io.BytesIO()
+    ThunderDragonGuide(buffer, pagesize=letter).build([PreparedImage(photos[0], 200, 150)])
+    assert buffer.getvalue().count(b"/Subtype /Image") == 1
+
+
+def test_edited_source_is_prepared_again(tmp_path):
+    source = str(tmp_path / "logo.png")
+    Image.new("RGB", (400, 200), (200, 0, 0)).save(source)
+    red = prepare_image(source, 200, 100)
+    Image.new("RGB", (400, 200), (0, 0, 200)).save(source)
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))  # coarse file system clocks
+    blue = prepare_image(source, 200, 100)
+    assert blue != red
+    with Image.open(blue) as image:
+        assert image.convert("RGB").getpixel((0, 0)) == (0, 0, 200)
@@ -0,0 +1,81 @@
+"""IncrementalCanvas: what is written when a page ends and what waits for save().
+
+    python -m pytest public/docs
+"""
+import io
+import os
+import re
+import stat
+
+import pytest
+import reportlab
+
+from tdc_output import FileTarget, IncrementalCanvas, MemoryTarget
+from tdc_reportlab import require_tested_reportlab
+
+
+def _objects(data):
+    return dict(re.findall(rb"\n(\d+) 0 obj\n(.*?)\nendobj", data, re.S))
+
+
+def test_page_using_a_form_defined_later_waits_for_save():
+    stream = io.BytesIO()
+    canvas = IncrementalCanvas(stream)
+    canvas.doForm("later")  # as tdc_contents draws page numbers it only knows later
+    canvas.showPage()
+    canvas.drawString(72, 72, "second page")
+    canvas.showPage()
+    written_early = stream.tell()
+    canvas.beginForm("later")
+    canvas.drawString(0, 0, "defined after its use")
+    canvas.endForm()
+    canvas.save()
+
+    data = stream.getvalue()
+    pages = [body for body in _objects(data).values() if b"/Type /Page\n" in body]
+    assert len(pages) == 2
+    # The second page's dictionary was written when it ended, the first's at save()
+    first, = [page for page in pages if b"/XObject" in page]
+    second, = [page for page in pages if page is not first]
+    assert data.index(first) > written_early
+    assert data.index(second) < written_early
+    assert re.search(rb"/FormXob\.later \d+ 0 R", first)
+
+
+def test_untested_reportlab_release_is_refused(monkeypatch):
+    monkeypatch.setattr(reportlab, "Version", "3.6.13")
+    with pytest.raises(ImportError, match="tdc_output"):
+        require_tested_reportlab("tdc_output")
+
+
+def test_getvalue_copies_the_document():
+    target = MemoryTarget()
+    stream = target.open()
+    canvas = IncrementalCanvas(stream)
+    canvas.drawString(72, 72, "one page")
+    canvas.save()
+    view = target.commit()
+    value = target.getvalue()
+    assert value == bytes(view) and value.startswith(b"%PDF")
+    view.release()
+
+
+def _write_with(target):
+    canvas = IncrementalCanvas(target.open())
+    canvas.drawString(72, 72, "one page")
+    canvas.save()
+    target.commit()
+
+
+def test_file_target_output_has_the_usual_mode(tmp_path):
+    path = str(tmp_path / "report.pdf")
+    umask = os.umask(0o022)
+    try:
+        _write_with(FileTarget(path))
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o644
+        os.chmod(path, 0o600)
+        _write_with(FileTarget(path))
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    finally:
+        os.umask(umask)
+    assert os.listdir(tmp_path) == ["report.pdf"]
@@ -0,0 +1,41 @@
+"""CachedParagraph against plain Paragraph, including widths too narrow to lay out.
+
+    python -m pytest public/docs
+"""
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import Paragraph
+
+from tdc_paragraphs import CachedParagraph, ParagraphCache
+from tdc_spec import FrozenParagraphStyle
+
+TEXT = "Members earn one point for every <b>Nu 100</b> spent on wine and tastings."
+
+
+def _styles():
+    styles = getSampleStyleSheet()
+    return styles["Normal"], FrozenParagraphStyle.freeze(styles["Normal"])
+
+
+def test_too_narrow_to_lay_out_is_not_cached():
+    normal, frozen = _styles()
+    assert CachedParagraph("hello world", normal).wrap(1e-7, 100) == Paragraph("hello world", normal).wrap(1e-7, 100)
+    cache = ParagraphCache()
+    paragraph = CachedParagraph(TEXT, frozen, cache=cache)
+    assert paragraph.wrap(1e-7, 100) == (0, 0x7fffffff)
+    assert len(cache.layouts) == 0
+    # Wrapped for real afterwards, it lays out and caches as usual
+    assert paragraph.wrap(200, 100) == Paragraph(TEXT, frozen).wrap(200, 100)
+    assert len(cache.layouts) == 1
+
+
+def test_cached_layout_matches_paragraph():
+    _, frozen = _styles()
+    cache = ParagraphCache()
+    first = CachedParagraph(TEXT, frozen, cache=cache)
+    first.wrap(200, 100)
+    # A narrow miss after a real layout must not store the earlier lines
+    first.wrap(1e-7, 100)
+    second = CachedParagraph(TEXT, frozen, cache=cache)
+    assert second.wrap(200, 100) == Paragraph(TEXT, frozen).wrap(200, 100)
+    assert second.blPara.lines == first.blPara.lines
+    assert len(cache.layouts) == 1
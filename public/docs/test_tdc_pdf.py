@@ -0,0 +1,88 @@
+"""Stitching separately rendered documents: shared objects, outline, named links and page numbers.
+
+    python -m pytest public/docs
+"""
+import io
+import re
+
+import pytest
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import PageBreak, Paragraph
+
+from generate_tdc_guide import OUTLINE_LEVELS, ThunderDragonGuide, build_styles
+from tdc_pdf import PdfDocument, Stitcher, stitch
+
+
+@pytest.fixture(autouse=True)
+def private_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("TDC_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("TDC_OFFLINE", "1")
+
+
+def _render(flowables):
+    buffer = io.BytesIO()
+    doc = ThunderDragonGuide(buffer, pagesize=letter, invariant=1, outline_levels=OUTLINE_LEVELS,
+                             named_links=True)
+    doc.build(flowables)
+    return buffer.getvalue(), doc.headings
+
+
+@pytest.fixture
+def chapters():
+    styles = build_styles()
+    one = _render([Paragraph("Chapter One", styles["Heading1"]),
+                   Paragraph('See <a href="#chapter-two">chapter two</a>.', styles["Normal"])])
+    two = _render([Paragraph("Chapter Two", styles["Heading1"]), PageBreak(),
+                   Paragraph("Details", styles["Heading2"]), Paragraph("More.", styles["Normal"])])
+    return one, two
+
+
+def _stitched(chapters):
+    stitcher = Stitcher()
+    stitcher.number_pages()
+    for data, headings in chapters:
+        first = stitcher.add_document(data)[0]
+        for heading in headings:
+            stitcher.add_outline(heading["title"], first + heading["page"], heading["top"], heading["level"])
+            stitcher.add_destination(heading["key"], first + heading["page"], heading["top"])
+    return PdfDocument(stitcher.tobytes(title="Chapters"))
+
+
+def _objects_with(doc, marker):
+    return [number for number, body in doc.objects.items() if marker in body]
+
+
+def test_pages_are_concatenated_and_shared_objects_written_once(chapters):
+    out = PdfDocument(stitch([data for data, _ in chapters]))
+    assert out.page_count() == 3
+    # Both documents use the heading font and the page background form
+    assert len(_objects_with(out, b"/BaseFont /Helvetica-Bold")) == 1
+    assert len(_objects_with(out, b"/Subtype /Form")) == 1
+
+
+def test_links_between_documents_resolve_through_named_destinations(chapters):
+    out = _stitched(chapters)
+    assert _objects_with(out, b"/Dest (chapter-two)")
+    names = out.objects[_objects_with(out, b"/Names [")[0]]
+    target = re.search(rb"\(chapter-two\) \[ (\d+) 0 R", names)
+    assert int(target.group(1)) == out.pages[1]
+
+
+def test_outline_nests_headings_on_their_stitched_pages(chapters):
+    out = _stitched(chapters)
+    root = out.objects[_objects_with(out, b"/Type /Outlines")[0]]
+    assert b"/Count 3" in root
+    entries = {re.search(rb"/Title \((.*?)\)", body).group(1): body
+               for number, body in out.objects.items() if b"/Title (" in body and b"/Dest" in body}
+    assert set(entries) == {b"Chapter One", b"Chapter Two", b"Details"}
+    chapter_two = next(number for number, body in out.objects.items() if body is entries[b"Chapter Two"])
+    assert b"/Parent %d 0 R" % chapter_two in entries[b"Details"]
+    for title, page in ((b"Chapter One", 0), (b"Chapter Two", 1), (b"Details", 2)):
+        assert b"/Dest [ %d 0 R /XYZ" % out.pages[page] in entries[title]
+
+
+def test_every_page_is_stamped_with_its_stitched_number(chapters):
+    out = _stitched(chapters)
+    for index, page in enumerate(out.pages):
+        form = re.search(rb"/TdcPageNumber (\d+) 0 R", out.objects[page])
+        assert b"(Page %d of 3) Tj" % (index + 1) in out.objects[int(form.group(1))]
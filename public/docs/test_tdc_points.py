@@ -0,0 +1,85 @@
+"""Points series: the vectorized aggregation against per-member loops, and the chart.
+
+    python -m pytest public/docs
+"""
+import datetime
+
+import numpy as np
+import pytest
+
+from tdc_backup import MemberActivity, group_by_member
+from tdc_bench import write_synthetic_backup
+from tdc_points import PointsColumns, aggregate, points_chart, _loop_series
+
+
+@pytest.fixture
+def members(tmp_path, monkeypatch):
+    monkeypatch.setenv("TDC_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("TDC_OFFLINE", "1")
+    path = str(tmp_path / "backup")
+    write_synthetic_backup(path, 40)
+    members = group_by_member(path)
+    # One with undated rows and one with no dated activity at all
+    members["m0"].transactions.append((None, 100.0, 999, "undated"))
+    quiet = MemberActivity({"id": "quiet"})
+    quiet.redemptions.append((None, 50, "Ser Kem"))
+    members["quiet"] = quiet
+    return members
+
+
+def _active(series):
+    """(year, month, earned, redeemed, balance) for the periods a member was active in"""
+    return [(p.item().year, p.item().month, e, r, b)
+            for p, e, r, b in zip(series.periods, series.earned, series.redeemed, series.balance)
+            if e or r]
+
+
+def test_monthly_aggregation_matches_the_python_loops(members):
+    series = aggregate(PointsColumns.from_activities(members), "month")
+    for member_id, activity in members.items():
+        expected = _loop_series(activity)
+        member = series.for_member(member_id)
+        if not expected:
+            assert member is None
+            continue
+        expected_active = [row for row in expected if row[1] or row[2]]
+        active = _active(member)
+        assert [(year, month) for year, month, *_ in active] == [key for key, *_ in expected_active]
+        for (*_, earned, redeemed, balance), (_, e, r, b) in zip(active, expected_active):
+            assert (earned, redeemed, balance) == pytest.approx((e, r, b))
+        # Ends at the last month in the backup, with the member's final balance
+        assert member.periods[-1] == series.last_period.astype("datetime64[M]")
+        assert member.balance[-1] == pytest.approx(expected[-1][3])
+
+
+def test_quiet_periods_carry_the_balance_forward():
+    activity = MemberActivity({"id": "m1"})
+    activity.transactions += [(datetime.date(2024, 1, 5), 100.0, 10, ""), (datetime.date(2024, 4, 2), 50.0, 5, "")]
+    activity.redemptions.append((datetime.date(2024, 2, 9), 4, "Zumzin"))
+    series = aggregate(PointsColumns.from_activities({"m1": activity}), "month").for_member("m1")
+    assert series.labels() == ["Jan 2024", "Feb 2024", "Mar 2024", "Apr 2024"]
+    assert series.earned.tolist() == [10, 0, 0, 5]
+    assert series.redeemed.tolist() == [0, 4, 0, 0]
+    assert series.balance.tolist() == [10, 6, 6, 11]
+    recent = aggregate(PointsColumns.from_activities({"m1": activity}), "month").for_member("m1", periods=2)
+    assert recent.labels() == ["Mar 2024", "Apr 2024"] and recent.balance.tolist() == [6, 11]
+
+
+def test_daily_totals_match_the_columns(members):
+    columns = PointsColumns.from_activities(members)
+    series = aggregate(columns, "day")
+    assert series.earned.sum() == pytest.approx(columns.earned.sum())
+    assert series.redeemed.sum() == pytest.approx(columns.redeemed.sum())
+    assert np.all(np.diff(series.offsets) >= 0)
+    with pytest.raises(ValueError):
+        aggregate(columns, "week")
+
+
+def test_chart_draws_one_bar_per_period(members):
+    series = aggregate(PointsColumns.from_activities(members), "month").for_member("m3", periods=6)
+    drawing = points_chart(series)
+    bars, line = drawing.contents[0], drawing.contents[1]
+    assert len(bars.categoryAxis.categoryNames) == len(series) <= 6
+    assert bars.data == [series.earned.tolist(), series.redeemed.tolist()]
+    assert line.data == [series.balance.tolist()]
+    assert drawing.asString("pdf").startswith(b"%PDF")
@@ -0,0 +1,42 @@
+"""BuildProfiler: section page ranges and the sections it opens.
+
+    python -m pytest public/docs
+"""
+import io
+
+import pytest
+from reportlab.lib.pagesizes import letter
+from reportlab.platypus import PageBreak, Paragraph
+
+from generate_tdc_guide import ThunderDragonGuide, build_styles
+from tdc_profile import BuildProfiler, profile_guide
+from tdc_spec import compile_plan, load_spec
+
+
+@pytest.fixture(autouse=True)
+def private_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("TDC_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("TDC_OFFLINE", "1")
+
+
+def test_guide_sections_cover_their_own_pages():
+    profiler = profile_guide(io.BytesIO())
+    sections = profiler.as_dict()["sections"]
+    assert [s["name"] for s in sections] == [s.id for s in compile_plan(load_spec()).sections]
+    # Each section starts on the page after the previous one ends (its PageBreak
+    # is not counted), and together they cover the document
+    assert sections[0]["first_page"] == 1
+    for before, after in zip(sections, sections[1:]):
+        assert after["first_page"] == before["last_page"] + 1
+    assert sections[-1]["last_page"] == len(profiler.pages)
+    assert all(s["first_page"] <= s["last_page"] for s in sections)
+
+
+def test_content_before_the_first_heading_is_its_own_section():
+    styles = build_styles()
+    profiler = BuildProfiler()
+    doc = ThunderDragonGuide(io.BytesIO(), pagesize=letter, profiler=profiler)
+    doc.build([Paragraph("Preamble", styles["Normal"]), PageBreak(),
+               Paragraph("Chapter", styles["Heading1"]), Paragraph("Body", styles["Normal"])])
+    sections = [(s["name"], s["first_page"], s["last_page"]) for s in profiler.as_dict()["sections"]]
+    assert sections == [("(document start)", 1, 1), ("Chapter", 2, 2)]
@@ -0,0 +1,97 @@
+"""Program report: period filtering, totals against a hand count, held-back events and the CLI.
+
+    python -m pytest public/docs
+"""
+import datetime
+import json
+
+import pytest
+
+import tdc_report
+from tdc_report import MEASURES, NON_TRADE, TRADE, parse_period, read_report, write_synthetic_export
+
+
+@pytest.fixture
+def export(tmp_path, monkeypatch):
+    monkeypatch.setenv("TDC_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("TDC_OFFLINE", "1")
+    path = tmp_path / "export.json"
+    write_synthetic_export(str(path), 30)
+    return path
+
+
+def _expected(export, start, end):
+    """Totals per member type, counted directly from the export"""
+    data = json.loads(export.read_text(encoding="utf-8"))
+    types = {m["id"]: TRADE if m["memberType"] == "trade" else NON_TRADE for m in data["members"]}
+    totals = {t: dict.fromkeys(MEASURES, 0) for t in (TRADE, NON_TRADE)}
+    for name in ("transactions", "redemptions", "referrals"):
+        for record in data[name]:
+            if not start <= datetime.date.fromisoformat(record["date"][:10]) <= end:
+                continue
+            row = totals[types[record["memberId"]]]
+            if name == "transactions":
+                row["spend"] += record["amount"]
+                row["transactions"] += 1
+                row["points_issued"] += record["pointsEarned"]
+            elif name == "redemptions":
+                row["points_redeemed"] += record["points"]
+                row["redemptions"] += 1
+            else:
+                row["points_issued"] += record["pointsEarned"]
+                row["referrals"] += 1
+    return totals
+
+
+def test_periods():
+    assert parse_period("2024-02") == (datetime.date(2024, 2, 1), datetime.date(2024, 2, 29))
+    assert parse_period("2024-12") == (datetime.date(2024, 12, 1), datetime.date(2024, 12, 31))
+    assert parse_period(start="2024-03-05") == (datetime.date(2024, 3, 5), None)
+    assert parse_period() == (None, None)
+    with pytest.raises(ValueError):
+        parse_period("2024-13")
+
+
+@pytest.mark.parametrize("month,start,end", [("2024-05", None, None), (None, "2024-03-10", "2024-07-20")])
+def test_totals_cover_only_the_period(export, month, start, end):
+    start, end = parse_period(month, start, end)
+    report, stats = read_report(str(export), start, end)
+    expected = _expected(export, start, end)
+    for member_type in (TRADE, NON_TRADE):
+        for name in ("spend", "transactions", "points_issued", "points_redeemed", "redemptions", "referrals"):
+            assert report.measure(name, member_type) == pytest.approx(expected[member_type][name]), name
+    first, last = tdc_report.month_number(start), tdc_report.month_number(end)
+    assert report.month_numbers[0] >= first and report.month_numbers[-1] <= last
+    # Every member joined in January, outside both periods
+    assert report.new_members.sum() == 0 and report.members.sum() == 30
+    assert stats["dropped"] == 0
+
+
+def test_events_before_their_member_are_held_back(tmp_path, monkeypatch):
+    monkeypatch.setattr(tdc_report, "PENDING_ROWS", 4)
+    transactions = [{"memberId": f"m{i % 3}", "amount": 100, "pointsEarned": 10, "date": "2024-05-0%d" % (i + 1)}
+                    for i in range(9)]
+    transactions.append({"memberId": "gone", "amount": 500, "pointsEarned": 50, "date": "2024-05-09"})
+    members = [{"id": f"m{i}", "memberType": "trade" if i == 0 else "non-trade"} for i in range(3)]
+    path = tmp_path / "export.json"
+    path.write_text(json.dumps({"transactions": transactions, "members": members}), encoding="utf-8")
+    report, stats = read_report(str(path))
+    # Nine events, more than PENDING_ROWS, so some came back from the spill file
+    assert report.measure("transactions") == 9
+    assert report.measure("spend", TRADE) == 300 and report.measure("spend", NON_TRADE) == 600
+    assert stats["dropped"] == 1
+
+
+def test_cli_renders_a_month(export, tmp_path, capsys):
+    output = tmp_path / "report.pdf"
+    assert tdc_report.main([str(export), str(output), "--month", "2024-05"]) == 0
+    assert output.read_bytes().startswith(b"%PDF")
+    assert "Report written to" in capsys.readouterr().err
+
+
+def test_cli_refuses_a_bad_month(export, tmp_path, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        tdc_report.main([str(export), str(tmp_path / "report.pdf"), "--month", "2024-13"])
+    assert exit_info.value.code == 2
+    assert "bad period" in capsys.readouterr().err
+    assert not (tmp_path / "report.pdf").exists()
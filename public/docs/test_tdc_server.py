@@ -0,0 +1,91 @@
+"""RenderServer's request validation, timeouts and worker recovery.
+
+    python -m pytest public/docs
+"""
+import asyncio
+import http.client
+import json
+import os
+import sys
+import time
+
+import pytest
+
+import tdc_server
+from tdc_server import RenderServer, register_job
+
+pytestmark = pytest.mark.skipif(sys.platform == "win32", reason="jobs are registered in forked workers")
+
+
+def _job_sleep(params):
+    time.sleep(float(params.get("seconds", 0.5)))
+    return b"%PDF-slept"
+
+
+def _job_crash(params):
+    os._exit(1)
+
+
+# Registered before the server forks its workers
+register_job("sleep", _job_sleep)
+register_job("crash", _job_crash)
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    monkeypatch.setenv("TDC_CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("TDC_OFFLINE", "1")
+    loop = asyncio.new_event_loop()
+    instance = RenderServer(workers=1, timeout=5)
+    loop.run_until_complete(instance.start(port=0))
+    port = instance._server.sockets[0].getsockname()[1]
+    yield loop, instance, port
+    loop.run_until_complete(instance.close())
+    # Connection handlers only run while the loop does; let them see their clients go
+    loop.run_until_complete(_finish_handlers())
+    loop.close()
+
+
+async def _finish_handlers():
+    await asyncio.gather(*(asyncio.all_tasks() - {asyncio.current_task()}), return_exceptions=True)
+
+
+def _post(loop, port, kind, params):
+    """One request, driven on the server's loop from a thread"""
+    def request():
+        connection = http.client.HTTPConnection(tdc_server.DEFAULT_HOST, port, timeout=30)
+        try:
+            connection.request("POST", f"/render/{kind}", json.dumps(params))
+            response = connection.getresponse()
+            return response.status, response.read()
+        finally:
+            connection.close()
+
+    return loop.run_until_complete(loop.run_in_executor(None, request))
+
+
+def test_bad_timeout_is_a_400(server):
+    loop, _, port = server
+    for value in ("abc", -1, None, "nan"):
+        status, body = _post(loop, port, "sleep", {"timeout": value})
+        assert status == 400, value
+        assert "timeout" in json.loads(body)["error"]
+
+
+def test_timed_out_job_keeps_its_slot_until_the_worker_finishes(server):
+    loop, instance, port = server
+    status, _ = _post(loop, port, "sleep", {"seconds": 1.0, "timeout": 0.2})
+    assert status == 504
+    assert instance.in_flight == 1
+    loop.run_until_complete(asyncio.sleep(1.2))
+    assert instance.in_flight == 0
+    assert _post(loop, port, "sleep", {"seconds": 0})[0] == 200
+
+
+def test_dead_worker_is_replaced(server):
+    loop, instance, port = server
+    status, body = _post(loop, port, "crash", {})
+    assert status == 500
+    assert instance.metrics.counts["pool_restarts"] == 1
+    assert _post(loop, port, "sleep", {"seconds": 0}) == (200, b"%PDF-slept")
+    assert instance.in_flight == 0
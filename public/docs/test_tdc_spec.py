@@ -0,0 +1,33 @@
+"""Spec compilation: memoized per digest, and bounded for long-running processes.
+
+    python -m pytest public/docs
+"""
+import copy
+
+import pytest
+
+import tdc_spec
+from tdc_spec import MAX_COMPILED, compile_plan, compile_styles, load_spec
+
+
+@pytest.fixture
+def spec():
+    return copy.deepcopy(load_spec())
+
+
+def test_same_spec_compiles_once(spec):
+    plan = compile_plan(spec)
+    assert compile_plan(copy.deepcopy(spec)) is plan
+    assert compile_styles(spec) is plan.registry
+
+
+def test_edited_specs_do_not_accumulate(spec):
+    plans = []
+    for i in range(MAX_COMPILED + 3):
+        spec["sections"][0]["blocks"].append({"p": f"Edit {i}"})
+        spec["palette"]["accent"] = f"#FFD7{i:02X}"
+        plans.append(compile_plan(spec))
+    assert len(tdc_spec._plan_cache) == MAX_COMPILED
+    assert len(tdc_spec._styles_cache) <= MAX_COMPILED
+    # The latest edit is still served from memory
+    assert compile_plan(spec) is plans[-1]
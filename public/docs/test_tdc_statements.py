@@ -0,0 +1,71 @@
+"""Bulk statements: chunked dispatch to the pool, error accounting and argument checks.
+
+    python -m pytest public/docs
+"""
+import multiprocessing
+import os
+
+import pytest
+
+import tdc_statements
+from tdc_bench import write_synthetic_backup
+from tdc_statements import _chunked, render_statements
+
+
+@pytest.fixture
+def backup(tmp_path, monkeypatch):
+    monkeypatch.setenv("TDC_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("TDC_OFFLINE", "1")
+    path = str(tmp_path / "backup")
+    write_synthetic_backup(path, 9)
+    return path
+
+
+def _fail_for(member_id):
+    render_statement = tdc_statements.render_statement
+
+    def render(activity, filename, *args, **kw):
+        if activity.member_id == member_id:
+            raise RuntimeError("disk full")
+        return render_statement(activity, filename, *args, **kw)
+
+    return render
+
+
+def test_chunks_cover_every_task_in_order():
+    assert list(_chunked(range(7), 3)) == [[0, 1, 2], [3, 4, 5], [6]]
+    assert list(_chunked([], 3)) == []
+
+
+@pytest.mark.parametrize("workers,chunksize", [(0, 32), (2, 0), (-1, 32)])
+def test_nonpositive_workers_or_chunksize_is_refused(backup, tmp_path, workers, chunksize):
+    with pytest.raises(ValueError):
+        render_statements(backup, str(tmp_path / "out"), workers=workers, chunksize=chunksize)
+
+
+@pytest.mark.parametrize("option", ["--chunksize", "--workers"])
+def test_cli_refuses_zero(backup, tmp_path, option, capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        tdc_statements.main([backup, str(tmp_path / "out"), option, "0"])
+    assert exit_info.value.code == 2
+    assert "at least 1" in capsys.readouterr().err
+
+
+def test_in_process_run_counts_failures(backup, tmp_path, monkeypatch):
+    monkeypatch.setattr(tdc_statements, "render_statement", _fail_for("m4"))
+    out_dir = str(tmp_path / "out")
+    report = render_statements(backup, out_dir, workers=1)
+    assert (report["documents"], report["errors"]) == (9, 1)
+    assert report["failures"] == [("m4", "RuntimeError: disk full")]
+    assert len(os.listdir(out_dir)) == 8
+
+
+@pytest.mark.skipif(multiprocessing.get_start_method() != "fork", reason="the failure is patched in before forking")
+def test_pool_renders_every_chunk_and_counts_failures(backup, tmp_path, monkeypatch):
+    monkeypatch.setattr(tdc_statements, "render_statement", _fail_for("m7"))
+    out_dir = str(tmp_path / "out")
+    # Nine members in chunks of two: five chunks, more than the two workers keep in flight
+    report = render_statements(backup, out_dir, workers=2, chunksize=2)
+    assert (report["documents"], report["errors"]) == (9, 1)
+    assert report["failures"] == [("m7", "RuntimeError: disk full")]
+    assert sorted(os.listdir(out_dir)) == sorted(f"statement_m{i}.pdf" for i in range(9) if i != 7)
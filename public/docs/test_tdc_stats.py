@@ -0,0 +1,30 @@
+"""Nearest-rank percentiles at and between exact ranks.
+
+    python -m pytest public/docs
+"""
+import pytest
+
+from tdc_stats import percentile
+
+
+@pytest.mark.parametrize("values,fraction,expected", [
+    (range(1, 101), 0.95, 95),
+    (range(1, 101), 0.99, 99),
+    (range(1, 101), 0.50, 50),
+    (range(1, 101), 0.07, 7),
+    (range(1, 11), 0.90, 9),
+    (range(1, 11), 0.50, 5),
+    (range(1, 11), 0.55, 6),
+    (range(1, 11), 0.99, 10),
+    (range(1, 5), 0.25, 1),
+    (range(1, 5), 0.26, 2),
+])
+def test_nearest_rank(values, fraction, expected):
+    assert percentile(list(values), fraction) == expected
+
+
+def test_ends_and_order():
+    assert percentile([3.0], 0.99) == 3.0
+    assert percentile([5, 1, 4, 2, 3], 0.0) == 1
+    assert percentile([5, 1, 4, 2, 3], 1.0) == 5
+    assert percentile([5, 1, 4, 2, 3], 0.6) == 3
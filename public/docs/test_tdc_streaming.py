@@ -0,0 +1,73 @@
+"""Streaming builds: flowables pulled lazily, pages written to the file as they finish.
+
+    python -m pytest public/docs
+"""
+import io
+
+import pytest
+from reportlab.platypus import Paragraph
+
+from generate_tdc_guide import build_styles
+from tdc_output import IncrementalCanvas
+from tdc_streaming import FlowableStream, StreamingCanvas, StreamingGuide, _bench_rows
+
+
+@pytest.fixture(autouse=True)
+def private_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv("TDC_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("TDC_OFFLINE", "1")
+
+
+def test_stream_pulls_only_its_lookahead():
+    pulled = []
+
+    def source():
+        for i in range(100):
+            pulled.append(i)
+            yield i
+
+    stream = FlowableStream(source(), lookahead=4)
+    assert stream[0] == 0 and len(pulled) == 1
+    del stream[0]
+    stream.insert(0, "split remainder")
+    assert len(stream) == 4 and len(pulled) == 4
+    assert stream[0] == "split remainder"
+    del stream[0:2]
+    assert stream.consumed == 3
+
+
+def test_build_to_a_path_writes_pages_as_they_finish(tmp_path, monkeypatch):
+    output = tmp_path / "long.pdf"
+    sizes = []
+    show_page = IncrementalCanvas.showPage
+
+    def recording_show_page(canvas):
+        show_page(canvas)
+        sizes.append(canvas._doc._stream.tell())
+
+    monkeypatch.setattr(IncrementalCanvas, "showPage", recording_show_page)
+    doc = StreamingGuide(str(output))
+    doc.build(_bench_rows(400, build_styles()))
+    assert doc.page == len(sizes) > 5
+    # Each page reached the file when it ended, not at save()
+    assert sizes == sorted(set(sizes)) and sizes[0] > 0
+    data = output.read_bytes()
+    assert data.count(b"/Type /Page\n") == doc.page and data.rstrip().endswith(b"%%EOF")
+    assert not list(tmp_path.glob(".tmp-*"))
+
+
+def test_failed_build_leaves_no_file(tmp_path):
+    def story():
+        yield Paragraph("first", build_styles()["Normal"])
+        raise RuntimeError("backup went away")
+
+    with pytest.raises(RuntimeError):
+        StreamingGuide(str(tmp_path / "broken.pdf")).build(story())
+    assert not list(tmp_path.glob("*.pdf")) and not list(tmp_path.glob(".tmp-*"))
+
+
+def test_explicit_canvasmaker_is_used():
+    buffer = io.BytesIO()
+    doc = StreamingGuide(buffer)
+    doc.build(_bench_rows(50, build_styles()), canvasmaker=StreamingCanvas)
+    assert buffer.getvalue().startswith(b"%PDF") and doc.page >= 2
@@ -0,0 +1,76 @@
+"""HistoryTable: splitting by index, lazy rows, repeated headers and truncation.
+
+    python -m pytest public/docs
+"""
+import io
+import re
+
+from reportlab.lib.pagesizes import letter
+from reportlab.pdfbase.pdfmetrics import stringWidth
+
+from generate_tdc_guide import ThunderDragonGuide
+from tdc_tables import ELLIPSIS, Column, HistoryTable, HistoryTableStyle, _WinAnsiText
+
+COLUMNS = [Column("Date", 0.3), Column("Amount", 0.3, "RIGHT"), Column("Notes", 0.4)]
+STYLE = HistoryTableStyle()
+
+
+def _rows(count):
+    return [(f"2024-01-{i % 28 + 1:02d}", f"Nu. {i:,}.00", f"row-{i:05d}") for i in range(count)]
+
+
+def _rows_fitting(count):
+    """Frame height that holds the header and count rows"""
+    return STYLE.row_height * (count + 1) + 0.5
+
+
+def test_split_is_by_index_and_shares_the_rows():
+    rows = _rows(25)
+    table = HistoryTable(COLUMNS, rows, STYLE)
+    head, tail = table.split(400, _rows_fitting(10))
+    assert head.wrap(400, _rows_fitting(10))[1] == STYLE.row_height * 11
+    assert list(head._rows) == rows[:10] and list(tail._rows) == rows[10:]
+    assert head._rows.rows is rows and tail._rows.rows is rows
+    # Zebra striping carries on from the row the piece starts at
+    assert tail._row_offset == 10
+    assert tail.split(400, _rows_fitting(15)) == [tail]
+    assert table.split(400, _rows_fitting(0)) == []
+
+
+def test_iterator_rows_are_pulled_a_page_at_a_time():
+    pulled = []
+
+    def source():
+        for row in _rows(1000):
+            pulled.append(row)
+            yield row
+
+    table = HistoryTable(COLUMNS, source(), STYLE)
+    head, tail = table.split(400, _rows_fitting(20))
+    # One page and the row that tells it a split is needed
+    assert len(pulled) == 21
+    assert len(list(head._rows)) == 20
+    assert next(iter(tail._rows)) == _rows(1000)[20]
+
+
+def test_document_repeats_the_header_and_draws_every_row_once():
+    buffer = io.BytesIO()
+    doc = ThunderDragonGuide(buffer, pagesize=letter, pageCompression=0)
+    doc.build([HistoryTable(COLUMNS, iter(_rows(300)), STYLE)])
+    data = buffer.getvalue()
+    assert doc.page > 2
+    assert data.count(b"(Date) Tj") == doc.page
+    drawn = re.findall(rb"\(row-(\d{5})\) Tj", data)
+    assert [int(n) for n in drawn] == list(range(300))
+
+
+def test_long_cells_are_truncated_to_fit():
+    table = HistoryTable(COLUMNS, [], STYLE)
+    text = "Tasting event, two bottles of Ser Kem and a case of Zumzin Peach Wine"
+    fitted = table._fit(text, 60, 0, STYLE.font_name, STYLE.font_size)
+    assert fitted.endswith(ELLIPSIS) and len(fitted) < len(text)
+    assert stringWidth(fitted, STYLE.font_name, STYLE.font_size) <= 60
+    assert table._fit("short", 60, 0, STYLE.font_name, STYLE.font_size) == "short"
+    # The WinAnsi fast path measures as reportlab does
+    fast = _WinAnsiText(STYLE.font_name, STYLE.font_size)
+    assert abs(fast.width(text.encode("cp1252")) - stringWidth(text, STYLE.font_name, STYLE.font_size)) < 1e-6
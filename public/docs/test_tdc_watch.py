@@ -0,0 +1,52 @@
+"""GuideWatcher rebuilding the guide after its inputs change.
+
+    python -m pytest public/docs
+"""
+import hashlib
+import io
+import os
+
+from PIL import Image
+from reportlab.lib.units import inch
+
+import tdc_images
+from tdc_build_cache import BuildCache
+from tdc_images import prepare_image
+from tdc_watch import GuideWatcher
+
+
+def _save_logo(path, color):
+    Image.new("RGB", (300, 180), color).save(path)
+    stat = os.stat(path)
+    # Coarse file system clocks: make sure the watcher sees a change
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+
+
+def _image_name(path):
+    """The name tdc_images gives the image object of path's logo"""
+    prepared = prepare_image(path, 2.5 * inch, 1.5 * inch)
+    return ("tdcImage" + hashlib.md5(prepared.encode("utf-8")).hexdigest()).encode("ascii")
+
+
+def test_replaced_logo_is_drawn_after_the_rebuild(tmp_path, monkeypatch):
+    monkeypatch.setenv("TDC_CACHE_DIR", str(tmp_path / "cache"))
+    monkeypatch.setenv("TDC_OFFLINE", "1")
+    monkeypatch.chdir(tmp_path)  # the guide uses ./logo.png when there is one
+    tdc_images._prepared.clear()
+    tdc_images._xobjects.clear()
+    output = str(tmp_path / "guide.pdf")
+    _save_logo("logo.png", (200, 0, 0))
+    watcher = GuideWatcher([output], restart=False, out=io.StringIO(),
+                           cache=BuildCache(str(tmp_path / "build-cache")))
+    assert watcher.rebuild() is not None
+    red = _image_name("logo.png")
+    with open(output, "rb") as f:
+        assert red in f.read()
+
+    _save_logo("logo.png", (0, 0, 200))
+    report = watcher.poll()
+    assert report is not None and report["rendered"]
+    blue = _image_name("logo.png")
+    with open(output, "rb") as f:
+        data = f.read()
+    assert blue != red and blue in data and red not in data